@@ -1,10 +1,15 @@
 import json
-import os
 import psycopg2
-from datetime import datetime, timedelta
+from db import get_connection, release_connection
+from response import json_response
+from datetime import datetime, timedelta, timezone
 import hashlib
-import secrets
+from tokens import authenticate, issue_token, revoke_token
+from admission import admission_controlled
+from instrument import instrumented
 
+@instrumented
+@admission_controlled
 def handler(event: dict, context) -> dict:
     """API для регистрации и авторизации пользователей"""
     
@@ -16,15 +21,14 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_connection()
     cur = conn.cursor()
     
     try:
@@ -38,12 +42,7 @@ def handler(event: dict, context) -> dict:
                 password = body.get('password')
                 
                 if not username or not email or not password:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Все поля обязательны'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Все поля обязательны'}, event)
                 
                 password_hash = hashlib.sha256(password.encode()).hexdigest()
                 
@@ -55,39 +54,24 @@ def handler(event: dict, context) -> dict:
                     user_id = cur.fetchone()[0]
                     conn.commit()
                     
-                    token = secrets.token_urlsafe(32)
+                    token = issue_token(user_id)
                     
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'success': True,
-                            'user_id': user_id,
-                            'username': username,
-                            'token': token
-                        }),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, {
+                        'success': True,
+                        'user_id': user_id,
+                        'username': username,
+                        'token': token
+                    }, event)
                 except psycopg2.IntegrityError:
                     conn.rollback()
-                    return {
-                        'statusCode': 409,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь с таким email уже существует'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(409, {'error': 'Пользователь с таким email уже существует'}, event)
             
             elif action == 'login':
                 email = body.get('email')
                 password = body.get('password')
                 
                 if not email or not password:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email и пароль обязательны'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Email и пароль обязательны'}, event)
                 
                 password_hash = hashlib.sha256(password.encode()).hexdigest()
                 
@@ -98,38 +82,34 @@ def handler(event: dict, context) -> dict:
                 user = cur.fetchone()
                 
                 if user:
-                    token = secrets.token_urlsafe(32)
                     is_premium = user[2]
-                    premium_until = user[3].isoformat() if user[3] else None
+                    token = issue_token(user[0], user[3] if is_premium else None)
+                    premium_until = user[3].replace(tzinfo=timezone.utc).isoformat() if user[3] else None
                     
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'success': True,
-                            'user_id': user[0],
-                            'username': user[1],
-                            'is_premium': is_premium,
-                            'premium_until': premium_until,
-                            'token': token
-                        }),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, {
+                        'success': True,
+                        'user_id': user[0],
+                        'username': user[1],
+                        'is_premium': is_premium,
+                        'premium_until': premium_until,
+                        'token': token
+                    }, event)
                 else:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Неверный email или пароль'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(401, {'error': 'Неверный email или пароль'}, event)
+            
+            elif action == 'logout':
+                claims = authenticate(event, cur)
+                
+                if not claims:
+                    return json_response(401, {'error': 'Требуется авторизация'}, event)
+                
+                revoke_token(cur, claims)
+                conn.commit()
+                
+                return json_response(200, {'success': True}, event)
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
     
     finally:
         cur.close()
-        conn.close()
+        release_connection(conn)
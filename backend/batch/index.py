@@ -0,0 +1,193 @@
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import traceback
+from urllib.parse import parse_qsl, urlsplit
+from db import shared_read_connection
+from response import body_response, dumps, json_response
+from admission import admission_controlled
+from instrument import instrumented
+
+FUNCTIONS_DIR = os.environ.get('BATCH_FUNCTIONS_DIR', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BATCH_FUNCTIONS = ('timeline', 'news', 'comments', 'search', 'secrets', 'subscription')
+MAX_BATCH_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+
+# Заголовки внешнего запроса, которые получает каждый подзапрос
+FORWARDED_HEADERS = ('x-user-token', 'authorization')
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def check_shared_modules(func_dir: str) -> None:
+    """Модули каталога функции, уже загруженные в процесс, должны совпадать с его копиями байт в байт.
+
+    Импорт по имени берёт модуль из sys.modules, то есть из функции, загруженной
+    первой; если копии разошлись, функция молча выполняла бы чужой код.
+    """
+    for file_name in sorted(os.listdir(func_dir)):
+        name, ext = os.path.splitext(file_name)
+        loaded = sys.modules.get(name)
+        if ext != '.py' or name == 'index' or loaded is None:
+            continue
+        loaded_file = getattr(loaded, '__file__', None)
+        path = os.path.join(func_dir, file_name)
+        if not loaded_file or not loaded_file.endswith('.py') or file_digest(loaded_file) != file_digest(path):
+            raise RuntimeError(f'Модуль {name} из {func_dir} отличается от уже загруженного {loaded_file}')
+
+
+def load_function(name: str):
+    """handler функции backend/<name>, загруженный в этот же процесс.
+
+    Общие модули (db, admission, response, instrument, ...) у всех функций
+    одинаковые и загружаются один раз, поэтому подзапросы делят пул соединений
+    и контроль допуска. Одинаковость проверяется при загрузке: расхождение —
+    RuntimeError, а не подмена кода.
+    """
+    with _handlers_lock:
+        if name not in _handlers:
+            func_dir = os.path.join(FUNCTIONS_DIR, name)
+            spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(func_dir, 'index.py'))
+            module = importlib.util.module_from_spec(spec)
+            # Общие модули уже в sys.modules и не перезагружаются; из каталога функции
+            # импортируются только её собственные (cache, prerender, tokens, ...)
+            check_shared_modules(func_dir)
+            sys.path.insert(0, func_dir)
+            try:
+                spec.loader.exec_module(module)
+            finally:
+                sys.path.remove(func_dir)
+            # Модули, впервые импортированные этой функцией, тоже должны прийти из её каталога
+            check_shared_modules(func_dir)
+            _handlers[name] = module.handler
+        return _handlers[name]
+
+
+def parse_items(event: dict):
+    """Список подзапросов из тела или строка с ошибкой"""
+    try:
+        items = json.loads(event.get('body') or '{}').get('requests')
+    except (ValueError, AttributeError):
+        return 'Тело запроса должно быть JSON-объектом'
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_REQUESTS:
+        return f'requests — список из 1–{MAX_BATCH_REQUESTS} подзапросов'
+    for item in items:
+        if not isinstance(item, dict) or item.get('function') not in BATCH_FUNCTIONS:
+            return 'Допустимые function: ' + ', '.join(BATCH_FUNCTIONS)
+        if item.get('method', 'GET') not in ('GET', 'POST'):
+            return 'Допустимые method: GET, POST'
+    return items
+
+
+def sub_event(item: dict, outer_headers: dict) -> dict:
+    headers = {name: value for name, value in outer_headers.items() if name.lower() in FORWARDED_HEADERS}
+    headers.update(item.get('headers') or {})
+    parts = urlsplit(item.get('path') or '/')
+    body = item.get('body')
+    return {
+        'httpMethod': item.get('method', 'GET'),
+        'path': parts.path or '/',
+        'queryStringParameters': dict(parse_qsl(parts.query)) or None,
+        'headers': headers,
+        'body': body if body is None or isinstance(body, str) else json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+
+def dispatch(item: dict, outer_headers: dict) -> dict:
+    """Выполняет подзапрос; ошибка подзапроса превращается в его статус 500, а не в ошибку пакета"""
+    try:
+        return load_function(item['function'])(sub_event(item, outer_headers), None)
+    except Exception:
+        traceback.print_exc()
+        return json_response(500, {'error': 'Внутренняя ошибка подзапроса'})
+
+
+def stages(items: list) -> list:
+    """Группы подзапросов по порядку: подряд идущие GET образуют одну группу, каждый POST — отдельную.
+
+    Так запись видна чтениям, перечисленным после неё.
+    """
+    groups = []
+    for index, item in enumerate(items):
+        if item.get('method', 'GET') == 'GET' and groups and groups[-1][1]:
+            groups[-1][0].append(index)
+        else:
+            groups.append(([index], item.get('method', 'GET') == 'GET'))
+    return [indexes for indexes, _ in groups]
+
+
+def run_reads(items: list, group: list, outer_headers: dict, responses: list) -> None:
+    """GET-подзапросы группы по очереди на одном соединении для чтения и одном слоте допуска.
+
+    Параллельно их не выполнить: соединение psycopg2 обрабатывает один запрос
+    за раз. Соединение берётся первым подзапросом, которому нужна база; запись
+    внутри GET (например, сохранение заготовки через primary) идёт через своё
+    соединение без второго слота допуска.
+    """
+    with shared_read_connection():
+        for index in group:
+            responses[index] = dispatch(items[index], outer_headers)
+
+
+def item_json(item: dict, response: dict) -> str:
+    """Элемент ответа; тело подзапроса уже JSON и вставляется как есть, без повторного разбора.
+
+    Тело в base64 (например, сжатое по Accept-Encoding подзапроса) передаётся
+    строкой с флагом isBase64Encoded и кодировкой из Content-Encoding.
+    """
+    prefix = '{"id":%s,"status":%d' % (dumps(item.get('id', item['function'])), response['statusCode'])
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        encoding = (response.get('headers') or {}).get('Content-Encoding')
+        return prefix + ',"body":%s,"isBase64Encoded":true%s}' % (
+            dumps(body), ',"encoding":' + dumps(encoding) if encoding else ''
+        )
+    return prefix + ',"body":%s}' % (body or 'null')
+
+
+@instrumented
+@admission_controlled
+def handler(event: dict, context) -> dict:
+    """Пакетный шлюз: несколько запросов к функциям сайта за один вызов"""
+
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+
+    items = parse_items(event)
+    if isinstance(items, str):
+        return json_response(400, {'error': items}, event)
+
+    outer_headers = event.get('headers') or {}
+    responses = [None] * len(items)
+    for group in stages(items):
+        if items[group[0]].get('method', 'GET') == 'GET':
+            run_reads(items, group, outer_headers, responses)
+        else:
+            responses[group[0]] = dispatch(items[group[0]], outer_headers)
+
+    body = '{"responses":[' + ','.join(item_json(item, response) for item, response in zip(items, responses)) + ']}'
+    return body_response(event, 200, body)
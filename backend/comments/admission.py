@@ -0,0 +1,222 @@
+"""Допуск к базе данных: ограничение одновременной работы, очередь с дедлайном и автомат отключения.
+
+Соединение из db.get_connection выдаётся только после допуска. Если слотов
+нет, вызов ждёт в ограниченной очереди не дольше ADMISSION_QUEUE_TIMEOUT_SECONDS;
+при переполненной очереди, истёкшем ожидании или разомкнутом автомате
+функция сразу отвечает 503 с Retry-After, а не ждёт падения Postgres.
+"""
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import psycopg2
+from response import json_response
+
+MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', os.environ.get('DB_POOL_MAX_SIZE', '4')))
+QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', '32'))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '2'))
+RETRY_AFTER_SECONDS = int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', '1'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '10'))
+
+# Меньше — раньше в очереди
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+_priority = contextvars.ContextVar('admission_priority', default=PRIORITY_READ)
+# Сколько соединений держит текущий вызов: вложенные get_connection не занимают второй слот
+_depth = contextvars.ContextVar('admission_depth', default=0)
+
+
+class Overloaded(Exception):
+    """База перегружена или недоступна; запрос нужно повторить позже"""
+
+    def __init__(self, message: str = 'Сервис перегружен, повторите запрос позже', retry_after: int = RETRY_AFTER_SECONDS,
+                 reason: str = 'overloaded'):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Не больше limit вызовов одновременно работают с базой, остальные ждут в очереди.
+
+    Очередь упорядочена по приоритету, затем по времени прихода. Чтение не
+    встаёт в очередь длиннее queue_size, запись с приоритетом PRIORITY_WRITE
+    встаёт всегда; ждут и те и другие не дольше queue_timeout. limit <= 0
+    отключает ограничение.
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_deadline': 0, 'max_wait_ms': 0.0}
+
+    def _shed(self, reason: str) -> Overloaded:
+        self.stats['shed_' + reason] += 1
+        return Overloaded(reason=reason)
+
+    def _acquire(self, priority: int) -> None:
+        with self._cond:
+            if self.in_flight < self.limit and not self._waiting:
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                return
+            if priority != PRIORITY_WRITE and len(self._waiting) >= self.queue_size:
+                raise self._shed('queue_full')
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            self.stats['queued'] += 1
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            while self.in_flight >= self.limit or self._waiting[0] != ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    # Первым в очереди мог стать тот, кому слот уже доступен
+                    self._cond.notify_all()
+                    raise self._shed('deadline')
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], (time.monotonic() - started) * 1000)
+            if self._waiting and self.in_flight < self.limit:
+                self._cond.notify_all()
+
+    def _release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def enter(self) -> None:
+        """Занимает слот для текущего вызова; парный вызов — leave()"""
+        depth = _depth.get()
+        if depth == 0 and self.limit > 0:
+            self._acquire(_priority.get())
+        _depth.set(depth + 1)
+
+    def leave(self) -> None:
+        depth = _depth.get() - 1
+        _depth.set(depth)
+        if depth == 0 and self.limit > 0:
+            self._release()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return dict(self.stats, in_flight=self.in_flight, waiting=len(self._waiting), limit=self.limit)
+
+
+class CircuitBreaker:
+    """Автомат отключения: после failure_threshold ошибок подключения подряд база не трогается reset_timeout секунд.
+
+    Затем пропускается один пробный запрос: успех замыкает автомат, ошибка
+    снова размыкает его. failure_threshold <= 0 отключает автомат.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def check(self) -> None:
+        """Бросает Overloaded, пока автомат разомкнут"""
+        if self.state == 'closed' or self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.state == 'closed':
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited >= self.reset_timeout:
+                # Пробный запрос; если он не отчитается, следующий пройдёт через reset_timeout
+                self.state = 'half_open'
+                self._opened_at = time.monotonic()
+                return
+            self.stats['rejected'] += 1
+            retry_after = max(1, math.ceil(self.reset_timeout - waited))
+        raise Overloaded('База данных недоступна, повторите запрос позже', retry_after, 'circuit_open')
+
+    def record_success(self) -> None:
+        if self.state == 'closed' and self.failures == 0:
+            return
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self.stats['opened'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, state=self.state, failures=self.failures)
+
+
+admission = AdmissionController(MAX_IN_FLIGHT, QUEUE_SIZE, QUEUE_TIMEOUT_SECONDS)
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+
+def prioritize() -> None:
+    """Ставит текущий вызов в очередь к базе раньше обычного чтения"""
+    _priority.set(PRIORITY_WRITE)
+
+
+def admission_stats() -> dict:
+    return {'admission': admission.snapshot(), 'breaker': breaker.snapshot()}
+
+
+def overloaded_response(event: dict, exc: Overloaded) -> dict:
+    return json_response(503, {'error': str(exc)}, event, {
+        'Retry-After': str(exc.retry_after),
+        'Access-Control-Expose-Headers': 'Retry-After'
+    })
+
+
+def admission_controlled(handler):
+    """Превращает перегрузку и обрыв связи с базой в быстрый 503 с Retry-After; каждый отказ пишется в лог"""
+    function_name = os.path.basename(os.path.dirname(os.path.abspath(inspect.getfile(handler))))
+
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        token = _priority.set(PRIORITY_READ)
+        try:
+            return handler(event, context)
+        except Overloaded as exc:
+            shed = exc
+        except psycopg2.OperationalError as exc:
+            breaker.record_failure()
+            shed = Overloaded('База данных недоступна, повторите запрос позже', reason='db_error')
+            print(json.dumps({'function': function_name, 'db_error': str(exc).strip()}, ensure_ascii=False))
+        finally:
+            _priority.reset(token)
+        print(json.dumps({
+            'function': function_name,
+            'method': event.get('httpMethod'),
+            'shed': shed.reason,
+            'retry_after': shed.retry_after
+        }))
+        return overloaded_response(event, shed)
+
+    return wrapper
@@ -0,0 +1,195 @@
+import base64
+import json
+from datetime import datetime
+from db import get_connection, get_read_connection, release_connection
+from response import json_response
+from tokens import authenticate, has_premium
+from admission import admission_controlled
+from instrument import instrumented
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 50
+MAX_CONTENT_LENGTH = 2000
+
+# Комментарии к Premium-новости видны и доступны только Premium-пользователям
+NEWS_ACCESS_QUERY = "SELECT 1 FROM news WHERE id = %s AND (NOT is_premium OR %s)"
+
+# Один оператор на пакет: имя автора берётся из users, комментарии к недоступным новостям
+# отбрасываются, счётчик news.comments_count обновляет триггер в той же транзакции
+INSERT_QUERY = """
+    INSERT INTO comments (user_id, news_id, author_name, content)
+    SELECT u.id, v.news_id, u.username, v.content
+    FROM users u
+    CROSS JOIN unnest(%s::int[], %s::text[]) WITH ORDINALITY AS v(news_id, content, position)
+    WHERE u.id = %s
+      AND EXISTS (SELECT 1 FROM news n WHERE n.id = v.news_id AND (NOT n.is_premium OR %s))
+    ORDER BY v.position
+    RETURNING id, author_name, content, created_at, news_id
+"""
+
+
+def encode_cursor(created_at: datetime, comment_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{comment_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Позиция (created_at, id) последнего выданного комментария или None, если курсор испорчен"""
+    try:
+        created_at, comment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def bad_request(message: str) -> dict:
+    return json_response(400, {'error': message})
+
+
+def comment_item(row) -> dict:
+    return {
+        'id': row[0],
+        'author_name': row[1],
+        'content': row[2],
+        'created_at': row[3].isoformat()
+    }
+
+
+def load_comments(cur, news_id: int, premium: bool, cursor, limit: int):
+    """Страница комментариев новости от новых к старым по (created_at, id)"""
+    cur.execute(NEWS_ACCESS_QUERY, (news_id, premium))
+    if cur.fetchone() is None:
+        return 404, {'error': 'Новость не найдена'}
+
+    query = "SELECT id, author_name, content, created_at FROM comments WHERE news_id = %s"
+    params = [news_id]
+
+    if cursor:
+        query += " AND (created_at, id) < (%s, %s)"
+        params.extend(cursor)
+
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    cur.execute(query, tuple(params))
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+    return 200, {'comments': [comment_item(row) for row in rows], 'next_cursor': next_cursor}
+
+
+def parse_batch(event: dict):
+    """Комментарии из тела: {"news_id": 1, "content": "..."} или {"comments": [{...}, ...]}; строка — ошибка"""
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return 'Тело запроса должно быть JSON-объектом'
+    items = body['comments'] if 'comments' in body else [body]
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_SIZE:
+        return f'comments — список из 1–{MAX_BATCH_SIZE} комментариев'
+
+    news_ids, contents = [], []
+    for item in items:
+        try:
+            news_id = int(item.get('news_id'))
+            content = (item.get('content') or '').strip()
+        except (ValueError, TypeError, AttributeError):
+            return 'У каждого комментария нужен news_id'
+        if not content or len(content) > MAX_CONTENT_LENGTH:
+            return f'Текст комментария — от 1 до {MAX_CONTENT_LENGTH} символов'
+        news_ids.append(news_id)
+        contents.append(content)
+    return news_ids, contents
+
+
+def post_comments(event: dict, claims: dict) -> dict:
+    batch = parse_batch(event)
+    if isinstance(batch, str):
+        return bad_request(batch)
+    news_ids, contents = batch
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(INSERT_QUERY, (news_ids, contents, claims['uid'], has_premium(claims)))
+        rows = cur.fetchall()
+        conn.commit()
+    finally:
+        cur.close()
+        release_connection(conn)
+
+    if not rows:
+        return json_response(404, {'error': 'Новость не найдена'}, event)
+
+    return json_response(201, {
+        'comments': [dict(comment_item(row), news_id=row[4]) for row in rows],
+        'rejected': len(news_ids) - len(rows)
+    }, event)
+
+
+@instrumented
+@admission_controlled
+def handler(event: dict, context) -> dict:
+    """API комментариев к новостям: постраничное чтение и пакетное добавление"""
+
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    claims = authenticate(event)
+
+    if method == 'POST':
+        if not claims:
+            return json_response(401, {'error': 'Требуется авторизация'}, event)
+        return post_comments(event, claims)
+
+    if method != 'GET':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+
+    query_params = event.get('queryStringParameters') or {}
+
+    try:
+        news_id = int(query_params['news_id'])
+    except (KeyError, ValueError):
+        return bad_request('Укажите news_id')
+
+    try:
+        limit = min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return bad_request('limit должен быть числом')
+
+    cursor = None
+    if query_params.get('cursor'):
+        cursor = decode_cursor(query_params['cursor'])
+        if cursor is None:
+            return bad_request('Некорректный cursor')
+
+    conn = get_read_connection()
+    cur = conn.cursor()
+
+    try:
+        status, payload = load_comments(cur, news_id, bool(claims) and has_premium(claims), cursor, limit)
+    finally:
+        cur.close()
+        release_connection(conn)
+
+    return json_response(status, payload, event)
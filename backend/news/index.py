@@ -1,76 +1,226 @@
+import base64
 import json
-import os
+from datetime import datetime
 import psycopg2
+from db import get_read_connection, release_connection
+from prerender import fetch_rendered, save_rendered
+from response import body_response, dumps, json_response
+from stream import stream_rows, streamed_response
+from views import known_news, view_counter
+from admission import Overloaded, admission_controlled
+from instrument import instrumented
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+NEWS_FIELDS = (
+    'id', 'title', 'content', 'category', 'image_url', 'credibility_rating',
+    'credibility_status', 'source', 'is_premium', 'views_count', 'comments_count', 'published_at'
+)
+
+
+def encode_cursor(published_at: datetime, news_id: int) -> str:
+    raw = f'{published_at.isoformat()}|{news_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Позиция (published_at, id) последней выданной новости или None, если курсор испорчен"""
+    try:
+        published_at, news_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(published_at), int(news_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def parse_fields(raw):
+    if not raw:
+        return list(NEWS_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    if not fields or any(name not in NEWS_FIELDS for name in fields):
+        return None
+    return fields
+
+
+def bad_request(message: str) -> dict:
+    return json_response(400, {'error': message})
+
+
+def track_views(event: dict) -> dict:
+    """Учитывает просмотры новостей: {"news_id": 1} или {"news_ids": [1, 2]}"""
+    try:
+        body = json.loads(event.get('body') or '{}')
+        news_ids = body.get('news_ids') or [body.get('news_id')]
+        news_ids = [int(news_id) for news_id in news_ids]
+    except (ValueError, TypeError, AttributeError):
+        return bad_request('Укажите news_id или news_ids')
+
+    if len(news_ids) > MAX_PAGE_SIZE:
+        return bad_request(f'Не больше {MAX_PAGE_SIZE} новостей за запрос')
+
+    accepted = sum(1 for news_id in news_ids if news_id in known_news and view_counter.record(news_id))
+    flush_views()
+
+    return json_response(202, {'accepted': accepted}, event)
+
+
+def flush_views() -> None:
+    """Сбрасывает накопленные просмотры, если подошёл срок или порог; вызывается при любом запросе к news"""
+    try:
+        view_counter.maybe_flush()
+    except (psycopg2.Error, Overloaded):
+        # Приросты остались в буфере и уйдут со следующим сбросом
+        pass
+
+
+def feed_query(is_premium: bool, category, fields: list, cursor, limit):
+    """Колонки, SQL и параметры ленты; без limit выбирается вся лента"""
+    # id и published_at нужны для курсора, даже если клиент их не запросил
+    columns = ['id', 'published_at'] + [name for name in fields if name not in ('id', 'published_at')]
+    query = f"SELECT {', '.join(columns)} FROM news WHERE is_premium = %s"
+    params = [is_premium]
+
+    if category:
+        query += " AND category = %s"
+        params.append(category)
+
+    if cursor:
+        query += " AND (published_at, id) < (%s, %s)"
+        params.extend(cursor)
+
+    query += " ORDER BY published_at DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit + 1)
+
+    return columns, query, tuple(params)
+
+
+def news_item(columns: list, fields: list, row) -> dict:
+    item = dict(zip(columns, row))
+    if item['published_at']:
+        item['published_at'] = item['published_at'].isoformat()
+    return {name: item[name] for name in fields}
+
+
+def load_feed(cur, is_premium: bool, category, fields: list, limit: int, cursor) -> dict:
+    """Страница ленты по (published_at, id) только с запрошенными полями"""
+    columns, query, params = feed_query(is_premium, category, fields, cursor, limit)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    return {'news': [news_item(columns, fields, row) for row in rows], 'next_cursor': next_cursor}
+
+
+def export_response(event: dict, is_premium: bool, category, fields: list) -> dict:
+    """Вся лента одним ответом: строки идут из серверного курсора и сразу кодируются"""
+    columns, query, params = feed_query(is_premium, category, fields, None, None)
+    conn = get_read_connection()
+
+    def build(writer):
+        writer.write(b'{"news":')
+        writer.write_array(news_item(columns, fields, row) for row in stream_rows(conn, query, params))
+        writer.write(b'}')
+
+    try:
+        return streamed_response(event, 200, build)
+    finally:
+        release_connection(conn)
+
+
+def default_feed_response(event: dict) -> dict:
+    """Первая страница ленты по умолчанию из rendered_responses — один запрос по первичному ключу.
+
+    views_count и comments_count в ней — на момент рендера: их изменения не
+    меняют версию ленты. Текущие счётчики отдаёт запрос ?fields=id,views_count,comments_count.
+    """
+    conn = get_read_connection()
+    cur = conn.cursor()
+
+    try:
+        version, rendered = fetch_rendered(cur, 'news/feed', '', 'news')
+        if rendered is None:
+            body = dumps(load_feed(cur, False, None, list(NEWS_FIELDS), DEFAULT_PAGE_SIZE, None))
+            rendered = save_rendered(conn, cur, 'news/feed', '', version, body)
+    finally:
+        cur.close()
+        release_connection(conn)
+
+    return body_response(event, 200, rendered.body, variants=rendered.encoded)
+
+
+def prerender() -> list:
+    """Обновляет устаревшие заготовки функции; вызывается после загрузки данных"""
+    default_feed_response({})
+    return ['news/feed']
+
+
+@instrumented
+@admission_controlled
 def handler(event: dict, context) -> dict:
     """API для получения новостей с рейтингом достоверности"""
-    
+
     method = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+
+    if method == 'POST':
+        return track_views(event)
+
+    if method != 'GET':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+
+    # До взятия соединения для чтения, чтобы вызов не держал два соединения сразу
+    flush_views()
+
+    query_params = event.get('queryStringParameters') or {}
+    category = query_params.get('category')
+    is_premium = query_params.get('is_premium', 'false').lower() == 'true'
+
+    fields = parse_fields(query_params.get('fields'))
+    if fields is None:
+        return bad_request('Допустимые поля: ' + ', '.join(NEWS_FIELDS))
+
+    try:
+        limit = min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return bad_request('limit должен быть числом')
+
+    cursor = None
+    if query_params.get('cursor'):
+        cursor = decode_cursor(query_params['cursor'])
+        if cursor is None:
+            return bad_request('Некорректный cursor')
+
+    if query_params.get('export') == 'true':
+        return export_response(event, is_premium, category, fields)
+
+    if not category and not is_premium and not query_params.get('fields') and limit == DEFAULT_PAGE_SIZE and cursor is None:
+        return default_feed_response(event)
+
+    conn = get_read_connection()
     cur = conn.cursor()
-    
+
     try:
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            category = query_params.get('category')
-            is_premium = query_params.get('is_premium', 'false').lower() == 'true'
-            
-            if category:
-                cur.execute(
-                    "SELECT id, title, content, category, image_url, credibility_rating, credibility_status, source, is_premium, views_count, published_at FROM news WHERE category = %s AND is_premium = %s ORDER BY published_at DESC",
-                    (category, is_premium)
-                )
-            else:
-                cur.execute(
-                    "SELECT id, title, content, category, image_url, credibility_rating, credibility_status, source, is_premium, views_count, published_at FROM news WHERE is_premium = %s ORDER BY published_at DESC",
-                    (is_premium,)
-                )
-            
-            news_list = []
-            for row in cur.fetchall():
-                news_list.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'content': row[2],
-                    'category': row[3],
-                    'image_url': row[4],
-                    'credibility_rating': row[5],
-                    'credibility_status': row[6],
-                    'source': row[7],
-                    'is_premium': row[8],
-                    'views_count': row[9],
-                    'published_at': row[10].isoformat() if row[10] else None
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'news': news_list}),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
-    
+        payload = load_feed(cur, is_premium, category, fields, limit, cursor)
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
+
+    return json_response(200, payload, event)
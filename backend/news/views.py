@@ -0,0 +1,159 @@
+"""Отложенный пакетный счётчик просмотров новостей.
+
+Буфер живёт в памяти контейнера и пишется в базу только в вызовах функции:
+по порогу или, когда подошёл срок, попутно с любым запросом к news. Просмотры,
+накопленные после последнего сброса, теряются, если платформа остановит
+контейнер без atexit, — не больше VIEWS_FLUSH_THRESHOLD просмотров или
+VIEWS_FLUSH_INTERVAL_SECONDS последней активности контейнера.
+"""
+import atexit
+import os
+import threading
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from admission import Overloaded
+from db import get_connection, get_read_connection, release_connection
+
+FLUSH_INTERVAL_SECONDS = float(os.environ.get('VIEWS_FLUSH_INTERVAL_SECONDS', '10'))
+FLUSH_THRESHOLD = int(os.environ.get('VIEWS_FLUSH_THRESHOLD', '500'))
+MAX_PENDING_IDS = int(os.environ.get('VIEWS_MAX_PENDING_IDS', '10000'))
+KNOWN_IDS_REFRESH_SECONDS = float(os.environ.get('VIEWS_KNOWN_IDS_REFRESH_SECONDS', '60'))
+
+FLUSH_QUERY = """
+    UPDATE news SET views_count = news.views_count + v.delta
+    FROM (VALUES %s) AS v(id, delta)
+    WHERE news.id = v.id
+"""
+
+
+class ViewCounter:
+    """Копит приросты просмотров в памяти контейнера и пишет их одним UPDATE.
+
+    Повторные просмотры одной новости складываются в один прирост. Запись
+    никогда не ждёт базу: сброс выполняет только тот вызов, которому удалось
+    взять блокировку, а при переполнении буфера новые id отбрасываются.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_SECONDS, flush_threshold: int = FLUSH_THRESHOLD,
+                 max_pending_ids: int = MAX_PENDING_IDS):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_pending_ids = max_pending_ids
+        self._pending = {}
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {'recorded': 0, 'dropped': 0, 'flushed': 0, 'flushes': 0, 'flush_errors': 0}
+
+    def record(self, news_id: int, count: int = 1) -> bool:
+        with self._lock:
+            if news_id not in self._pending and len(self._pending) >= self.max_pending_ids:
+                self.stats['dropped'] += count
+                return False
+            self._pending[news_id] = self._pending.get(news_id, 0) + count
+            self._pending_total += count
+            self.stats['recorded'] += count
+        return True
+
+    def flush_due(self) -> bool:
+        return (self._pending_total >= self.flush_threshold
+                or (self._pending and time.monotonic() - self._last_flush >= self.flush_interval))
+
+    def maybe_flush(self) -> int:
+        return self.flush() if self.flush_due() else 0
+
+    def flush(self) -> int:
+        """Пишет накопленное одним set-based UPDATE; возвращает число сброшенных просмотров"""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_total = 0
+                self._last_flush = time.monotonic()
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                self.stats['flush_errors'] += 1
+                # Вернувшиеся в буфер уже учтены в recorded; не поместившиеся record учёл в dropped
+                for news_id, delta in batch.items():
+                    if self.record(news_id, delta):
+                        self.stats['recorded'] -= delta
+                raise
+            flushed = sum(batch.values())
+            self.stats['flushed'] += flushed
+            self.stats['flushes'] += 1
+            return flushed
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, batch: dict) -> None:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            # Сортировка по id задаёт одинаковый порядок блокировок строк у параллельных сбросов
+            execute_values(cur, FLUSH_QUERY, sorted(batch.items()), page_size=len(batch))
+            conn.commit()
+        finally:
+            cur.close()
+            release_connection(conn)
+
+
+class NewsIds:
+    """id существующих новостей; перечитываются из базы не чаще раза в refresh_interval.
+
+    Просмотры принимаются только для них, иначе анонимный вызов мог бы занять
+    буфер несуществующими id и вытеснить настоящие просмотры. Новость,
+    опубликованная после последнего чтения, считается не дольше refresh_interval.
+    """
+
+    def __init__(self, refresh_interval: float = KNOWN_IDS_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._ids = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, news_id: int) -> bool:
+        if self._loaded_at is None:
+            self.refresh()
+        elif time.monotonic() - self._loaded_at >= self.refresh_interval:
+            try:
+                self.refresh()
+            except (psycopg2.Error, Overloaded):
+                # Устаревший набор лучше отказа в учёте; перечитать попробует следующий вызов
+                pass
+        return news_id in self._ids
+
+    def refresh(self) -> None:
+        if not self._lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            conn = get_read_connection()
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT id FROM news")
+                self._ids = frozenset(row[0] for row in cur.fetchall())
+                self._loaded_at = time.monotonic()
+            finally:
+                cur.close()
+                release_connection(conn)
+        finally:
+            self._lock.release()
+
+
+view_counter = ViewCounter()
+known_news = NewsIds()
+
+
+def _flush_on_exit() -> None:
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_on_exit)
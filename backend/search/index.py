@@ -0,0 +1,149 @@
+import re
+from db import get_read_connection, release_connection
+from response import json_response
+from admission import admission_controlled
+from instrument import instrumented
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_PAGE = 10
+SUGGEST_LIMIT = 10
+MAX_QUERY_WORDS = 8
+
+SEARCH_TYPES = ('news', 'movie', 'character')
+
+HEADLINE_OPTIONS = 'MaxWords=30, MinWords=10, MaxFragments=2, StartSel=<b>, StopSel=</b>'
+
+HITS_QUERIES = {
+    'news': """
+        SELECT 'news' AS kind, id, ts_rank_cd(search_vector, q.query) AS rank
+        FROM news, q
+        WHERE search_vector @@ q.query AND is_premium = FALSE
+    """,
+    'movie': """
+        SELECT 'movie' AS kind, id, ts_rank_cd(search_vector, q.query) AS rank
+        FROM movies, q
+        WHERE search_vector @@ q.query
+    """,
+    'character': """
+        SELECT 'character' AS kind, id, ts_rank_cd(search_vector, q.query) AS rank
+        FROM characters, q
+        WHERE search_vector @@ q.query
+    """
+}
+
+
+def build_tsquery(text: str, prefix: bool):
+    """tsquery из слов запроса: все слова обязательны, последнее — как префикс при наборе"""
+    words = re.findall(r'\w+', text.lower())[:MAX_QUERY_WORDS]
+    if not words:
+        return None
+    if prefix:
+        words[-1] += ':*'
+    return ' & '.join(words)
+
+
+def search(cur, tsquery: str, types: list, limit: int, offset: int, with_snippets: bool) -> list:
+    """Ранжированные совпадения; сниппеты строятся только для строк выбранной страницы"""
+    hits = ' UNION ALL '.join(HITS_QUERIES[kind] for kind in types)
+    if with_snippets:
+        snippet = f"""
+            CASE page.kind
+                WHEN 'news' THEN ts_headline('russian', n.content, q.query, '{HEADLINE_OPTIONS}')
+                WHEN 'movie' THEN ts_headline('russian', coalesce(m.description, ''), q.query, '{HEADLINE_OPTIONS}')
+                ELSE ts_headline('russian', concat_ws(' — ', c.real_name, c.description), q.query, '{HEADLINE_OPTIONS}')
+            END
+        """
+    else:
+        snippet = 'NULL'
+    cur.execute(f"""
+        WITH q AS (SELECT to_tsquery('russian', %s) AS query),
+        hits AS ({hits}),
+        page AS (
+            SELECT kind, id, rank FROM hits
+            ORDER BY rank DESC, kind, id
+            LIMIT %s OFFSET %s
+        )
+        SELECT page.kind, page.id, page.rank,
+               COALESCE(n.title, m.title, c.name) AS title,
+               COALESCE(n.image_url, m.image_url, c.image_url) AS image_url,
+               {snippet} AS snippet
+        FROM page
+        CROSS JOIN q
+        LEFT JOIN news n ON page.kind = 'news' AND n.id = page.id
+        LEFT JOIN movies m ON page.kind = 'movie' AND m.id = page.id
+        LEFT JOIN characters c ON page.kind = 'character' AND c.id = page.id
+        ORDER BY page.rank DESC, page.kind, page.id
+    """, (tsquery, limit, offset))
+
+    results = []
+    for row in cur.fetchall():
+        result = {
+            'type': row[0],
+            'id': row[1],
+            'rank': round(row[2], 6),
+            'title': row[3],
+            'image_url': row[4]
+        }
+        if with_snippets:
+            result['snippet'] = row[5]
+        results.append(result)
+    return results
+
+
+@instrumented
+@admission_controlled
+def handler(event: dict, context) -> dict:
+    """API полнотекстового поиска по новостям, фильмам и персонажам Marvel"""
+
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+
+    query_params = event.get('queryStringParameters') or {}
+    text = query_params.get('q', '')
+    suggest = query_params.get('mode') == 'suggest'
+
+    tsquery = build_tsquery(text, prefix=suggest or query_params.get('prefix') == 'true')
+    if not tsquery:
+        return json_response(400, {'error': 'Пустой поисковый запрос'}, event)
+
+    types = [kind for kind in (query_params.get('types') or ','.join(SEARCH_TYPES)).split(',') if kind]
+    if not types or any(kind not in SEARCH_TYPES for kind in types):
+        return json_response(400, {'error': 'Допустимые types: ' + ', '.join(SEARCH_TYPES)}, event)
+
+    try:
+        limit = SUGGEST_LIMIT if suggest else min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        page = 1 if suggest else min(max(int(query_params.get('page', 1)), 1), MAX_PAGE)
+    except ValueError:
+        return json_response(400, {'error': 'limit и page должны быть числами'}, event)
+
+    conn = get_read_connection()
+    cur = conn.cursor()
+
+    try:
+        results = search(cur, tsquery, types, limit + 1, (page - 1) * limit, with_snippets=not suggest)
+    finally:
+        cur.close()
+        release_connection(conn)
+
+    return json_response(200, {
+        'query': text,
+        'results': results[:limit],
+        'page': page,
+        'has_more': len(results) > limit and page < MAX_PAGE
+    }, event)
@@ -0,0 +1,195 @@
+"""Замеры фаз обработки запроса: Server-Timing и одна строка лога на вызов.
+
+Включается переменной INSTRUMENTATION=1. Когда она не задана, декоратор
+instrumented возвращает обработчик как есть, а phase() — пустой контекст.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import time
+import psycopg2.extensions
+
+ENABLED = os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('EXPLAIN_SAMPLE_RATE', '0'))
+
+# EXPLAIN ANALYZE выполняет запрос, поэтому планы снимаются только в функциях чтения
+# и только для SELECT без записи, блокировок строк и функций с побочными эффектами
+EXPLAIN_FUNCTIONS = ('timeline', 'news')
+_NOT_READ_ONLY = re.compile(
+    rb'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|SHARE|NEXTVAL|SETVAL|SET_CONFIG|PG_ADVISORY_\w+|REFRESH_\w+)\b',
+    re.IGNORECASE
+)
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    __slots__ = ('phases', 'queries', 'rows', 'started', 'explain')
+
+    def __init__(self, explain: bool = False):
+        self.phases = {}
+        self.queries = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.explain = explain
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+class _Phase:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    trace = _current_trace.get()
+    return _NO_PHASE if trace is None else _Phase(trace, name)
+
+
+class TracingCursor(psycopg2.extensions.cursor):
+    """Курсор, который учитывает время запросов, их число и полученные строки"""
+
+    def execute(self, query, vars=None):
+        trace = _current_trace.get()
+        if trace is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        result = super().execute(query, vars)
+        elapsed = time.perf_counter() - started
+        trace.add('db', elapsed)
+        trace.queries += 1
+        if trace.explain and elapsed * 1000 >= SLOW_QUERY_MS and random.random() < EXPLAIN_SAMPLE_RATE:
+            self._explain(query, vars, elapsed)
+        return result
+
+    def _fetch(self, method, *args):
+        trace = _current_trace.get()
+        if trace is None:
+            return method(*args)
+        started = time.perf_counter()
+        rows = method(*args)
+        trace.add('fetch', time.perf_counter() - started)
+        trace.rows += len(rows) if isinstance(rows, list) else int(rows is not None)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def _explain(self, query, vars, elapsed: float) -> None:
+        statement = self.mogrify(query, vars)
+        if not statement.lstrip().upper().startswith(b'SELECT') or _NOT_READ_ONLY.search(statement):
+            return
+        conn = self.connection
+        # Точка сохранения нужна, чтобы ошибка EXPLAIN не прервала транзакцию вызывающего кода
+        in_transaction = not conn.autocommit
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                if in_transaction:
+                    cur.execute('SAVEPOINT explain_sample')
+                try:
+                    cur.execute(b'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement)
+                    plan = cur.fetchone()[0]
+                except psycopg2.Error as exc:
+                    plan = {'error': str(exc).strip()}
+                if in_transaction:
+                    cur.execute('ROLLBACK TO SAVEPOINT explain_sample')
+                    cur.execute('RELEASE SAVEPOINT explain_sample')
+        except psycopg2.Error as exc:
+            plan = {'error': str(exc).strip()}
+        print(json.dumps({
+            'slow_query_ms': round(elapsed * 1000, 3),
+            'query': statement.decode('utf-8', 'replace'),
+            'plan': plan
+        }, ensure_ascii=False, default=str))
+
+
+def cursor_factory():
+    return TracingCursor if ENABLED else None
+
+
+def server_timing(trace: Trace, total: float) -> str:
+    accounted = sum(trace.phases.values())
+    parts = []
+    for name, seconds in trace.phases.items():
+        entry = f'{name};dur={seconds * 1000:.3f}'
+        if name == 'db':
+            entry += f';desc="{trace.queries} queries"'
+        elif name == 'fetch':
+            entry += f';desc="{trace.rows} rows"'
+        parts.append(entry)
+    parts.append(f'app;dur={max(total - accounted, 0.0) * 1000:.3f}')
+    parts.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(parts)
+
+
+def instrumented(handler):
+    """Оборачивает handler(event, context) замерами, если инструментирование включено"""
+    if not ENABLED:
+        return handler
+
+    function_name = os.path.basename(os.path.dirname(os.path.abspath(inspect.getfile(inspect.unwrap(handler)))))
+
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        trace = Trace(explain=EXPLAIN_SAMPLE_RATE > 0 and function_name in EXPLAIN_FUNCTIONS)
+        token = _current_trace.set(trace)
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            _current_trace.reset(token)
+            total = time.perf_counter() - trace.started
+            status = response.get('statusCode') if isinstance(response, dict) else 500
+            if isinstance(response, dict):
+                headers = response.setdefault('headers', {})
+                headers['Server-Timing'] = server_timing(trace, total)
+                headers['Timing-Allow-Origin'] = '*'
+            print(json.dumps({
+                'function': function_name,
+                'method': event.get('httpMethod'),
+                'path': event.get('path'),
+                'query': event.get('queryStringParameters'),
+                'status': status,
+                'duration_ms': round(total * 1000, 3),
+                'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in trace.phases.items()},
+                'queries': trace.queries,
+                'rows': trace.rows
+            }, ensure_ascii=False))
+
+    return wrapper
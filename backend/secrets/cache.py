@@ -0,0 +1,105 @@
+"""Кеш сериализованных снимков каталога, привязанных к версии данных"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL_SECONDS = float(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '600'))
+VERSION_PROBE_INTERVAL_SECONDS = float(os.environ.get('CATALOG_VERSION_PROBE_SECONDS', '5'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '256'))
+
+
+class Snapshot:
+    __slots__ = ('body', 'etag', 'version', 'expires_at', 'encoded')
+
+    def __init__(self, body: str, version: int, ttl: float):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body.encode('utf-8')).hexdigest()
+        self.version = version
+        self.expires_at = time.monotonic() + ttl
+        self.encoded = {}
+
+
+class SnapshotCache:
+    """Снимки живут не дольше ttl и сбрасываются при смене версии данных.
+
+    Версия перепроверяется в базе не чаще раза в probe_interval, поэтому
+    повторные запросы в этом окне обслуживаются без обращения к базе.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, probe_interval: float = VERSION_PROBE_INTERVAL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self._version or entry.expires_at <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_fresh(self, key):
+        """Снимок, не требующий проверки версии, или None"""
+        with self._lock:
+            if time.monotonic() - self._probed_at >= self.probe_interval:
+                return None
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+            return entry
+
+    def revalidate(self, key, version: int):
+        """Запоминает свежую версию данных и возвращает снимок, если он ей соответствует"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._probed_at = time.monotonic()
+            entry = self._lookup(key)
+            self.stats['revalidated' if entry is not None else 'misses'] += 1
+            return entry
+
+    def put(self, key, version: int, body: str) -> Snapshot:
+        entry = Snapshot(body, version, self.ttl)
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._probed_at = 0.0
+
+
+def fetch_data_version(cur, name: str) -> int:
+    cur.execute("SELECT version FROM data_versions WHERE name = %s", (name,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def etag_matches(event: dict, etag: str) -> bool:
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('if-none-match') or headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    candidates = set()
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        for suffix in ('-gzip"', '-br"'):
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+        candidates.add(tag)
+    return '*' in candidates or etag in candidates
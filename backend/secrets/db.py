@@ -0,0 +1,334 @@
+"""Пул соединений с Postgres, переживающий тёплые вызовы функции"""
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from admission import Overloaded, admission, admission_stats, breaker
+from instrument import cursor_factory, phase
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', '5'))
+HEALTHCHECK_INTERVAL_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.environ.get('REPLICA_CHECK_INTERVAL_SECONDS', '5'))
+
+# На догнавшей реплике задержка нулевая, даже если на primary давно не было записей
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class PoolTimeout(Overloaded):
+    """Все соединения пула заняты дольше допустимого"""
+
+    def __init__(self, message: str):
+        super().__init__(message, reason='pool_timeout')
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений одного контейнера.
+
+    Соединение, простоявшее без дела дольше healthcheck_interval, перед выдачей
+    проверяется запросом SELECT 1 и при ошибке прозрачно переоткрывается.
+    """
+
+    def __init__(self, dsn: str, max_size: int, timeout: float, healthcheck_interval: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        factory = cursor_factory()
+        self.connect_kwargs = {'cursor_factory': factory} if factory else {}
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0, 'timeouts': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _is_alive(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise PoolTimeout('Нет свободных соединений с базой данных')
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._count('misses')
+                    return psycopg2.connect(self.dsn, **self.connect_kwargs)
+                conn, last_used = entry
+                if self._is_alive(conn, last_used):
+                    self._count('hits')
+                    return conn
+                self._count('reconnects')
+                _close_quietly(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        try:
+            if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+        with self._lock:
+            if conn.closed or len(self._idle) >= self.max_size:
+                self.stats['discarded'] += 1
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                discard = False
+        if discard:
+            _close_quietly(conn)
+        self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+class ReplicaRouter:
+    """Решает, можно ли читать с реплики.
+
+    Задержка репликации проверяется не чаще раза в check_interval; если реплика
+    недоступна или отстала больше max_lag, до следующей проверки чтение идёт с primary.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_lag: float, check_interval: float):
+        self.pool = pool
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self._usable = False
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.stats = {'replica': 0, 'primary': 0, 'checks': 0, 'failures': 0}
+
+    def _probe(self):
+        try:
+            conn = self.pool.acquire()
+        except (psycopg2.Error, PoolTimeout):
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(REPLICA_LAG_QUERY)
+                return float(cur.fetchone()[0])
+        except psycopg2.Error:
+            return None
+        finally:
+            self.pool.release(conn)
+
+    def usable(self) -> bool:
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return self._usable
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self.lag = self._probe()
+                self._usable = self.lag is not None and self.lag <= self.max_lag
+                self._checked_at = time.monotonic()
+                self.stats['checks'] += 1
+                if self.lag is None:
+                    self.stats['failures'] += 1
+        return self._usable
+
+    def mark_down(self) -> None:
+        with self._lock:
+            self._usable = False
+            self._checked_at = time.monotonic()
+            self.stats['failures'] += 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_router = None
+_replica_leases = set()
+# [соединение или None] внутри shared_read_connection(): общее соединение для чтения
+# нескольких вызовов подряд; берётся при первом get_read_connection
+_shared_read = contextvars.ContextVar('shared_read_connection', default=None)
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    POOL_MAX_SIZE,
+                    POOL_TIMEOUT_SECONDS,
+                    HEALTHCHECK_INTERVAL_SECONDS
+                )
+    return _pool
+
+
+def get_replica_router():
+    """Маршрутизатор чтения или None, если DATABASE_REPLICA_URL не задан"""
+    global _router
+    replica_dsn = os.environ.get('DATABASE_REPLICA_URL')
+    if not replica_dsn:
+        return None
+    if _router is None:
+        with _pool_lock:
+            if _router is None:
+                _router = ReplicaRouter(
+                    ConnectionPool(replica_dsn, POOL_MAX_SIZE, POOL_TIMEOUT_SECONDS, HEALTHCHECK_INTERVAL_SECONDS),
+                    REPLICA_MAX_LAG_SECONDS,
+                    REPLICA_CHECK_INTERVAL_SECONDS
+                )
+    return _router
+
+
+def _primary_connection():
+    try:
+        with phase('connect'):
+            conn = get_pool().acquire()
+    except psycopg2.OperationalError as exc:
+        breaker.record_failure()
+        raise Overloaded('База данных недоступна, повторите запрос позже', reason='connect_failed') from exc
+    breaker.record_success()
+    return conn
+
+
+def _admit() -> None:
+    with phase('queue'):
+        admission.enter()
+
+
+def get_connection():
+    """Выдаёт соединение из пула после допуска; вернуть его нужно через release_connection.
+
+    Бросает Overloaded (в том числе PoolTimeout), если база перегружена или недоступна.
+    """
+    breaker.check()
+    _admit()
+    try:
+        return _primary_connection()
+    except BaseException:
+        admission.leave()
+        raise
+
+
+def get_read_connection():
+    """Соединение для запросов только на чтение: с реплики, если она есть и не отстала, иначе с primary.
+
+    Возвращать его нужно так же через release_connection. Писать через него нельзя.
+    Внутри shared_read_connection() возвращается общее соединение блока.
+    """
+    shared = _shared_read.get()
+    if shared is not None:
+        if shared[0] is None:
+            shared[0] = _read_connection()
+        return shared[0]
+    return _read_connection()
+
+
+def _read_connection():
+    _admit()
+    try:
+        router = get_replica_router()
+        if router is not None and router.usable():
+            try:
+                with phase('connect'):
+                    conn = router.pool.acquire()
+            except (psycopg2.Error, PoolTimeout):
+                router.mark_down()
+            else:
+                with _pool_lock:
+                    _replica_leases.add(id(conn))
+                router.stats['replica'] += 1
+                return conn
+        if router is not None:
+            router.stats['primary'] += 1
+        breaker.check()
+        return _primary_connection()
+    except BaseException:
+        admission.leave()
+        raise
+
+
+def is_replica(conn) -> bool:
+    return id(conn) in _replica_leases
+
+
+@contextlib.contextmanager
+def shared_read_connection():
+    """Одно соединение для чтения и один слот допуска на все get_read_connection внутри блока.
+
+    Соединение берётся при первом запросе на чтение. Соединение psycopg2 не
+    выполняет запросы параллельно, поэтому вызовы внутри блока должны идти
+    последовательно. release_connection для общего соединения только
+    откатывает его транзакцию, в пул оно возвращается при выходе из блока.
+    """
+    shared = [None]
+    token = _shared_read.set(shared)
+    try:
+        yield
+    finally:
+        _shared_read.reset(token)
+        if shared[0] is not None:
+            release_connection(shared[0])
+
+
+def release_connection(conn) -> None:
+    shared = _shared_read.get()
+    if shared is not None and conn is shared[0]:
+        # Ошибка или незакрытая транзакция одного вызова не должна достаться следующему
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        return
+    with _pool_lock:
+        from_replica = id(conn) in _replica_leases
+        _replica_leases.discard(id(conn))
+    try:
+        if from_replica:
+            _router.pool.release(conn)
+        else:
+            get_pool().release(conn)
+    finally:
+        admission.leave()
+
+
+def pool_stats() -> dict:
+    pool = get_pool()
+    with pool._lock:
+        stats = dict(pool.stats)
+        stats['idle'] = len(pool._idle)
+    stats['max_size'] = pool.max_size
+    if _router is not None:
+        stats['replica'] = dict(_router.stats, lag=_router.lag, usable=_router._usable)
+    stats.update(admission_stats())
+    return stats
@@ -1,7 +1,176 @@
-import json
-import os
-import psycopg2
+import base64
+from datetime import datetime
+from response import body_response, dumps, json_response
+from cache import SnapshotCache, etag_matches, fetch_data_version
+from db import get_read_connection, release_connection
+from prerender import fetch_rendered, save_rendered
+from stream import stream_rows, streamed_response
+from entitlements import entitlements
+from tokens import authenticate
+from admission import admission_controlled
+from instrument import instrumented
 
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 50
+
+listing_cache = SnapshotCache()
+
+
+def encode_cursor(created_at: datetime, material_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{material_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Позиция (created_at, id) последнего выданного материала или None, если курсор испорчен"""
+    try:
+        created_at, material_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(material_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def bad_request(message: str) -> dict:
+    return json_response(400, {'error': message})
+
+
+LISTING_QUERY = "SELECT id, title, material_type, image_url, created_at FROM secret_materials"
+
+
+def listing_item(row) -> dict:
+    return {
+        'id': row[0],
+        'title': row[1],
+        'material_type': row[2],
+        'image_url': row[3],
+        'created_at': row[4].isoformat()
+    }
+
+
+def load_listing(cur, cursor, limit: int):
+    """Лёгкий список материалов без content, страница по (created_at, id)"""
+    query = LISTING_QUERY
+    params = []
+    
+    if cursor:
+        query += " WHERE (created_at, id) < (%s, %s)"
+        params.extend(cursor)
+    
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+    
+    cur.execute(query, tuple(params))
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+    
+    return 200, {'materials': [listing_item(row) for row in rows], 'next_cursor': next_cursor}
+
+
+def export_response(event: dict) -> dict:
+    """Весь список материалов одним ответом: строки идут из серверного курсора и сразу кодируются"""
+    conn = get_read_connection()
+    
+    def build(writer):
+        writer.write(b'{"materials":')
+        rows = stream_rows(conn, LISTING_QUERY + " ORDER BY created_at DESC, id DESC")
+        writer.write_array(listing_item(row) for row in rows)
+        writer.write(b'}')
+    
+    try:
+        return streamed_response(event, 200, build, {'Cache-Control': 'private, no-cache'})
+    finally:
+        release_connection(conn)
+
+
+def load_material(cur, material_id: int):
+    cur.execute(
+        "SELECT id, title, content, material_type, image_url, video_url, created_at FROM secret_materials WHERE id = %s",
+        (material_id,)
+    )
+    row = cur.fetchone()
+    
+    if not row:
+        return 404, {'error': 'Материал не найден'}
+    
+    return 200, {
+        'material': {
+            'id': row[0],
+            'title': row[1],
+            'content': row[2],
+            'material_type': row[3],
+            'image_url': row[4],
+            'video_url': row[5],
+            'created_at': row[6].isoformat()
+        }
+    }
+
+
+def cached_response(event: dict, key, load, rendered_key=None) -> dict:
+    """Ответ из общего для всех Premium-пользователей кеша; в кеш попадают только ответы 200.
+
+    С rendered_key холодный контейнер берёт готовое тело из rendered_responses тем же
+    запросом, что и версию данных, и рендерит его сам, только если заготовка устарела.
+    """
+    snapshot = listing_cache.get_fresh(key)
+    
+    if snapshot is None:
+        conn = get_read_connection()
+        cur = conn.cursor()
+        try:
+            rendered = None
+            if rendered_key:
+                version, rendered = fetch_rendered(cur, *rendered_key, 'secret_materials')
+            else:
+                version = fetch_data_version(cur, 'secret_materials')
+            snapshot = listing_cache.revalidate(key, version)
+            if snapshot is None:
+                if rendered is None:
+                    status, payload = load(cur)
+                    if status != 200:
+                        return json_response(status, payload, event)
+                    body = dumps(payload)
+                    if rendered_key:
+                        rendered = save_rendered(conn, cur, *rendered_key, version, body)
+                else:
+                    body = rendered.body
+                snapshot = listing_cache.put(key, version, body)
+                if rendered is not None:
+                    snapshot.encoded.update(rendered.encoded)
+        finally:
+            cur.close()
+            release_connection(conn)
+    
+    headers = {
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'private, no-cache',
+        'ETag': snapshot.etag
+    }
+    
+    if etag_matches(event, snapshot.etag):
+        return {
+            'statusCode': 304,
+            'headers': {'Access-Control-Allow-Origin': '*', **headers},
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    return body_response(event, 200, snapshot.body, headers, snapshot.encoded)
+
+
+def prerender() -> list:
+    """Обновляет устаревшие заготовки функции; вызывается после загрузки данных"""
+    listing_cache.invalidate()
+    cached_response({}, ('list', None, DEFAULT_PAGE_SIZE), lambda cur: load_listing(cur, None, DEFAULT_PAGE_SIZE),
+                    ('secrets/listing', ''))
+    return ['secrets/listing']
+
+
+@instrumented
+@admission_controlled
 def handler(event: dict, context) -> dict:
     """API для получения секретных материалов (только для Premium подписчиков)"""
     
@@ -13,74 +182,47 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    headers = event.get('headers') or {}
-    user_id = headers.get('x-user-id') or headers.get('X-User-Id')
+    claims = authenticate(event)
     
-    if not user_id:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
-            'isBase64Encoded': False
-        }
+    if not claims:
+        return json_response(401, {'error': 'Требуется авторизация'}, event)
+    
+    if not entitlements.is_premium(claims['uid'], claims.get('pu')):
+        return json_response(403, {'error': 'Доступ только для Premium подписчиков'}, event)
+    
+    if method != 'GET':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
+    query_params = event.get('queryStringParameters') or {}
+    
+    if query_params.get('id'):
+        try:
+            material_id = int(query_params['id'])
+        except ValueError:
+            return bad_request('Некорректный id')
+        return cached_response(event, ('material', material_id), lambda cur: load_material(cur, material_id))
+    
+    if query_params.get('export') == 'true':
+        return export_response(event)
     
     try:
-        cur.execute(
-            "SELECT is_premium FROM users WHERE id = %s",
-            (user_id,)
-        )
-        user = cur.fetchone()
-        
-        if not user or not user[0]:
-            return {
-                'statusCode': 403,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Доступ только для Premium подписчиков'}),
-                'isBase64Encoded': False
-            }
-        
-        if method == 'GET':
-            cur.execute(
-                "SELECT id, title, content, material_type, image_url, video_url, created_at FROM secret_materials ORDER BY created_at DESC"
-            )
-            
-            materials = []
-            for row in cur.fetchall():
-                materials.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'content': row[2],
-                    'material_type': row[3],
-                    'image_url': row[4],
-                    'video_url': row[5],
-                    'created_at': row[6].isoformat() if row[6] else None
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'materials': materials}),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        limit = min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return bad_request('limit должен быть числом')
     
-    finally:
-        cur.close()
-        conn.close()
+    cursor = None
+    if query_params.get('cursor'):
+        cursor = decode_cursor(query_params['cursor'])
+        if cursor is None:
+            return bad_request('Некорректный cursor')
+    
+    # Заранее рендерится первая страница списка по умолчанию — её открывает каждый подписчик
+    rendered_key = ('secrets/listing', '') if cursor is None and limit == DEFAULT_PAGE_SIZE else None
+    return cached_response(event, ('list', cursor, limit), lambda cur: load_listing(cur, cursor, limit), rendered_key)
@@ -0,0 +1,82 @@
+"""Заранее отрендеренные ответы в таблице rendered_responses, общие для всех контейнеров"""
+import base64
+from db import get_connection, is_replica, release_connection
+from response import brotli, compress
+
+RENDERED_QUERY = """
+    SELECT v.version, r.version, r.body, r.body_gzip, r.body_br
+    FROM data_versions v
+    LEFT JOIN rendered_responses r ON r.endpoint = %s AND r.params = %s
+    WHERE v.name = %s
+"""
+
+# Более старый рендер не затирает более новый, если два контейнера рендерили одновременно
+STORE_QUERY = """
+    INSERT INTO rendered_responses (endpoint, params, version, body, body_gzip, body_br, rendered_at)
+    VALUES (%s, %s, %s, %s, %s, %s, NOW())
+    ON CONFLICT (endpoint, params) DO UPDATE SET
+        version = EXCLUDED.version,
+        body = EXCLUDED.body,
+        body_gzip = EXCLUDED.body_gzip,
+        body_br = EXCLUDED.body_br,
+        rendered_at = EXCLUDED.rendered_at
+    WHERE rendered_responses.version < EXCLUDED.version
+"""
+
+
+class Rendered:
+    """Тело ответа и его сжатые варианты в base64, готовые для body_response(variants=...)"""
+    __slots__ = ('version', 'body', 'encoded')
+
+    def __init__(self, version: int, body: str, encoded: dict):
+        self.version = version
+        self.body = body
+        self.encoded = encoded
+
+
+def fetch_rendered(cur, endpoint: str, params: str, version_name: str):
+    """Текущая версия данных и заготовка ответа одним запросом по первичному ключу.
+
+    Заготовка возвращается, только если она отрендерена из этой версии данных,
+    иначе вместо неё None — ответ нужно построить и сохранить через store_rendered.
+    """
+    cur.execute(RENDERED_QUERY, (endpoint, params, version_name))
+    row = cur.fetchone()
+    if row is None:
+        return 0, None
+    version, rendered_version, body, body_gzip, body_br = row
+    if rendered_version != version:
+        return version, None
+    encoded = {'gzip': base64.b64encode(body_gzip).decode()}
+    if body_br is not None:
+        encoded['br'] = base64.b64encode(body_br).decode()
+    return version, Rendered(version, body, encoded)
+
+
+def store_rendered(cur, endpoint: str, params: str, version: int, body: str) -> Rendered:
+    """Сжимает тело и сохраняет заготовку; коммит — за вызывающим"""
+    raw = body.encode('utf-8')
+    body_gzip = compress(raw, 'gzip')
+    body_br = compress(raw, 'br') if brotli is not None else None
+    cur.execute(STORE_QUERY, (endpoint, params, version, body, body_gzip, body_br))
+    encoded = {'gzip': base64.b64encode(body_gzip).decode()}
+    if body_br is not None:
+        encoded['br'] = base64.b64encode(body_br).decode()
+    return Rendered(version, body, encoded)
+
+
+def save_rendered(conn, cur, endpoint: str, params: str, version: int, body: str) -> Rendered:
+    """store_rendered с коммитом; если данные читались с реплики, заготовка пишется через primary"""
+    if not is_replica(conn):
+        rendered = store_rendered(cur, endpoint, params, version, body)
+        conn.commit()
+        return rendered
+    primary = get_connection()
+    primary_cur = primary.cursor()
+    try:
+        rendered = store_rendered(primary_cur, endpoint, params, version, body)
+        primary.commit()
+    finally:
+        primary_cur.close()
+        release_connection(primary)
+    return rendered
@@ -0,0 +1,148 @@
+"""Подписанные HMAC токены сессии, проверяемые без обращения к базе"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import timezone
+from db import get_connection, release_connection
+
+TOKEN_TTL_SECONDS = int(os.environ.get('TOKEN_TTL_SECONDS', str(7 * 24 * 3600)))
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', '30'))
+
+
+def _secret() -> bytes:
+    secret = os.environ.get('TOKEN_SECRET')
+    if not secret:
+        raise RuntimeError('Не задан TOKEN_SECRET для подписи токенов')
+    return secret.encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret(), payload.encode(), hashlib.sha256).digest())
+
+
+def _epoch(moment) -> int:
+    """Секунды epoch; наивное время из колонок TIMESTAMP хранится в UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def issue_token(user_id: int, premium_until=None) -> str:
+    """Токен вида <payload>.<подпись> с id пользователя и окончанием Premium"""
+    now = int(time.time())
+    claims = {
+        'uid': user_id,
+        'pu': _epoch(premium_until) if premium_until else None,
+        'iat': now,
+        'exp': now + TOKEN_TTL_SECONDS,
+        'jti': secrets.token_urlsafe(12)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify_token(token: str, cur=None):
+    """Данные токена или None, если подпись неверна, срок истёк или токен отозван.
+
+    cur — курсор соединения, которое вызов уже держит: через него перечитывается
+    список отзыва, чтобы не занимать второе соединение из пула.
+    """
+    if not token or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    try:
+        # Байты, а не str: compare_digest не сравнивает строки с не-ASCII символами
+        if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, RuntimeError):
+        return None
+    if claims.get('exp', 0) <= time.time():
+        return None
+    if revocations.is_revoked(claims.get('jti'), cur):
+        return None
+    return claims
+
+
+def token_from_event(event: dict):
+    headers = event.get('headers') or {}
+    token = headers.get('x-user-token') or headers.get('X-User-Token')
+    if token:
+        return token
+    authorization = headers.get('authorization') or headers.get('Authorization') or ''
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+    return None
+
+
+def authenticate(event: dict, cur=None):
+    return verify_token(token_from_event(event), cur)
+
+
+def has_premium(claims: dict) -> bool:
+    return bool(claims.get('pu')) and claims['pu'] > time.time()
+
+
+class RevocationList:
+    """Отозванные jti, которые ещё не истекли; перечитываются из базы не чаще раза в refresh_interval"""
+
+    def __init__(self, refresh_interval: float = REVOCATION_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._revoked = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: str, cur=None) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+            self.refresh(cur)
+        return jti in self._revoked
+
+    def refresh(self, cur=None) -> None:
+        """Перечитывает список через cur, если он передан, иначе через своё соединение из пула"""
+        if not self._lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if cur is not None:
+                self._load(cur)
+                return
+            conn = get_connection()
+            own_cur = conn.cursor()
+            try:
+                self._load(own_cur)
+            finally:
+                own_cur.close()
+                release_connection(conn)
+        finally:
+            self._lock.release()
+
+    def _load(self, cur) -> None:
+        cur.execute("SELECT jti FROM revoked_tokens WHERE expires_at > NOW()")
+        self._revoked = frozenset(row[0] for row in cur.fetchall())
+        self._loaded_at = time.monotonic()
+
+    def add(self, jti: str) -> None:
+        self._revoked = self._revoked | {jti}
+
+
+revocations = RevocationList()
+
+
+def revoke_token(cur, claims: dict) -> None:
+    cur.execute(
+        "INSERT INTO revoked_tokens (jti, user_id, expires_at) VALUES (%s, %s, to_timestamp(%s)) ON CONFLICT (jti) DO NOTHING",
+        (claims['jti'], claims['uid'], claims['exp'])
+    )
+    revocations.add(claims['jti'])
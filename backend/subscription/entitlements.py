@@ -0,0 +1,112 @@
+"""Кеш Premium-доступа пользователей с учётом premium_until"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from db import get_connection, get_read_connection, is_replica, release_connection
+
+ENTITLEMENT_TTL_SECONDS = float(os.environ.get('ENTITLEMENT_TTL_SECONDS', '60'))
+NEGATIVE_TTL_SECONDS = float(os.environ.get('ENTITLEMENT_NEGATIVE_TTL_SECONDS', '10'))
+MAX_ENTRIES = int(os.environ.get('ENTITLEMENT_CACHE_MAX_ENTRIES', '10000'))
+STATS_LOG_EVERY = int(os.environ.get('ENTITLEMENT_STATS_LOG_EVERY', '1000'))
+
+NO_EXPIRY = float('inf')
+
+
+class EntitlementCache:
+    """Хранит для каждого пользователя момент окончания Premium (epoch) или None.
+
+    Запись живёт до premium_until или ttl, смотря что наступит раньше; отказ в
+    доступе кешируется на короткий negative_ttl. Если токен несёт более позднее
+    окончание Premium, чем запись, запись считается устаревшей: так новая
+    подписка видна сразу, даже если её оформил другой контейнер.
+    """
+
+    def __init__(self, ttl: float = ENTITLEMENT_TTL_SECONDS, negative_ttl: float = NEGATIVE_TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def lookup(self, user_id: int, token_premium_until=None):
+        """Окончание Premium в секундах epoch (NO_EXPIRY — бессрочно) или None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            fresh = entry is not None and entry[1] > now and not (
+                token_premium_until and token_premium_until > (entry[0] or 0)
+            )
+            self.stats['hits' if fresh else 'misses'] += 1
+            lookups = self.stats['hits'] + self.stats['misses']
+        if lookups % STATS_LOG_EVERY == 0:
+            print(json.dumps({'entitlement_cache': self.snapshot()}))
+        if fresh:
+            return entry[0]
+
+        premium_until = _load_premium_until(user_id, token_premium_until)
+        if premium_until is None:
+            valid_until = now + self.negative_ttl
+        else:
+            valid_until = min(now + self.ttl, premium_until)
+        with self._lock:
+            if user_id not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (premium_until, valid_until)
+        return premium_until
+
+    def is_premium(self, user_id: int, token_premium_until=None) -> bool:
+        premium_until = self.lookup(user_id, token_premium_until)
+        return premium_until is not None and premium_until > time.time()
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def _load_premium_until(user_id: int, token_premium_until=None):
+    """Окончание Premium из базы; чтение с реплики, пока она не отстаёт от подписки в токене"""
+    conn = get_read_connection()
+    from_replica = is_replica(conn)
+    premium_until = _premium_until(_fetch_premium(conn, user_id))
+    if from_replica and token_premium_until and token_premium_until > max(premium_until or 0, time.time()):
+        # Реплика ещё не получила только что оформленную подписку — читаем свою запись с primary
+        premium_until = _premium_until(_fetch_premium(get_connection(), user_id))
+    return premium_until
+
+
+def _fetch_premium(conn, user_id: int):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT is_premium, premium_until FROM users WHERE id = %s", (user_id,))
+        return cur.fetchone()
+    finally:
+        cur.close()
+        release_connection(conn)
+
+
+def _premium_until(row):
+    if not row or not row[0]:
+        return None
+    if row[1] is None:
+        return NO_EXPIRY
+    # premium_until хранится в UTC без часового пояса, как его пишут подписка и sweeper
+    premium_until = row[1].replace(tzinfo=timezone.utc)
+    if premium_until <= datetime.now(timezone.utc):
+        return None
+    return premium_until.timestamp()
+
+
+entitlements = EntitlementCache()
@@ -1,8 +1,77 @@
-import json
-import os
-import psycopg2
-from datetime import datetime, timedelta
+from db import get_connection, release_connection
+from entitlements import NO_EXPIRY, entitlements
+from response import json_response
+from tokens import authenticate, issue_token
+from datetime import datetime, timezone
+from admission import admission_controlled, prioritize
+from instrument import instrumented
 
+SUBSCRIPTION_PRICE = 299.00
+SUBSCRIPTION_PERIOD_DAYS = 30
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Покупка одним запросом. Новый срок отсчитывается от более позднего из «сейчас» (UTC, как и все
+# сроки в users и subscriptions) и текущего premium_until; строка пользователя блокируется, чтобы
+# параллельные покупки не затёрли друг друга. Если подписка с этим ключом уже есть, ничего не
+# пишется и возвращается она вместе с текущим premium_until пользователя.
+PURCHASE_QUERY = """
+    WITH existing AS (
+        SELECT id FROM subscriptions
+        WHERE user_id = %(user_id)s AND idempotency_key = %(key)s
+    ),
+    account AS (
+        SELECT id, GREATEST(NOW() AT TIME ZONE 'UTC', premium_until) AS starts_at FROM users
+        WHERE id = %(user_id)s AND NOT EXISTS (SELECT 1 FROM existing)
+        FOR UPDATE
+    ),
+    inserted AS (
+        INSERT INTO subscriptions (user_id, amount, status, payment_method, subscription_start, subscription_end, idempotency_key)
+        SELECT id, %(amount)s, 'active', 'demo', starts_at, starts_at + %(period)s * INTERVAL '1 day', %(key)s
+        FROM account
+        ON CONFLICT (user_id, idempotency_key) DO NOTHING
+        RETURNING id, subscription_end
+    ),
+    updated AS (
+        UPDATE users SET is_premium = TRUE, premium_until = inserted.subscription_end
+        FROM inserted
+        WHERE users.id = %(user_id)s
+    )
+    SELECT id, FALSE, subscription_end FROM inserted
+    UNION ALL
+    SELECT existing.id, TRUE, users.premium_until FROM existing JOIN users ON users.id = %(user_id)s
+"""
+
+
+def idempotency_key(event: dict):
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'idempotency-key':
+            return value.strip() or None
+    return None
+
+
+def purchase(cur, user_id: int, key):
+    """(id подписки, повтор ли это, premium_until пользователя после покупки) для покупки с ключом key"""
+    cur.execute(PURCHASE_QUERY, {
+        'user_id': user_id,
+        'key': key,
+        'amount': SUBSCRIPTION_PRICE,
+        'period': SUBSCRIPTION_PERIOD_DAYS
+    })
+    row = cur.fetchone()
+    if row is None and key is not None:
+        # Параллельный запрос с тем же ключом закоммитил подписку после начала нашего запроса
+        cur.execute(
+            "SELECT s.id, TRUE, u.premium_until FROM subscriptions s "
+            "JOIN users u ON u.id = s.user_id WHERE s.user_id = %s AND s.idempotency_key = %s",
+            (user_id, key)
+        )
+        row = cur.fetchone()
+    return row
+
+
+@instrumented
+@admission_controlled
 def handler(event: dict, context) -> dict:
     """API для оформления подписки и управления премиум-доступом"""
     
@@ -14,103 +83,65 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Token, Authorization, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    claims = authenticate(event)
+    
+    if not claims:
+        return json_response(401, {'error': 'Требуется авторизация'}, event)
+    
+    user_id = claims['uid']
+    
+    if method == 'POST':
+        # Оплата подписки ждёт допуска к базе раньше анонимного чтения
+        prioritize()
+    
+    if method == 'GET':
+        premium_until = entitlements.lookup(user_id, claims.get('pu'))
+        is_premium = premium_until is not None
+        
+        return json_response(200, {
+            'is_premium': is_premium,
+            'premium_until': datetime.fromtimestamp(premium_until, timezone.utc).isoformat() if is_premium and premium_until != NO_EXPIRY else None
+        }, event)
+    
+    conn = get_connection()
     cur = conn.cursor()
     
     try:
         if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            user_id = body.get('user_id')
-            
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'user_id обязателен'}),
-                    'isBase64Encoded': False
-                }
-            
-            subscription_end = datetime.now() + timedelta(days=30)
-            
-            cur.execute(
-                "INSERT INTO subscriptions (user_id, amount, status, payment_method, subscription_end) VALUES (%s, %s, %s, %s, %s) RETURNING id",
-                (user_id, 299.00, 'active', 'demo', subscription_end)
-            )
-            subscription_id = cur.fetchone()[0]
-            
-            cur.execute(
-                "UPDATE users SET is_premium = TRUE, premium_until = %s WHERE id = %s",
-                (subscription_end, user_id)
-            )
+            key = idempotency_key(event)
+            if key is not None and len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                return json_response(400, {'error': 'Слишком длинный Idempotency-Key'}, event)
             
+            row = purchase(cur, user_id, key)
             conn.commit()
+            if row is None:
+                return json_response(404, {'error': 'Пользователь не найден'}, event)
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'subscription_id': subscription_id,
-                    'premium_until': subscription_end.isoformat(),
-                    'message': 'Подписка успешно оформлена!'
-                }),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            user_id = query_params.get('user_id')
+            # Повтор отдаёт текущий срок: после него могли быть оформлены другие подписки
+            subscription_id, replayed, premium_until = row
+            if not replayed:
+                entitlements.invalidate(user_id)
             
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'user_id обязателен'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                "SELECT is_premium, premium_until FROM users WHERE id = %s",
-                (user_id,)
-            )
-            user = cur.fetchone()
-            
-            if user:
-                is_premium = user[0]
-                premium_until = user[1].isoformat() if user[1] else None
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'is_premium': is_premium,
-                        'premium_until': premium_until
-                    }),
-                    'isBase64Encoded': False
-                }
-            else:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пользователь не найден'}),
-                    'isBase64Encoded': False
-                }
+            return json_response(200, {
+                'success': True,
+                'subscription_id': subscription_id,
+                'premium_until': premium_until.replace(tzinfo=timezone.utc).isoformat() if premium_until else None,
+                'token': issue_token(user_id, premium_until),
+                'message': 'Подписка успешно оформлена!'
+            }, event, {
+                'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+                'Idempotent-Replayed': 'true' if replayed else 'false'
+            })
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
     
     finally:
         cur.close()
-        conn.close()
+        release_connection(conn)
@@ -0,0 +1,91 @@
+import hmac
+import json
+import os
+import time
+from db import get_connection, release_connection
+from response import json_response
+from admission import admission_controlled
+from instrument import instrumented
+
+CHUNK_SIZE = int(os.environ.get('SWEEP_CHUNK_SIZE', '500'))
+TIME_BUDGET_SECONDS = float(os.environ.get('SWEEP_TIME_BUDGET_SECONDS', '20'))
+
+# Сроки в users и subscriptions хранятся в UTC без часового пояса, поэтому сравниваются
+# с NOW() в UTC, а не с часами сессии. Одна пачка — одна короткая транзакция. Строки, заблокированные живыми запросами
+# (например, продлением подписки), пропускаются и будут обработаны следующим запуском.
+SWEEP_CHUNK_QUERY = """
+    WITH lapsed AS (
+        SELECT id FROM users
+        WHERE is_premium = TRUE AND premium_until < NOW() AT TIME ZONE 'UTC'
+        ORDER BY premium_until
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ),
+    expired_users AS (
+        UPDATE users u SET is_premium = FALSE
+        FROM lapsed
+        WHERE u.id = lapsed.id
+        RETURNING u.id
+    ),
+    expired_subscriptions AS (
+        UPDATE subscriptions s SET status = 'expired'
+        FROM expired_users e
+        WHERE s.user_id = e.id AND s.status = 'active' AND s.subscription_end <= NOW() AT TIME ZONE 'UTC'
+        RETURNING s.id
+    )
+    SELECT (SELECT COUNT(*) FROM expired_users), (SELECT COUNT(*) FROM expired_subscriptions)
+"""
+
+
+def sweep(chunk_size: int = CHUNK_SIZE, time_budget: float = TIME_BUDGET_SECONDS) -> dict:
+    """Снимает Premium с пользователей, у которых истёк premium_until, пачками по chunk_size"""
+    started = time.perf_counter()
+    report = {'users_expired': 0, 'subscriptions_expired': 0, 'chunks': 0, 'complete': False}
+    
+    conn = get_connection()
+    cur = conn.cursor()
+    
+    try:
+        while time.perf_counter() - started < time_budget:
+            cur.execute(SWEEP_CHUNK_QUERY, (chunk_size,))
+            users, subscriptions = cur.fetchone()
+            conn.commit()
+            report['chunks'] += 1
+            report['users_expired'] += users
+            report['subscriptions_expired'] += subscriptions
+            if users < chunk_size:
+                report['complete'] = True
+                break
+    finally:
+        cur.close()
+        release_connection(conn)
+    
+    elapsed = time.perf_counter() - started
+    report['elapsed_ms'] = round(elapsed * 1000, 3)
+    report['rows_per_second'] = round((report['users_expired'] + report['subscriptions_expired']) / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def is_authorized(event: dict) -> bool:
+    """Запуск по таймеру приходит без httpMethod; HTTP-вызов требует SWEEPER_SECRET, если он задан"""
+    secret = os.environ.get('SWEEPER_SECRET')
+    if 'httpMethod' not in event or not secret:
+        return True
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    return hmac.compare_digest(headers.get('x-sweeper-secret', ''), secret)
+
+
+@instrumented
+@admission_controlled
+def handler(event: dict, context) -> dict:
+    """Плановое снятие истёкшего Premium-доступа и закрытие подписок"""
+    
+    if event.get('httpMethod') not in (None, 'POST'):
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+    
+    if not is_authorized(event):
+        return json_response(403, {'error': 'Доступ запрещён'}, event)
+    
+    report = sweep()
+    print(json.dumps({'premium_sweep': report}))
+    return json_response(200, report, event)
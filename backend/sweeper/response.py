@@ -0,0 +1,101 @@
+"""Сборка HTTP-ответов: компактный JSON и сжатие по Accept-Encoding"""
+import base64
+import gzip
+import json
+import os
+from instrument import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def dumps(payload) -> str:
+    """JSON без пробелов и \\u-экранирования кириллицы; orjson, если он установлен"""
+    with phase('serialize'):
+        if orjson is not None:
+            try:
+                return orjson.dumps(payload).decode()
+            except TypeError:
+                pass
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def negotiate_encoding(event: dict):
+    headers = (event or {}).get('headers') or {}
+    accept = (headers.get('accept-encoding') or headers.get('Accept-Encoding') or '').lower()
+    offered = {}
+    for part in accept.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    if brotli is not None and offered.get('br', 0) > 0:
+        return 'br'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    with phase('compress'):
+        if encoding == 'br':
+            return brotli.compress(data, quality=BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def encoded_body(event: dict, body: str, variants: dict = None):
+    """Тело ответа, флаг base64 и выбранное сжатие.
+
+    variants — словарь для запоминания уже сжатых вариантов одного и того же
+    тела (например, снимка из кеша), чтобы не сжимать его на каждый запрос.
+    """
+    raw = body.encode('utf-8')
+    encoding = negotiate_encoding(event) if len(raw) >= COMPRESSION_MIN_BYTES else None
+    if encoding is None:
+        return body, False, None
+    if variants is not None and encoding in variants:
+        return variants[encoding], True, encoding
+    encoded = base64.b64encode(compress(raw, encoding)).decode()
+    if variants is not None:
+        variants[encoding] = encoded
+    return encoded, True, encoding
+
+
+def body_response(event: dict, status: int, body: str, headers: dict = None, variants: dict = None) -> dict:
+    response_headers = dict(JSON_HEADERS, Vary='Accept-Encoding')
+    if headers:
+        response_headers.update(headers)
+    body, is_base64, encoding = encoded_body(event, body, variants)
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+        etag = response_headers.get('ETag')
+        if etag:
+            # Сжатое представление — другой набор байт, поэтому и строгий ETag у него свой
+            response_headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+    return {
+        'statusCode': status,
+        'headers': response_headers,
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+
+def json_response(status: int, payload, event: dict = None, headers: dict = None) -> dict:
+    return body_response(event, status, dumps(payload), headers)
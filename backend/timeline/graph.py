@@ -0,0 +1,139 @@
+"""Граф связей фильмов и персонажей, построенный в памяти контейнера"""
+import threading
+import time
+from collections import Counter, deque
+from cache import VERSION_PROBE_INTERVAL_SECONDS, fetch_data_version
+from db import get_read_connection, release_connection
+
+MAX_HOPS = 6
+
+
+class CatalogGraph:
+    """Смежность фильм↔фильм по пасхалкам и фильм↔персонаж по movie_characters.
+
+    Ссылка пасхалки считается ненаправленной связью: фильм связан и с тем,
+    на который ссылается, и с теми, что ссылаются на него.
+    """
+
+    def __init__(self, movies: dict, characters: dict, references: list, appearances: list):
+        self.movies = movies
+        self.characters = characters
+        self.movie_links = {movie_id: {} for movie_id in movies}
+        self.movie_characters = {movie_id: set() for movie_id in movies}
+        self.character_movies = {character_id: set() for character_id in characters}
+
+        for movie_id, referenced_id, egg_title in references:
+            if movie_id in movies and referenced_id in movies and movie_id != referenced_id:
+                self.movie_links[movie_id].setdefault(referenced_id, egg_title)
+                self.movie_links[referenced_id].setdefault(movie_id, egg_title)
+
+        for movie_id, character_id in appearances:
+            if movie_id in movies and character_id in characters:
+                self.movie_characters[movie_id].add(character_id)
+                self.character_movies[character_id].add(movie_id)
+
+    @classmethod
+    def load(cls, cur) -> 'CatalogGraph':
+        cur.execute("SELECT id, title FROM movies")
+        movies = dict(cur.fetchall())
+        cur.execute("SELECT id, name FROM characters")
+        characters = dict(cur.fetchall())
+        cur.execute("SELECT movie_id, references_movie_id, title FROM easter_eggs WHERE references_movie_id IS NOT NULL")
+        references = cur.fetchall()
+        cur.execute("SELECT movie_id, character_id FROM movie_characters")
+        appearances = cur.fetchall()
+        return cls(movies, characters, references, appearances)
+
+    def movie(self, movie_id: int) -> dict:
+        return {'id': movie_id, 'title': self.movies[movie_id]}
+
+    def connected_movies(self, movie_id: int, hops: int) -> list:
+        """Фильмы в пределах hops ссылок от movie_id, ближайшие первыми"""
+        distances = {movie_id: 0}
+        queue = deque([movie_id])
+        while queue:
+            current = queue.popleft()
+            if distances[current] == hops:
+                continue
+            for neighbour in self.movie_links[current]:
+                if neighbour not in distances:
+                    distances[neighbour] = distances[current] + 1
+                    queue.append(neighbour)
+        del distances[movie_id]
+        return [
+            dict(self.movie(other), hops=distance)
+            for other, distance in sorted(distances.items(), key=lambda item: (item[1], item[0]))
+        ]
+
+    def shortest_path(self, source: int, target: int):
+        """Кратчайшая цепочка ссылок между фильмами или None, если они не связаны"""
+        previous = {source: None}
+        queue = deque([source])
+        while queue and target not in previous:
+            current = queue.popleft()
+            for neighbour in self.movie_links[current]:
+                if neighbour not in previous:
+                    previous[neighbour] = current
+                    queue.append(neighbour)
+        if target not in previous:
+            return None
+        path = []
+        node = target
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        steps = []
+        for index, movie_id in enumerate(path):
+            step = self.movie(movie_id)
+            if index:
+                step['via_easter_egg'] = self.movie_links[path[index - 1]][movie_id]
+            steps.append(step)
+        return steps
+
+    def co_appearing(self, character_id: int) -> list:
+        """Персонажи, встречавшиеся с character_id, по числу общих фильмов"""
+        shared = Counter()
+        for movie_id in self.character_movies[character_id]:
+            for other in self.movie_characters[movie_id]:
+                if other != character_id:
+                    shared[other] += 1
+        return [
+            {'id': other, 'name': self.characters[other], 'shared_movies': count}
+            for other, count in sorted(shared.items(), key=lambda item: (-item[1], self.characters[item[0]]))
+        ]
+
+
+class GraphIndex:
+    """Держит один граф на контейнер и перестраивает его при смене версии данных timeline"""
+
+    def __init__(self, probe_interval: float = VERSION_PROBE_INTERVAL_SECONDS):
+        self.probe_interval = probe_interval
+        self._graph = None
+        self._version = None
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def get(self) -> CatalogGraph:
+        if self._graph is not None and time.monotonic() - self._probed_at < self.probe_interval:
+            return self._graph
+        with self._lock:
+            if self._graph is not None and time.monotonic() - self._probed_at < self.probe_interval:
+                return self._graph
+            conn = get_read_connection()
+            cur = conn.cursor()
+            try:
+                version = fetch_data_version(cur, 'timeline')
+                if self._graph is None or version != self._version:
+                    self._graph = CatalogGraph.load(cur)
+                    self._version = version
+                    self.rebuilds += 1
+            finally:
+                cur.close()
+                release_connection(conn)
+            self._probed_at = time.monotonic()
+            return self._graph
+
+
+graph_index = GraphIndex()
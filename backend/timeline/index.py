@@ -1,8 +1,352 @@
-import json
-import os
-import psycopg2
+from db import get_read_connection, release_connection
 from datetime import date
+from response import body_response, dumps, json_response
+from cache import SnapshotCache, etag_matches, fetch_data_version
+from graph import MAX_HOPS, graph_index
+from prerender import fetch_rendered, save_rendered
+from stream import JsonWriter, stream_rows
+from admission import admission_controlled
+from instrument import instrumented
 
+catalog_cache = SnapshotCache()
+stats_cache = SnapshotCache()
+
+MAX_BATCH_MOVIES = 50
+MAX_CO_APPEARANCES = 50
+
+GRAPH_PARAMS = ('connected_to', 'path_from', 'path_to', 'co_appearing_with')
+
+
+def catalog_query(phase_id, character_id):
+    query = """
+        SELECT m.id, m.title, m.description, m.release_date, m.chronological_order,
+               m.phase_id, m.content_type, m.image_url, m.duration_minutes, m.director,
+               m.box_office, m.rating, m.universe,
+               p.name as phase_name, p.description as phase_description
+        FROM movies m
+        LEFT JOIN phases p ON m.phase_id = p.id
+        WHERE 1=1
+    """
+    params = []
+    
+    if phase_id:
+        query += " AND m.phase_id = %s"
+        params.append(phase_id)
+    
+    if character_id:
+        query += """ AND m.id IN (
+            SELECT movie_id FROM movie_characters WHERE character_id = %s
+        )"""
+        params.append(character_id)
+    
+    query += " ORDER BY m.chronological_order, m.release_date"
+    return query, tuple(params)
+
+
+PHASES_QUERY = "SELECT id, name, description, start_year, end_year FROM phases ORDER BY id"
+CHARACTERS_QUERY = "SELECT id, name, real_name, actor, image_url FROM characters ORDER BY name"
+
+
+def movie_item(row) -> dict:
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'release_date': row[3].isoformat() if row[3] else None,
+        'chronological_order': row[4],
+        'phase_id': row[5],
+        'content_type': row[6],
+        'image_url': row[7],
+        'duration_minutes': row[8],
+        'director': row[9],
+        'box_office': row[10],
+        'rating': float(row[11]) if row[11] else None,
+        'universe': row[12],
+        'phase_name': row[13],
+        'phase_description': row[14]
+    }
+
+
+def phase_item(row) -> dict:
+    return {
+        'id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'start_year': row[3],
+        'end_year': row[4]
+    }
+
+
+def character_item(row) -> dict:
+    return {
+        'id': row[0],
+        'name': row[1],
+        'real_name': row[2],
+        'actor': row[3],
+        'image_url': row[4]
+    }
+
+
+def load_catalog(cur, phase_id, character_id) -> dict:
+    """Фильмы (с учётом фильтров), фазы и персонажи одним словарём"""
+    cur.execute(*catalog_query(phase_id, character_id))
+    movies = [movie_item(row) for row in cur.fetchall()]
+    
+    cur.execute(PHASES_QUERY)
+    phases = [phase_item(row) for row in cur.fetchall()]
+    
+    cur.execute(CHARACTERS_QUERY)
+    characters = [character_item(row) for row in cur.fetchall()]
+    
+    return {
+        'movies': movies,
+        'phases': phases,
+        'characters': characters
+    }
+
+
+def render_catalog(cur, phase_id, character_id) -> str:
+    """Тот же каталог, что и load_catalog, но собранный потоково из серверных курсоров"""
+    writer = JsonWriter()
+    writer.write(b'{"movies":')
+    writer.write_array(movie_item(row) for row in stream_rows(cur.connection, *catalog_query(phase_id, character_id)))
+    cur.execute(PHASES_QUERY)
+    writer.write(b',"phases":')
+    writer.write_array(phase_item(row) for row in cur.fetchall())
+    writer.write(b',"characters":')
+    writer.write_array(character_item(row) for row in stream_rows(cur.connection, CHARACTERS_QUERY))
+    writer.write(b'}')
+    return writer.getvalue().decode('utf-8')
+
+
+def snapshot_response(event: dict, cache: SnapshotCache, version_name: str, key, render, rendered_key=None) -> dict:
+    """Ответ из кеша снимков: без запроса к базе, пока версия данных не менялась.
+
+    С rendered_key холодный контейнер берёт готовое тело из rendered_responses тем же
+    запросом, что и версию данных, и рендерит его сам, только если заготовка устарела.
+    """
+    snapshot = cache.get_fresh(key)
+    
+    if snapshot is None:
+        conn = get_read_connection()
+        cur = conn.cursor()
+        try:
+            rendered = None
+            if rendered_key:
+                version, rendered = fetch_rendered(cur, *rendered_key, version_name)
+            else:
+                version = fetch_data_version(cur, version_name)
+            snapshot = cache.revalidate(key, version)
+            if snapshot is None:
+                if rendered is None:
+                    body = render(cur)
+                    if rendered_key:
+                        rendered = save_rendered(conn, cur, *rendered_key, version, body)
+                else:
+                    body = rendered.body
+                snapshot = cache.put(key, version, body)
+                if rendered is not None:
+                    snapshot.encoded.update(rendered.encoded)
+        finally:
+            cur.close()
+            release_connection(conn)
+    
+    headers = {
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'no-cache',
+        'ETag': snapshot.etag
+    }
+    
+    if etag_matches(event, snapshot.etag):
+        return {
+            'statusCode': 304,
+            'headers': {'Access-Control-Allow-Origin': '*', **headers},
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    return body_response(event, 200, snapshot.body, headers, snapshot.encoded)
+
+
+def catalog_response(event: dict, phase_id, character_id) -> dict:
+    key = (phase_id or '', character_id or '')
+    # Заранее рендерится только полный каталог: отфильтрованных вариантов слишком много
+    rendered_key = None if phase_id or character_id else ('timeline/catalog', '')
+    return snapshot_response(event, catalog_cache, 'timeline', key,
+                             lambda cur: render_catalog(cur, phase_id, character_id), rendered_key)
+
+
+def prerender() -> list:
+    """Обновляет устаревшие заготовки функции; вызывается после загрузки данных"""
+    catalog_cache.invalidate()
+    catalog_response({}, None, None)
+    return ['timeline/catalog']
+
+
+def load_phase_stats(cur) -> dict:
+    """Итоги по фазам из материализованного представления phase_stats"""
+    cur.execute("""
+        SELECT phase_id, phase_name, movie_count, box_office_total, runtime_total_minutes, average_rating
+        FROM phase_stats
+        ORDER BY phase_id
+    """)
+    return {
+        'phases': [
+            {
+                'phase_id': row[0],
+                'phase_name': row[1],
+                'movie_count': row[2],
+                'box_office_total': row[3],
+                'runtime_total_minutes': row[4],
+                'average_rating': float(row[5]) if row[5] is not None else None
+            }
+            for row in cur.fetchall()
+        ]
+    }
+
+
+def load_co_appearances(cur, character_id: int) -> dict:
+    """Персонажи, чаще всего появлявшиеся вместе с character_id, из character_co_appearances"""
+    cur.execute("""
+        SELECT c.id, c.name, ca.shared_movies
+        FROM character_co_appearances ca
+        JOIN characters c ON c.id = ca.other_character_id
+        WHERE ca.character_id = %s
+        ORDER BY ca.shared_movies DESC, c.name
+        LIMIT %s
+    """, (character_id, MAX_CO_APPEARANCES))
+    return {
+        'character_id': character_id,
+        'co_appearances': [
+            {'id': row[0], 'name': row[1], 'shared_movies': row[2]}
+            for row in cur.fetchall()
+        ]
+    }
+
+
+def stats_response(event: dict, query_params: dict) -> dict:
+    kind = query_params.get('stats')
+    
+    if kind == 'phases':
+        return snapshot_response(event, stats_cache, 'timeline_stats', ('phases',),
+                                 lambda cur: dumps(load_phase_stats(cur)))
+    
+    if kind == 'co_appearances':
+        try:
+            character_id = int(query_params.get('character_id', ''))
+        except ValueError:
+            return json_response(400, {'error': 'Укажите числовой character_id'}, event)
+        return snapshot_response(event, stats_cache, 'timeline_stats', ('co_appearances', character_id),
+                                 lambda cur: dumps(load_co_appearances(cur, character_id)))
+    
+    return json_response(400, {'error': 'Допустимые stats: phases, co_appearances'}, event)
+
+
+MOVIE_DETAILS_QUERY = """
+    SELECT m.id, m.title, m.description, m.release_date, m.chronological_order,
+           m.phase_id, m.content_type, m.image_url, m.duration_minutes, m.director,
+           m.box_office, m.rating, m.universe,
+           p.name as phase_name,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'id', c.id, 'name', c.name, 'real_name', c.real_name,
+                          'actor', c.actor, 'role', mc.role
+                      ) ORDER BY
+                          CASE mc.role
+                              WHEN 'main' THEN 1
+                              WHEN 'supporting' THEN 2
+                              ELSE 3
+                          END)
+               FROM movie_characters mc
+               JOIN characters c ON c.id = mc.character_id
+               WHERE mc.movie_id = m.id
+           ), '[]'::json) as characters,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'id', e.id, 'title', e.title, 'description', e.description,
+                          'timestamp_minutes', e.timestamp_minutes
+                      ) ORDER BY e.timestamp_minutes)
+               FROM easter_eggs e
+               WHERE e.movie_id = m.id
+           ), '[]'::json) as easter_eggs
+    FROM movies m
+    LEFT JOIN phases p ON m.phase_id = p.id
+    WHERE m.id = ANY(%s)
+"""
+
+
+def load_movie_details(cur, ids: list) -> dict:
+    """Карточки фильмов с персонажами и пасхалками за один запрос, по id фильма"""
+    cur.execute(MOVIE_DETAILS_QUERY, (ids,))
+    
+    movies = {}
+    for row in cur.fetchall():
+        movies[row[0]] = {
+            'id': row[0],
+            'title': row[1],
+            'description': row[2],
+            'release_date': row[3].isoformat() if row[3] else None,
+            'chronological_order': row[4],
+            'phase_id': row[5],
+            'content_type': row[6],
+            'image_url': row[7],
+            'duration_minutes': row[8],
+            'director': row[9],
+            'box_office': row[10],
+            'rating': float(row[11]) if row[11] else None,
+            'universe': row[12],
+            'phase_name': row[13],
+            'characters': row[14],
+            'easter_eggs': row[15]
+        }
+    return movies
+
+
+def graph_response(event: dict, query_params: dict) -> dict:
+    """Запросы по графу связей: соседи в пределах N ссылок, кратчайший путь, общие персонажи"""
+    try:
+        connected_to = query_params.get('connected_to')
+        path_from = query_params.get('path_from')
+        path_to = query_params.get('path_to')
+        co_appearing = query_params.get('co_appearing_with')
+        hops = int(query_params.get('hops', 1))
+        connected_to = int(connected_to) if connected_to else None
+        path_from = int(path_from) if path_from else None
+        path_to = int(path_to) if path_to else None
+        co_appearing = int(co_appearing) if co_appearing else None
+    except ValueError:
+        return json_response(400, {'error': 'Идентификаторы и hops должны быть числами'}, event)
+    
+    graph = graph_index.get()
+    
+    if connected_to is not None:
+        if not 1 <= hops <= MAX_HOPS:
+            return json_response(400, {'error': f'hops должен быть от 1 до {MAX_HOPS}'}, event)
+        if connected_to not in graph.movies:
+            return json_response(404, {'error': 'Фильм не найден'}, event)
+        return json_response(200, {
+            'movie': graph.movie(connected_to),
+            'hops': hops,
+            'movies': graph.connected_movies(connected_to, hops)
+        }, event)
+    
+    if path_from is not None or path_to is not None:
+        if path_from is None or path_to is None:
+            return json_response(400, {'error': 'Укажите path_from и path_to'}, event)
+        if path_from not in graph.movies or path_to not in graph.movies:
+            return json_response(404, {'error': 'Фильм не найден'}, event)
+        return json_response(200, {'path': graph.shortest_path(path_from, path_to)}, event)
+    
+    if co_appearing not in graph.characters:
+        return json_response(404, {'error': 'Персонаж не найден'}, event)
+    return json_response(200, {
+        'character': {'id': co_appearing, 'name': graph.characters[co_appearing]},
+        'characters': graph.co_appearing(co_appearing)
+    }, event)
+
+
+@instrumented
+@admission_controlled
 def handler(event: dict, context) -> dict:
     """API для интерактивной хронологии Marvel с фильмами, персонажами и пасхалками"""
     
@@ -14,195 +358,59 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    query_params = event.get('queryStringParameters') or {}
+    movie_id = query_params.get('movie_id')
+    movie_ids = query_params.get('movie_ids')
+    
+    if method == 'GET' and query_params.get('stats'):
+        return stats_response(event, query_params)
+    
+    if method == 'GET' and any(query_params.get(key) for key in GRAPH_PARAMS):
+        return graph_response(event, query_params)
+    
+    if method == 'GET' and not movie_id and not movie_ids:
+        return catalog_response(event, query_params.get('phase_id'), query_params.get('character_id'))
+    
+    if method != 'GET':
+        return json_response(405, {'error': 'Метод не поддерживается'}, event)
+    
+    # Список через запятую допустим только в movie_ids; movie_id — ровно один идентификатор
+    if not movie_ids:
+        try:
+            ids = [int(movie_id)]
+        except ValueError:
+            return json_response(400, {'error': 'movie_id должен быть числом'}, event)
+    else:
+        try:
+            ids = [int(value) for value in movie_ids.split(',') if value.strip()]
+        except ValueError:
+            ids = []
+        if not ids or len(ids) > MAX_BATCH_MOVIES:
+            return json_response(400, {'error': f'Укажите от 1 до {MAX_BATCH_MOVIES} числовых идентификаторов фильмов'}, event)
+    
+    conn = get_read_connection()
     cur = conn.cursor()
     
     try:
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            phase_id = query_params.get('phase_id')
-            character_id = query_params.get('character_id')
-            movie_id = query_params.get('movie_id')
-            
-            if movie_id:
-                cur.execute("""
-                    SELECT m.id, m.title, m.description, m.release_date, m.chronological_order,
-                           m.phase_id, m.content_type, m.image_url, m.duration_minutes, m.director,
-                           m.box_office, m.rating, m.universe,
-                           p.name as phase_name
-                    FROM movies m
-                    LEFT JOIN phases p ON m.phase_id = p.id
-                    WHERE m.id = %s
-                """, (movie_id,))
-                
-                row = cur.fetchone()
-                if not row:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Фильм не найден'}),
-                        'isBase64Encoded': False
-                    }
-                
-                movie = {
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'release_date': row[3].isoformat() if row[3] else None,
-                    'chronological_order': row[4],
-                    'phase_id': row[5],
-                    'content_type': row[6],
-                    'image_url': row[7],
-                    'duration_minutes': row[8],
-                    'director': row[9],
-                    'box_office': row[10],
-                    'rating': float(row[11]) if row[11] else None,
-                    'universe': row[12],
-                    'phase_name': row[13]
-                }
-                
-                cur.execute("""
-                    SELECT c.id, c.name, c.real_name, c.actor, mc.role
-                    FROM characters c
-                    JOIN movie_characters mc ON c.id = mc.character_id
-                    WHERE mc.movie_id = %s
-                    ORDER BY 
-                        CASE mc.role 
-                            WHEN 'main' THEN 1 
-                            WHEN 'supporting' THEN 2 
-                            ELSE 3 
-                        END
-                """, (movie_id,))
-                
-                characters = []
-                for char_row in cur.fetchall():
-                    characters.append({
-                        'id': char_row[0],
-                        'name': char_row[1],
-                        'real_name': char_row[2],
-                        'actor': char_row[3],
-                        'role': char_row[4]
-                    })
-                
-                cur.execute("""
-                    SELECT id, title, description, timestamp_minutes
-                    FROM easter_eggs
-                    WHERE movie_id = %s
-                    ORDER BY timestamp_minutes
-                """, (movie_id,))
-                
-                easter_eggs = []
-                for egg_row in cur.fetchall():
-                    easter_eggs.append({
-                        'id': egg_row[0],
-                        'title': egg_row[1],
-                        'description': egg_row[2],
-                        'timestamp_minutes': egg_row[3]
-                    })
-                
-                movie['characters'] = characters
-                movie['easter_eggs'] = easter_eggs
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'movie': movie}),
-                    'isBase64Encoded': False
-                }
-            
-            query = """
-                SELECT m.id, m.title, m.description, m.release_date, m.chronological_order,
-                       m.phase_id, m.content_type, m.image_url, m.duration_minutes, m.director,
-                       m.box_office, m.rating, m.universe,
-                       p.name as phase_name, p.description as phase_description
-                FROM movies m
-                LEFT JOIN phases p ON m.phase_id = p.id
-                WHERE 1=1
-            """
-            params = []
-            
-            if phase_id:
-                query += " AND m.phase_id = %s"
-                params.append(phase_id)
-            
-            if character_id:
-                query += """ AND m.id IN (
-                    SELECT movie_id FROM movie_characters WHERE character_id = %s
-                )"""
-                params.append(character_id)
-            
-            query += " ORDER BY m.chronological_order, m.release_date"
-            
-            cur.execute(query, tuple(params))
-            
-            movies = []
-            for row in cur.fetchall():
-                movies.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'release_date': row[3].isoformat() if row[3] else None,
-                    'chronological_order': row[4],
-                    'phase_id': row[5],
-                    'content_type': row[6],
-                    'image_url': row[7],
-                    'duration_minutes': row[8],
-                    'director': row[9],
-                    'box_office': row[10],
-                    'rating': float(row[11]) if row[11] else None,
-                    'universe': row[12],
-                    'phase_name': row[13],
-                    'phase_description': row[14]
-                })
-            
-            cur.execute("SELECT id, name, description, start_year, end_year FROM phases ORDER BY id")
-            phases = []
-            for phase_row in cur.fetchall():
-                phases.append({
-                    'id': phase_row[0],
-                    'name': phase_row[1],
-                    'description': phase_row[2],
-                    'start_year': phase_row[3],
-                    'end_year': phase_row[4]
-                })
-            
-            cur.execute("SELECT id, name, real_name, actor, image_url FROM characters ORDER BY name")
-            characters = []
-            for char_row in cur.fetchall():
-                characters.append({
-                    'id': char_row[0],
-                    'name': char_row[1],
-                    'real_name': char_row[2],
-                    'actor': char_row[3],
-                    'image_url': char_row[4]
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'movies': movies,
-                    'phases': phases,
-                    'characters': characters
-                }),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
-    
+        found = load_movie_details(cur, ids)
     finally:
         cur.close()
-        conn.close()
+        release_connection(conn)
+    
+    if movie_ids:
+        return json_response(200, {
+            'movies': [found[movie] for movie in ids if movie in found],
+            'not_found': [movie for movie in ids if movie not in found]
+        }, event)
+    
+    if ids[0] not in found:
+        return json_response(404, {'error': 'Фильм не найден'}, event)
+    
+    return json_response(200, {'movie': found[ids[0]]}, event)
@@ -0,0 +1,122 @@
+"""Потоковая сборка больших JSON-ответов: строки из серверного курсора пачками, без списка словарей"""
+import base64
+import io
+import itertools
+import json
+import os
+import zlib
+from instrument import phase
+from response import BROTLI_QUALITY, GZIP_LEVEL, JSON_HEADERS, brotli, negotiate_encoding
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '2000'))
+COMPRESS_CHUNK_BYTES = 64 * 1024
+
+_cursor_names = itertools.count()
+
+
+def encode(item) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(item)
+        except TypeError:
+            pass
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def stream_rows(conn, query: str, params=None, batch_size: int = STREAM_BATCH_SIZE):
+    """Строки запроса из именованного (серверного) курсора, по batch_size за обращение к базе.
+
+    Курсор живёт внутри транзакции соединения; release_connection её откатит.
+    """
+    cur = conn.cursor(name=f'stream_{next(_cursor_names)}')
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+
+class JsonWriter:
+    """Собирает JSON по кускам в один буфер.
+
+    С encoding='gzip' или 'br' куски сжимаются по мере записи, так что несжатое
+    тело целиком в памяти не появляется.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self._out = io.BytesIO()
+        self._pending = io.BytesIO()
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = None
+
+    def write(self, data: bytes) -> None:
+        if self._compressor is None:
+            self._out.write(data)
+            return
+        self._pending.write(data)
+        if self._pending.tell() >= COMPRESS_CHUNK_BYTES:
+            self._compress_pending()
+
+    def write_array(self, items) -> None:
+        """JSON-массив из итератора: каждый элемент кодируется и сразу пишется в буфер"""
+        self.write(b'[')
+        first = True
+        for item in items:
+            if not first:
+                self.write(b',')
+            self.write(encode(item))
+            first = False
+        self.write(b']')
+
+    def _compress_pending(self) -> None:
+        data = self._pending.getvalue()
+        self._pending = io.BytesIO()
+        with phase('compress'):
+            if self.encoding == 'br':
+                self._out.write(self._compressor.process(data))
+            else:
+                self._out.write(self._compressor.compress(data))
+
+    def getvalue(self) -> bytes:
+        if self._compressor is not None:
+            self._compress_pending()
+            with phase('compress'):
+                self._out.write(self._compressor.finish() if self.encoding == 'br' else self._compressor.flush())
+            self._compressor = None
+        return self._out.getvalue()
+
+
+def streamed_response(event: dict, status: int, build, headers: dict = None) -> dict:
+    """Ответ, тело которого пишет build(writer); сжатие выбирается по Accept-Encoding"""
+    encoding = negotiate_encoding(event)
+    writer = JsonWriter(encoding)
+    build(writer)
+    data = writer.getvalue()
+    response_headers = dict(JSON_HEADERS, Vary='Accept-Encoding')
+    if headers:
+        response_headers.update(headers)
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+        body, is_base64 = base64.b64encode(data).decode(), True
+    else:
+        body, is_base64 = data.decode('utf-8'), False
+    return {
+        'statusCode': status,
+        'headers': response_headers,
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
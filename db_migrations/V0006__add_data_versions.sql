@@ -0,0 +1,37 @@
+-- Версии данных для инвалидации кешей в тёплых контейнерах функций
+
+CREATE TABLE data_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO data_versions (name) VALUES ('timeline');
+
+-- Любое изменение в отслеживаемой таблице увеличивает версию, имя которой передано аргументом триггера
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_phases_timeline_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON phases
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('timeline');
+
+CREATE TRIGGER trg_movies_timeline_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON movies
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('timeline');
+
+CREATE TRIGGER trg_characters_timeline_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON characters
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('timeline');
+
+CREATE TRIGGER trg_movie_characters_timeline_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON movie_characters
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('timeline');
+
+CREATE TRIGGER trg_easter_eggs_timeline_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON easter_eggs
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('timeline');
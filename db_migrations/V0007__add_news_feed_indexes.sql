@@ -0,0 +1,7 @@
+-- Индексы под keyset-пагинацию ленты новостей по (published_at, id)
+
+UPDATE news SET published_at = created_at WHERE published_at IS NULL;
+ALTER TABLE news ALTER COLUMN published_at SET NOT NULL;
+
+CREATE INDEX idx_news_category_feed ON news(category, is_premium, published_at DESC, id DESC);
+CREATE INDEX idx_news_feed ON news(is_premium, published_at DESC, id DESC);
@@ -0,0 +1,10 @@
+-- Отозванные токены сессии (выход из аккаунта); хранятся только до истечения самого токена
+
+CREATE TABLE revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX idx_revoked_tokens_expires ON revoked_tokens(expires_at);
@@ -0,0 +1,12 @@
+-- Постраничный список секретных материалов и инвалидация его кеша
+
+UPDATE secret_materials SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE secret_materials ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX idx_secret_materials_created ON secret_materials(created_at DESC, id DESC);
+
+INSERT INTO data_versions (name) VALUES ('secret_materials');
+
+CREATE TRIGGER trg_secret_materials_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON secret_materials
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('secret_materials');
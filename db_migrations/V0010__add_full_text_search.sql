@@ -0,0 +1,20 @@
+-- Полнотекстовый поиск по новостям, фильмам и персонажам (русская конфигурация)
+
+ALTER TABLE news ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(content, '')), 'B')
+) STORED;
+
+ALTER TABLE movies ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+) STORED;
+
+ALTER TABLE characters ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(real_name, '')), 'A')
+) STORED;
+
+CREATE INDEX idx_news_search ON news USING GIN(search_vector);
+CREATE INDEX idx_movies_search ON movies USING GIN(search_vector);
+CREATE INDEX idx_characters_search ON characters USING GIN(search_vector);
@@ -0,0 +1,40 @@
+-- Агрегаты хронологии в материализованных представлениях: статистика фаз и совместные появления персонажей
+
+CREATE MATERIALIZED VIEW phase_stats AS
+SELECT p.id AS phase_id,
+       p.name AS phase_name,
+       COUNT(m.id) AS movie_count,
+       COALESCE(SUM(m.box_office), 0)::BIGINT AS box_office_total,
+       COALESCE(SUM(m.duration_minutes), 0) AS runtime_total_minutes,
+       ROUND(AVG(m.rating), 2) AS average_rating
+FROM phases p
+LEFT JOIN movies m ON m.phase_id = p.id
+GROUP BY p.id, p.name;
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_phase_stats_phase ON phase_stats(phase_id);
+
+-- Каждая пара хранится в обе стороны, чтобы выборка по персонажу шла по индексу
+CREATE MATERIALIZED VIEW character_co_appearances AS
+SELECT a.character_id,
+       b.character_id AS other_character_id,
+       COUNT(*) AS shared_movies
+FROM movie_characters a
+JOIN movie_characters b ON b.movie_id = a.movie_id AND b.character_id <> a.character_id
+GROUP BY a.character_id, b.character_id;
+
+CREATE UNIQUE INDEX idx_character_co_appearances_pair
+    ON character_co_appearances(character_id, other_character_id);
+CREATE INDEX idx_character_co_appearances_rank
+    ON character_co_appearances(character_id, shared_movies DESC);
+
+INSERT INTO data_versions (name) VALUES ('timeline_stats');
+
+-- Точка обновления после миграций и загрузок данных: не блокирует чтение и сбрасывает кеши статистики
+CREATE OR REPLACE FUNCTION refresh_timeline_stats() RETURNS VOID AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY phase_stats;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY character_co_appearances;
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'timeline_stats';
+END;
+$$ LANGUAGE plpgsql;
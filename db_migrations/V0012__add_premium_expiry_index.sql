@@ -0,0 +1,3 @@
+-- Частичный индекс по действующим Premium-пользователям для пакетного снятия истёкших подписок
+
+CREATE INDEX idx_users_premium_expiry ON users(premium_until) WHERE is_premium = TRUE;
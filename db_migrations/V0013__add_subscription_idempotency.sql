@@ -0,0 +1,7 @@
+-- Ключ идемпотентности покупки: повтор запроса с тем же ключом возвращает исходную подписку
+
+ALTER TABLE subscriptions ADD COLUMN idempotency_key VARCHAR(255);
+
+-- NULL-ключи уникальностью не ограничиваются, поэтому покупки без ключа по-прежнему допустимы
+ALTER TABLE subscriptions
+    ADD CONSTRAINT subscriptions_user_idempotency_key UNIQUE (user_id, idempotency_key);
@@ -0,0 +1,19 @@
+-- Заранее отрендеренные ответы горячих эндпоинтов: тело и его сжатые варианты
+
+CREATE TABLE rendered_responses (
+    endpoint VARCHAR(100) NOT NULL,
+    params VARCHAR(500) NOT NULL DEFAULT '',
+    version BIGINT NOT NULL,
+    body TEXT NOT NULL,
+    body_gzip BYTEA NOT NULL,
+    body_br BYTEA,
+    rendered_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (endpoint, params)
+);
+
+-- Версия ленты новостей; сброс счётчика просмотров тоже её меняет, но не чаще интервала сброса
+INSERT INTO data_versions (name) VALUES ('news');
+
+CREATE TRIGGER trg_news_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON news
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('news');
@@ -0,0 +1,19 @@
+-- Естественные ключи каталога для пакетной загрузки (scripts/bulk_load.py) и журнал загруженных файлов
+
+-- По этим индексам загрузчик находит id и выполняет INSERT ... ON CONFLICT
+CREATE UNIQUE INDEX idx_phases_name ON phases(name);
+CREATE UNIQUE INDEX idx_movies_title ON movies(title);
+CREATE UNIQUE INDEX idx_characters_name ON characters(name);
+CREATE UNIQUE INDEX idx_easter_eggs_movie_title ON easter_eggs(movie_id, title);
+
+-- Идентификатор новости во внешнем источнике; у добавленных вручную новостей он пустой
+ALTER TABLE news ADD COLUMN external_id VARCHAR(200);
+CREATE UNIQUE INDEX idx_news_external_id ON news(external_id);
+
+-- Контрольная сумма последнего полностью загруженного файла каждого вида: тот же файл повторно не читается
+CREATE TABLE bulk_loads (
+    entity VARCHAR(50) PRIMARY KEY,
+    checksum VARCHAR(64) NOT NULL,
+    row_count INTEGER NOT NULL,
+    loaded_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,89 @@
+-- Счётчик комментариев в news и индекс для постраничного чтения комментариев новости
+
+ALTER TABLE news ADD COLUMN comments_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE news SET comments_count = c.total
+FROM (SELECT news_id, COUNT(*) AS total FROM comments GROUP BY news_id) c
+WHERE news.id = c.news_id;
+
+UPDATE comments SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE comments ALTER COLUMN created_at SET NOT NULL;
+
+-- Страницы идут по (created_at, id) от новых к старым; индекс по одному news_id становится лишним
+CREATE INDEX idx_comments_news_created ON comments(news_id, created_at DESC, id DESC);
+DROP INDEX idx_comments_news;
+
+-- Счётчик меняется в той же транзакции, что и comments: один UPDATE на оператор, а не на строку.
+-- Строки news блокируются по возрастанию id, чтобы пакеты по нескольким новостям не взаимоблокировались
+CREATE OR REPLACE FUNCTION adjust_comments_count() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE news SET comments_count = 0 WHERE comments_count <> 0;
+    ELSIF TG_OP = 'INSERT' THEN
+        WITH delta AS (
+            SELECT news_id, COUNT(*) AS delta FROM new_comments WHERE news_id IS NOT NULL GROUP BY news_id
+        ), locked AS (
+            SELECT id FROM news WHERE id IN (SELECT news_id FROM delta) ORDER BY id FOR UPDATE
+        )
+        UPDATE news SET comments_count = news.comments_count + delta.delta
+        FROM delta
+        WHERE news.id = delta.news_id AND news.id IN (SELECT id FROM locked);
+    ELSIF TG_OP = 'DELETE' THEN
+        WITH delta AS (
+            SELECT news_id, COUNT(*) AS delta FROM old_comments WHERE news_id IS NOT NULL GROUP BY news_id
+        ), locked AS (
+            SELECT id FROM news WHERE id IN (SELECT news_id FROM delta) ORDER BY id FOR UPDATE
+        )
+        UPDATE news SET comments_count = news.comments_count - delta.delta
+        FROM delta
+        WHERE news.id = delta.news_id AND news.id IN (SELECT id FROM locked);
+    ELSE
+        WITH delta AS (
+            SELECT news_id, SUM(delta) AS delta FROM (
+                SELECT news_id, 1 AS delta FROM new_comments
+                UNION ALL
+                SELECT news_id, -1 FROM old_comments
+            ) changes
+            WHERE news_id IS NOT NULL
+            GROUP BY news_id
+            HAVING SUM(delta) <> 0
+        ), locked AS (
+            SELECT id FROM news WHERE id IN (SELECT news_id FROM delta) ORDER BY id FOR UPDATE
+        )
+        UPDATE news SET comments_count = news.comments_count + delta.delta
+        FROM delta
+        WHERE news.id = delta.news_id AND news.id IN (SELECT id FROM locked);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_comments_count_insert
+    AFTER INSERT ON comments
+    REFERENCING NEW TABLE AS new_comments
+    FOR EACH STATEMENT EXECUTE FUNCTION adjust_comments_count();
+
+CREATE TRIGGER trg_comments_count_delete
+    AFTER DELETE ON comments
+    REFERENCING OLD TABLE AS old_comments
+    FOR EACH STATEMENT EXECUTE FUNCTION adjust_comments_count();
+
+CREATE TRIGGER trg_comments_count_update
+    AFTER UPDATE ON comments
+    REFERENCING OLD TABLE AS old_comments NEW TABLE AS new_comments
+    FOR EACH STATEMENT EXECUTE FUNCTION adjust_comments_count();
+
+CREATE TRIGGER trg_comments_count_truncate
+    AFTER TRUNCATE ON comments
+    FOR EACH STATEMENT EXECUTE FUNCTION adjust_comments_count();
+
+-- Изменение одного comments_count не меняет версию ленты: иначе каждый комментарий ждал бы
+-- блокировку общей строки data_versions. Счётчики в заготовке ленты обновятся со следующей
+-- сменой версии (например, сбросом просмотров). Новую колонку news нужно добавить в этот список
+DROP TRIGGER trg_news_version ON news;
+CREATE TRIGGER trg_news_version
+    AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF
+        title, content, category, image_url, credibility_rating, credibility_status, source,
+        is_premium, views_count, published_at, created_at, external_id
+    ON news
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('news');
@@ -0,0 +1,10 @@
+-- Сброс просмотров больше не меняет версию ленты: иначе каждый сброс (раз в интервал на контейнер)
+-- сбрасывал заготовку ленты. Текущие views_count и comments_count лента подставляет в заготовку сама.
+-- Новую колонку news нужно добавить в этот список
+DROP TRIGGER trg_news_version ON news;
+CREATE TRIGGER trg_news_version
+    AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF
+        title, content, category, image_url, credibility_rating, credibility_status, source,
+        is_premium, published_at, created_at, external_id
+    ON news
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('news');
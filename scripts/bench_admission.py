@@ -0,0 +1,171 @@
+"""Допуск к базе под перегрузкой: несколько «контейнеров» против Postgres с маленьким max_connections.
+
+Каждый контейнер — отдельный процесс с --threads потоками; потоки в течение
+--seconds читают ленту новостей анонимно, а доля --write-share запросов —
+оплата подписки с токеном. Обе функции загружаются через пакетный шлюз, чтобы
+делить один контроллер допуска, как при вызове через backend/batch.
+    baseline   — ADMISSION_MAX_IN_FLIGHT=0 и BREAKER_FAILURE_THRESHOLD=0, пул на --threads соединений
+    admission  — ограничение, очередь с дедлайном и автомат отключения по умолчанию
+Во время прогона отдельное соединение следит за числом подключений в pg_stat_activity.
+Postgres для проверки: docker run -e POSTGRES_PASSWORD=pg -p 5433:5432 postgres -c max_connections=20
+Запуск: DATABASE_URL=postgres://... python scripts/bench_admission.py --processes 6 --threads 8
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url, summarize
+
+SCHEMA = 'bench_admission'
+USER_ID = 1
+READ_PATH = '/?category=Новости'
+MODES = {
+    'baseline': {'ADMISSION_MAX_IN_FLIGHT': '0', 'BREAKER_FAILURE_THRESHOLD': '0'},
+    'admission': {}
+}
+
+
+def seed(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('users', 'subscriptions'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    cur.execute(
+        "INSERT INTO users (id, username, email, password_hash) VALUES (%s, 'buyer', 'buyer@example.com', 'x')",
+        (USER_ID,)
+    )
+    conn.commit()
+    conn.close()
+
+
+def child(seconds: float, threads: int, write_share: float) -> None:
+    """Один контейнер; печатает JSON со статусами и задержками по видам запросов"""
+    batch = load_handler('batch')
+    news = batch.load_function('news')
+    subscription = batch.load_function('subscription')
+    token = sys.modules['tokens'].issue_token(USER_ID)
+    results = {'read': {}, 'write': {}}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def loop():
+        local = {'read': [], 'write': []}
+        while time.monotonic() < stop_at:
+            if random.random() < write_share:
+                kind = 'write'
+                event = make_event('POST', '/', {'X-User-Token': token, 'Idempotency-Key': str(uuid.uuid4())})
+                handler = subscription
+            else:
+                kind, event, handler = 'read', make_event('GET', READ_PATH), news
+            started = time.perf_counter()
+            try:
+                status = handler(event, None)['statusCode']
+            except Exception:
+                status = 'exception'
+            local[kind].append((status, (time.perf_counter() - started) * 1000))
+        with lock:
+            for kind, samples in local.items():
+                for status, elapsed in samples:
+                    results[kind].setdefault(str(status), []).append(elapsed)
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    print(json.dumps({
+        'requests': {kind: {status: summarize(samples) for status, samples in by_status.items()}
+                     for kind, by_status in results.items()},
+        'pool': sys.modules['db'].pool_stats()
+    }, default=str))
+
+
+def watch_connections(conn, stop: threading.Event, peak: list) -> None:
+    """Пик клиентских подключений; соединение открыто заранее, пока у базы есть свободные слоты"""
+    cur = conn.cursor()
+    while not stop.is_set():
+        cur.execute("SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend'")
+        peak[0] = max(peak[0], cur.fetchone()[0])
+        time.sleep(0.05)
+
+
+def merge(outputs: list) -> dict:
+    """Сумма статусов по всем контейнерам, задержки — худший p95 среди контейнеров"""
+    merged = {'read': {}, 'write': {}}
+    admission = {}
+    for output in outputs:
+        for kind, by_status in output['requests'].items():
+            for status, summary in by_status.items():
+                entry = merged[kind].setdefault(status, {'count': 0, 'worst_p95_ms': 0.0})
+                entry['count'] += summary['count']
+                entry['worst_p95_ms'] = max(entry['worst_p95_ms'], summary['p95_ms'])
+        for key, value in output['pool']['admission'].items():
+            if isinstance(value, (int, float)) and key not in ('limit', 'in_flight', 'waiting'):
+                admission[key] = max(admission.get(key, 0), value) if key == 'max_wait_ms' else admission.get(key, 0) + value
+    merged['admission'] = admission
+    merged['breaker_opened'] = sum(output['pool']['breaker']['opened'] for output in outputs)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=6)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-share', type=float, default=0.05)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.seconds, args.threads, args.write_share)
+        return
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    seed(dsn)
+    monitor = psycopg2.connect(dsn)
+    monitor.autocommit = True
+    with monitor.cursor() as cur:
+        cur.execute("SHOW max_connections")
+        max_connections = int(cur.fetchone()[0])
+
+    results = {'max_connections': max_connections}
+    for mode, overrides in MODES.items():
+        env = dict(os.environ, DATABASE_URL=dsn, DB_POOL_MAX_SIZE=str(args.threads), **overrides)
+        env.setdefault('TOKEN_SECRET', 'bench-secret')
+        env.pop('DATABASE_REPLICA_URL', None)
+        # Все контейнеры вместе не должны занять больше max_connections за вычетом служебных подключений
+        env.setdefault('ADMISSION_MAX_IN_FLIGHT', str(max(1, (max_connections - 5) // args.processes)))
+
+        stop, peak = threading.Event(), [0]
+        watcher = threading.Thread(target=watch_connections, args=(monitor, stop, peak))
+        watcher.start()
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--seconds', str(args.seconds),
+                   '--threads', str(args.threads), '--write-share', str(args.write_share)]
+        children = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                    for _ in range(args.processes)]
+        outputs = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in children]
+        stop.set()
+        watcher.join()
+
+        results[mode] = merge(outputs)
+        results[mode]['peak_connections'] = peak[0]
+        results[mode]['admission_limit'] = env.get('ADMISSION_MAX_IN_FLIGHT')
+
+    monitor.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    monitor.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Данные главной страницы: четыре отдельных вызова функций против одного вызова batch.
+
+Страница запрашивает ленту новостей, каталог хронологии, статус подписки и
+список секретных материалов. В режиме separate каждый запрос идёт в свою
+функцию (со своим пулом соединений) параллельно, как это делает браузер; в
+режиме batch все четыре уходят одним вызовом. Сеть имитируется задержкой
+--rtt-ms на каждый HTTP-запрос, включая CORS preflight перед запросом с
+заголовком X-User-Token, — так видно, сколько стоят лишние обращения.
+Нужна база с данными (loadtest.py --seed); временный Premium-пользователь
+создаётся и удаляется скриптом.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_batch.py --rtt-ms 40
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+USER_EMAIL = 'batch-bench@example.com'
+PAGE_REQUESTS = [
+    {'id': 'news', 'function': 'news', 'path': '/'},
+    {'id': 'timeline', 'function': 'timeline', 'path': '/'},
+    {'id': 'subscription', 'function': 'subscription', 'path': '/'},
+    {'id': 'secrets', 'function': 'secrets', 'path': '/'}
+]
+
+
+def create_user(dsn: str) -> int:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM users WHERE email = %s", (USER_EMAIL,))
+    cur.execute(
+        "INSERT INTO users (username, email, password_hash, is_premium, premium_until) "
+        "VALUES ('batch-bench', %s, 'x', TRUE, %s) RETURNING id",
+        (USER_EMAIL, datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=30))
+    )
+    user_id = cur.fetchone()[0]
+    conn.commit()
+    conn.close()
+    return user_id
+
+
+def delete_user(dsn: str, user_id: int) -> None:
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute("DELETE FROM users WHERE id = %s", (user_id,))
+    conn.commit()
+    conn.close()
+
+
+def http_call(rtt: float, handler, event: dict) -> dict:
+    """Preflight и сам запрос: два сетевых обращения и работа функции"""
+    time.sleep(rtt)
+    time.sleep(rtt)
+    response = handler(event, None)
+    if response['statusCode'] != 200:
+        sys.exit(f'{event["path"]}: статус {response["statusCode"]}: {response["body"][:200]}')
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('--rtt-ms', type=float, default=40.0, help='имитируемая сетевая задержка одного HTTP-запроса')
+    args = parser.parse_args()
+
+    dsn = require_database_url()
+    os.environ.setdefault('TOKEN_SECRET', 'bench-secret')
+    rtt = args.rtt_ms / 1000
+    user_id = create_user(dsn)
+    try:
+        separate = {}
+        for item in PAGE_REQUESTS:
+            separate[item['function']] = load_handler(item['function']).handler
+        token = sys.modules['tokens'].issue_token(user_id)
+        headers = {'X-User-Token': token}
+        batch = load_handler('batch').handler
+        pool = ThreadPoolExecutor(max_workers=len(PAGE_REQUESTS))
+
+        def page_separate():
+            futures = [
+                pool.submit(http_call, rtt, separate[item['function']], make_event('GET', item['path'], headers))
+                for item in PAGE_REQUESTS
+            ]
+            for future in futures:
+                future.result()
+
+        def page_batch():
+            response = http_call(rtt, batch, make_event('POST', '/', headers, {'requests': PAGE_REQUESTS}))
+            statuses = {item['id']: item['status'] for item in json.loads(response['body'])['responses']}
+            if set(statuses.values()) != {200}:
+                sys.exit(f'batch: статусы подзапросов {statuses}')
+
+        # Прогрев: импорт модулей и открытие пулов не входят в замер
+        page_separate()
+        page_batch()
+        results = {
+            'rtt_ms': args.rtt_ms,
+            'separate': summarize(timed(page_separate, args.iterations)),
+            'batch': summarize(timed(page_batch, args.iterations))
+        }
+        pool.shutdown()
+        results['pool'] = sys.modules['db'].pool_stats()
+    finally:
+        delete_user(dsn, user_id)
+
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Загрузка новостей: построчные INSERT ... ON CONFLICT против COPY через scripts/bulk_load.py.
+
+В схеме bench_bulk_load создаются пустые news и bulk_loads, генерируется
+JSONL с --rows новостями и замеряются:
+    row_by_row  — execute на каждую строку, как при загрузке скриптом с INSERT
+    copy        — bulk_load: COPY в промежуточную таблицу и один upsert
+    rerun       — тот же файл ещё раз: пропускается по контрольной сумме
+    forced      — тот же файл с --force: COPY и upsert без изменений в news
+Запуск: DATABASE_URL=postgres://... python scripts/bench_bulk_load.py --rows 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+import psycopg2
+import psycopg2.extensions
+from bench_common import require_database_url
+from bulk_load import load
+
+SCHEMA = 'bench_bulk_load'
+ROW_BY_ROW_QUERY = """
+    INSERT INTO news (external_id, title, content, category, credibility_rating, credibility_status,
+                      source, is_premium, published_at)
+    VALUES (%(external_id)s, %(title)s, %(content)s, %(category)s, %(credibility_rating)s,
+            %(credibility_status)s, %(source)s, %(is_premium)s, %(published_at)s)
+    ON CONFLICT (external_id) DO UPDATE SET title = EXCLUDED.title, content = EXCLUDED.content
+"""
+
+
+def reset(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('news', 'bulk_loads'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    conn.commit()
+    conn.close()
+
+
+def generate(path: str, rows: int) -> list:
+    started = datetime(2024, 1, 1)
+    items = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            item = {
+                'external_id': f'bench-{i}',
+                'title': f'Новость #{i}',
+                'content': 'Текст новости о вселенной Marvel. ' * 10,
+                'category': 'Новости',
+                'credibility_rating': 1 + i % 5,
+                'credibility_status': 'official',
+                'source': 'bench',
+                'is_premium': i % 10 == 0,
+                'published_at': (started + timedelta(minutes=i)).isoformat()
+            }
+            items.append(item)
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    return items
+
+
+def timed_load(dsn: str, path: str, force: bool) -> dict:
+    conn = psycopg2.connect(dsn)
+    started = time.perf_counter()
+    report = load(conn, {'news': path}, force)
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return {'elapsed_ms': round(elapsed * 1000, 1), 'report': report[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    results = {'rows': args.rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'news.jsonl')
+        items = generate(path, args.rows)
+
+        reset(dsn)
+        conn = psycopg2.connect(dsn)
+        cur = conn.cursor()
+        started = time.perf_counter()
+        for item in items:
+            cur.execute(ROW_BY_ROW_QUERY, item)
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        conn.close()
+        results['row_by_row'] = {'elapsed_ms': round(elapsed * 1000, 1), 'rows_per_second': round(args.rows / elapsed)}
+
+        reset(dsn)
+        results['copy'] = timed_load(dsn, path, False)
+        results['rerun'] = timed_load(dsn, path, False)
+        results['forced'] = timed_load(dsn, path, True)
+
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Нагрузка на комментарии горячей новости: запись, счётчик, keyset-страницы и лента.
+
+В схеме bench_comments создаются пользователи, --articles новостей и
+--existing старых комментариев к первой («горячей») новости, на comments
+вешаются триггеры счётчика из V0016. Затем:
+    write   — --threads пользователей параллельно пишут --comments комментариев в горячую
+              новость через функцию comments, пакетами по --batch; после записи
+              comments_count сверяется с COUNT(*)
+    pages   — обход всех страниц комментариев по курсору и сравнение последней страницы
+              с выборкой через OFFSET
+    feed    — лента с comments_count из news против COUNT(*) по каждой новости
+Запуск: DATABASE_URL=postgres://... python scripts/bench_comments.py --comments 5000 --threads 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+SCHEMA = 'bench_comments'
+PAGE_SIZE = 100
+NAIVE_FEED_QUERY = """
+    SELECT n.id, n.title, n.published_at,
+           (SELECT COUNT(*) FROM comments c WHERE c.news_id = n.id) AS comments_count
+    FROM news n WHERE n.is_premium = FALSE
+    ORDER BY n.published_at DESC, n.id DESC LIMIT 20
+"""
+FEED_QUERY = """
+    SELECT id, title, published_at, comments_count
+    FROM news WHERE is_premium = FALSE
+    ORDER BY published_at DESC, id DESC LIMIT 20
+"""
+
+
+def seed(dsn: str, users: int, articles: int, existing: int) -> int:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('users', 'news', 'comments'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    for event, referencing in (('INSERT', 'NEW TABLE AS new_comments'), ('DELETE', 'OLD TABLE AS old_comments')):
+        cur.execute(f"""
+            CREATE TRIGGER trg_comments_count_{event.lower()} AFTER {event} ON {SCHEMA}.comments
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION public.adjust_comments_count()
+        """)
+    cur.execute("""
+        INSERT INTO users (id, username, email, password_hash)
+        SELECT g, 'reader' || g, 'reader' || g || '@example.com', 'x' FROM generate_series(1, %s) g
+    """, (users,))
+    cur.execute("""
+        INSERT INTO news (title, content, category, source, published_at)
+        SELECT 'Новость #' || g, 'Текст', 'Новости', 'bench', NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %s) g
+    """, (articles,))
+    cur.execute("SELECT min(id) FROM news")
+    hot_id = cur.fetchone()[0]
+    # Остальным новостям — по несколько комментариев, чтобы COUNT(*) в наивной ленте было что считать
+    cur.execute("""
+        INSERT INTO comments (user_id, news_id, author_name, content, created_at)
+        SELECT 1, n.id, 'reader1', 'Комментарий', NOW() - (g || ' seconds')::interval
+        FROM news n, generate_series(1, 20) g WHERE n.id <> %s
+    """, (hot_id,))
+    cur.execute("""
+        INSERT INTO comments (user_id, news_id, author_name, content, created_at)
+        SELECT 1 + g %% %s, %s, 'reader' || (1 + g %% %s), 'Старый комментарий #' || g,
+               NOW() - interval '1 day' - (g || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    """, (users, hot_id, users, existing))
+    cur.execute("ANALYZE comments")
+    cur.execute("ANALYZE news")
+    conn.commit()
+    conn.close()
+    return hot_id
+
+
+def write_phase(handler, tokens: list, hot_id: int, comments: int, batch: int) -> dict:
+    requests = [(tokens[i % len(tokens)], i) for i in range(0, comments, batch)]
+
+    def post(request):
+        token, start = request
+        body = {'comments': [
+            {'news_id': hot_id, 'content': f'Комментарий #{n}'} for n in range(start, min(start + batch, comments))
+        ]}
+        started = time.perf_counter()
+        response = handler(make_event('POST', '/', {'X-User-Token': token}, body), None)
+        return response['statusCode'], (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tokens)) as pool:
+        results = list(pool.map(post, requests))
+    elapsed = time.perf_counter() - started
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(requests),
+        'statuses': statuses,
+        'comments_per_second': round(comments / elapsed),
+        'latency': summarize([ms for status, ms in results if status == 201])
+    }
+
+
+def pages_phase(handler, dsn: str, hot_id: int) -> dict:
+    samples, pages, cursor = [], 0, None
+    while True:
+        path = f'/?news_id={hot_id}&limit={PAGE_SIZE}' + (f'&cursor={cursor}' if cursor else '')
+        started = time.perf_counter()
+        response = handler(make_event('GET', path), None)
+        samples.append((time.perf_counter() - started) * 1000)
+        payload = json.loads(response['body'])
+        pages += 1
+        cursor = payload['next_cursor']
+        if not cursor:
+            break
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    def last_page_offset():
+        cur.execute(
+            "SELECT id, author_name, content, created_at FROM comments WHERE news_id = %s "
+            "ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s",
+            (hot_id, PAGE_SIZE, (pages - 1) * PAGE_SIZE)
+        )
+        cur.fetchall()
+
+    offset_samples = timed(last_page_offset, 20)
+    conn.close()
+    return {
+        'pages': pages,
+        'first_page_ms': round(samples[0], 3),
+        'last_page_keyset_ms': round(samples[-1], 3),
+        'all_pages_keyset': summarize(samples),
+        'last_page_offset': summarize(offset_samples)
+    }
+
+
+def feed_phase(dsn: str, iterations: int) -> dict:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    results = {}
+    for name, query in (('denormalized', FEED_QUERY), ('count_per_article', NAIVE_FEED_QUERY)):
+        results[name] = summarize(timed(lambda: (cur.execute(query), cur.fetchall()), iterations))
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--existing', type=int, default=100000, help='старых комментариев у горячей новости')
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--batch', type=int, default=1, help='комментариев в одном POST')
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    hot_id = seed(dsn, args.threads, args.articles, args.existing)
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    os.environ.setdefault('TOKEN_SECRET', 'bench-secret')
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.threads)
+    os.environ['ADMISSION_MAX_IN_FLIGHT'] = str(args.threads)
+    index = load_handler('comments')
+    issue_token = sys.modules['tokens'].issue_token
+    tokens = [issue_token(user_id) for user_id in range(1, args.threads + 1)]
+
+    results = {'write': write_phase(index.handler, tokens, hot_id, args.comments, args.batch)}
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT comments_count, (SELECT COUNT(*) FROM comments WHERE news_id = %s) FROM news WHERE id = %s",
+                (hot_id, hot_id))
+    stored, actual = cur.fetchone()
+    conn.close()
+    results['write']['comments_count'] = stored
+    results['write']['count_matches'] = stored == actual
+
+    results['pages'] = pages_phase(index.handler, dsn, hot_id)
+    results['feed'] = feed_phase(dsn, args.iterations)
+    results['pool'] = sys.modules['db'].pool_stats()
+
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+    if not results['write']['count_matches']:
+        sys.exit('comments_count разошёлся с числом комментариев')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Общие утилиты для локальных бенчмарков backend-функций"""
+import importlib
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+
+
+def load_handler(name: str):
+    """Импортирует backend/<name>/index.py изолированно от остальных функций.
+
+    У всех функций одинаковые имена модулей (index, db, ...), поэтому перед
+    импортом из sys.modules убираются модули, загруженные из других функций.
+    """
+    func_dir = os.path.join(BACKEND_DIR, name)
+    for mod_name, mod in list(sys.modules.items()):
+        mod_file = getattr(mod, '__file__', None) or ''
+        if mod_file.startswith(BACKEND_DIR + os.sep):
+            del sys.modules[mod_name]
+    sys.path.insert(0, func_dir)
+    try:
+        return importlib.import_module('index')
+    finally:
+        sys.path.remove(func_dir)
+
+
+def make_event(method: str = 'GET', path: str = '/', headers: dict = None, body=None) -> dict:
+    parts = urlsplit(path)
+    return {
+        'httpMethod': method,
+        'path': parts.path or '/',
+        'queryStringParameters': dict(parse_qsl(parts.query)) or None,
+        'headers': headers or {},
+        'body': body if body is None or isinstance(body, str) else json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+
+def percentile(samples: list, p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples_ms: list) -> dict:
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0
+    }
+
+
+def timed(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def require_database_url() -> str:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('Укажите DATABASE_URL локальной базы Postgres с применёнными db_migrations')
+    return dsn
@@ -0,0 +1,71 @@
+"""Сравнение p50/p99 обработчика с пулом соединений и с connect-per-request.
+
+Пул подменяется на уровне модуля db, поэтому замер работает и для
+get_connection, и для get_read_connection. По умолчанию запрашивается путь,
+который не отдаётся из кеша снимков или заготовок, иначе сравнивались бы
+попадания в кеш.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_db_pool.py --function timeline -n 500
+"""
+import argparse
+import json
+import os
+import sys
+import psycopg2
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+# Пути без кеша: детали фильма и лента по категории читают базу на каждый вызов
+DEFAULT_PATHS = {
+    'timeline': '/?movie_id=1',
+    'news': '/?category=Новости',
+    'search': '/?q=marvel'
+}
+
+
+class ConnectPerRequest:
+    """Замена пула: новое соединение на каждый acquire, закрытие на release"""
+
+    def __init__(self, dsn: str, connect_kwargs: dict):
+        self.dsn = dsn
+        self.connect_kwargs = connect_kwargs
+
+    def acquire(self):
+        return psycopg2.connect(self.dsn, **self.connect_kwargs)
+
+    def release(self, conn) -> None:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--function', default='timeline')
+    parser.add_argument('--path', help='по умолчанию — некешируемый путь функции из DEFAULT_PATHS')
+    parser.add_argument('-n', '--iterations', type=int, default=300)
+    args = parser.parse_args()
+    dsn = require_database_url()
+    # Реплика не участвует: сравнивается только primary с пулом и без
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    index = load_handler(args.function)
+    db = sys.modules['db']
+    event = make_event('GET', args.path or DEFAULT_PATHS.get(args.function, '/'))
+    results = {}
+
+    status = index.handler(event, None)['statusCode']
+    if status != 200:
+        sys.exit(f'{event["path"]}: статус {status}, замер не имеет смысла')
+
+    pool = db.get_pool()
+    db._pool = ConnectPerRequest(dsn, pool.connect_kwargs)
+    try:
+        results['connect_per_request'] = summarize(timed(lambda: index.handler(event, None), args.iterations))
+    finally:
+        db._pool = pool
+
+    results['pooled'] = summarize(timed(lambda: index.handler(event, None), args.iterations))
+    results['pool_stats'] = db.pool_stats()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Лента новостей на синтетических данных: полная выборка против keyset-страниц.
+
+Данные генерируются в отдельной схеме bench_news, рабочие таблицы не затрагиваются.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_news_feed.py --rows 100000
+"""
+import argparse
+import json
+import os
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+SCHEMA = 'bench_news'
+
+LEGACY_QUERY = (
+    "SELECT id, title, content, category, image_url, credibility_rating, credibility_status, source, "
+    "is_premium, views_count, published_at FROM news WHERE is_premium = %s ORDER BY published_at DESC"
+)
+
+
+def seed(dsn: str, rows: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"CREATE TABLE {SCHEMA}.news (LIKE public.news INCLUDING ALL)")
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.news (title, content, category, credibility_rating, credibility_status,
+                                   source, is_premium, published_at)
+        SELECT 'Новость #' || g,
+               repeat('Текст новости о вселенной Marvel. ', 20),
+               (ARRAY['Новости', 'Слухи', 'Премьеры', 'Интервью'])[1 + g % 4],
+               1 + g % 5, 'official', 'bench', g % 10 = 0,
+               NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %s) g
+    """, (rows,))
+    cur.execute(f"ANALYZE {SCHEMA}.news")
+    conn.commit()
+    conn.close()
+
+
+def legacy_feed(dsn: str):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(LEGACY_QUERY, (False,))
+    news_list = []
+    for row in cur.fetchall():
+        news_list.append({
+            'id': row[0], 'title': row[1], 'content': row[2], 'category': row[3], 'image_url': row[4],
+            'credibility_rating': row[5], 'credibility_status': row[6], 'source': row[7],
+            'is_premium': row[8], 'views_count': row[9],
+            'published_at': row[10].isoformat() if row[10] else None
+        })
+    body = json.dumps({'news': news_list})
+    cur.close()
+    conn.close()
+    return len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    parser.add_argument('--keep', action='store_true', help='не удалять схему bench_news после прогона')
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    seed(dsn, args.rows)
+    os.environ['DATABASE_URL'] = dsn
+    index = load_handler('news')
+
+    results = {'rows': args.rows}
+    sizes = []
+    results['legacy_full_feed'] = summarize(timed(lambda: sizes.append(legacy_feed(dsn)), args.iterations))
+    results['legacy_full_feed']['bytes'] = sizes[-1]
+
+    first_page = make_event('GET', '/?limit=20')
+    first = index.handler(first_page, None)
+    results['keyset_first_page'] = summarize(timed(lambda: index.handler(first_page, None), args.iterations))
+    results['keyset_first_page']['bytes'] = len(first['body'])
+
+    light_page = make_event('GET', '/?limit=20&fields=id,title,category,published_at')
+    light = index.handler(light_page, None)
+    results['keyset_without_content'] = summarize(timed(lambda: index.handler(light_page, None), args.iterations))
+    results['keyset_without_content']['bytes'] = len(light['body'])
+
+    # Курсор из глубины ленты: keyset не зависит от номера страницы, в отличие от OFFSET
+    cursor = json.loads(first['body'])['next_cursor']
+    for _ in range(50):
+        page = json.loads(index.handler(make_event('GET', f'/?limit=100&fields=id&cursor={cursor}'), None)['body'])
+        cursor = page['next_cursor'] or cursor
+    deep_page = make_event('GET', f'/?limit=20&cursor={cursor}')
+    results['keyset_deep_page'] = summarize(timed(lambda: index.handler(deep_page, None), args.iterations))
+
+    if not args.keep:
+        conn = psycopg2.connect(dsn)
+        conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Пропускная способность учёта просмотров и проверка сходимости счётчиков.
+
+Сравнивает UPDATE на каждый просмотр с отложенным пакетным счётчиком news/views.py
+и проверяет, что после сброса views_count в базе совпадает с числом принятых просмотров.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_news_views.py --views 20000 --threads 16
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url
+
+SCHEMA = 'bench_views'
+
+
+def seed(dsn: str, articles: int) -> list:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"CREATE TABLE {SCHEMA}.news (LIKE public.news INCLUDING ALL)")
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.news (title, content, category, source, published_at)
+        SELECT 'Новость #' || g, 'Текст', 'Новости', 'bench', NOW() FROM generate_series(1, %s) g
+        RETURNING id
+    """, (articles,))
+    ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def read_counts(dsn: str) -> dict:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT id, views_count FROM news")
+    counts = dict(cur.fetchall())
+    cur.execute("UPDATE news SET views_count = 0")
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def run(views: list, threads: int, fn) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, views))
+    return len(views) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=50)
+    parser.add_argument('--views', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    ids = seed(dsn, args.articles)
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.threads))
+    index = load_handler('news')
+    db = sys.modules['db']
+    counter = sys.modules['views'].view_counter
+
+    # Горячие новости получают большую часть просмотров, как на реальной ленте
+    views = random.choices(ids, weights=[1.0 / (rank + 1) for rank in range(len(ids))], k=args.views)
+    expected = Counter(views)
+
+    def per_request_update(news_id):
+        conn = db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE news SET views_count = views_count + 1 WHERE id = %s", (news_id,))
+            conn.commit()
+        finally:
+            db.release_connection(conn)
+
+    def write_behind(news_id):
+        index.handler(make_event('POST', '/', body={'news_id': news_id}), None)
+
+    results = {'views': args.views, 'threads': args.threads}
+    results['per_request_update_views_per_sec'] = round(run(views, args.threads, per_request_update))
+    per_request_ok = read_counts(dsn) == {news_id: expected.get(news_id, 0) for news_id in ids}
+
+    results['write_behind_views_per_sec'] = round(run(views, args.threads, write_behind))
+    counter.flush()
+    counts = read_counts(dsn)
+    exact = counts == {news_id: expected.get(news_id, 0) for news_id in ids}
+    results['write_behind_stats'] = dict(counter.stats)
+    results['per_request_converged'] = per_request_ok
+    # При переполнении буфера часть просмотров отбрасывается намеренно, тогда сверяем принятые
+    results['write_behind_converged'] = (
+        sum(counts.values()) == counter.stats['recorded'] and (exact or counter.stats['dropped'] > 0)
+    )
+
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if not (results['per_request_converged'] and results['write_behind_converged']):
+        sys.exit('Счётчики просмотров не сошлись')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Холодный ответ горячих эндпоинтов: построение из таблиц против заготовки из rendered_responses.
+
+Кеш снимков в памяти сбрасывается перед каждым вызовом, поэтому измеряется
+именно путь холодного контейнера. Нужна база с применёнными db_migrations.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_prerender.py -n 200
+"""
+import argparse
+import json
+import sys
+import psycopg2
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+GZIP_HEADERS = {'Accept-Encoding': 'gzip'}
+
+
+def builder(cur, load):
+    """Путь без заготовок: запросы к таблицам, сериализация и сжатие на каждый вызов"""
+    response = sys.modules['response']
+    event = make_event('GET', '/', GZIP_HEADERS)
+    return lambda: response.encoded_body(event, response.dumps(load(cur)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(require_database_url())
+    cur = conn.cursor()
+    event = make_event('GET', '/', GZIP_HEADERS)
+    results = {}
+
+    timeline = load_handler('timeline')
+    timeline.prerender()
+    results['timeline_catalog'] = {
+        'built': summarize(timed(builder(cur, lambda cur: timeline.load_catalog(cur, None, None)), args.iterations)),
+        'prerendered': summarize(timed(lambda: (timeline.catalog_cache.invalidate(), timeline.handler(event, None)), args.iterations))
+    }
+
+    news = load_handler('news')
+    news.prerender()
+    results['news_default_feed'] = {
+        'built': summarize(timed(builder(
+            cur, lambda cur: news.load_feed(cur, False, None, list(news.NEWS_FIELDS), news.DEFAULT_PAGE_SIZE, None)
+        ), args.iterations)),
+        'prerendered': summarize(timed(lambda: news.handler(event, None), args.iterations))
+    }
+
+    cur.close()
+    conn.close()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
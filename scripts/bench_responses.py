@@ -0,0 +1,88 @@
+"""Байты на проводе и CPU на вызов для ответов backend-функций.
+
+Для каждого обработчика прогоняет типовые запросы без сжатия, с gzip и с br
+и отдельно сравнивает json.dumps по умолчанию с компактным сериализатором.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_responses.py [--premium-user-id 1]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from bench_common import load_handler, make_event, require_database_url
+
+ENCODINGS = {'identity': None, 'gzip': 'gzip', 'br': 'br, gzip'}
+
+
+def wire_bytes(response: dict) -> int:
+    body = response['body']
+    return len(base64.b64decode(body)) if response.get('isBase64Encoded') else len(body.encode('utf-8'))
+
+
+def measure(handler, event: dict, iterations: int) -> dict:
+    response = handler(event, None)
+    started = time.process_time()
+    for _ in range(iterations):
+        handler(event, None)
+    cpu_ms = (time.process_time() - started) * 1000 / iterations
+    return {
+        'status': response['statusCode'],
+        'encoding': response['headers'].get('Content-Encoding', 'identity'),
+        'bytes': wire_bytes(response),
+        'cpu_ms': round(cpu_ms, 3)
+    }
+
+
+def serializer_comparison(payload, iterations: int) -> dict:
+    response = sys.modules['response']
+    results = {}
+    for name, fn in (('json_default', json.dumps), ('compact', response.dumps)):
+        started = time.process_time()
+        for _ in range(iterations):
+            body = fn(payload)
+        results[name] = {
+            'bytes': len(body.encode('utf-8')),
+            'cpu_ms': round((time.process_time() - started) * 1000 / iterations, 3)
+        }
+    results['encoder'] = 'orjson' if response.orjson is not None else 'json'
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    parser.add_argument('--premium-user-id', type=int)
+    args = parser.parse_args()
+    require_database_url()
+
+    cases = [
+        ('timeline', '/', {}),
+        ('timeline', '/?movie_ids=1,2,3,4,5,6', {}),
+        ('news', '/?limit=100', {}),
+        ('news', '/?limit=100&fields=id,title,category,published_at', {})
+    ]
+    if args.premium_user_id:
+        os.environ.setdefault('TOKEN_SECRET', 'bench-secret')
+        load_handler('secrets')
+        tokens = sys.modules['tokens']
+        cases.append(('secrets', '/', {'X-User-Token': tokens.issue_token(args.premium_user_id)}))
+
+    report = []
+    for name, path, headers in cases:
+        index = load_handler(name)
+        row = {'function': name, 'path': path}
+        for label, accept in ENCODINGS.items():
+            event_headers = dict(headers)
+            if accept:
+                event_headers['Accept-Encoding'] = accept
+            row[label] = measure(index.handler, make_event('GET', path, event_headers), args.iterations)
+        if name == 'timeline' and path == '/':
+            row['serializers'] = serializer_comparison(json.loads(index.handler(make_event('GET', path), None)['body']), args.iterations)
+        report.append(row)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
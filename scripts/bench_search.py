@@ -0,0 +1,99 @@
+"""Полнотекстовый поиск по tsvector/GIN против ILIKE-сканирования.
+
+Синтетические новости, фильмы и персонажи генерируются в схеме bench_search,
+рабочие таблицы не затрагиваются.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_search.py --rows 100000
+"""
+import argparse
+import json
+import os
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url, summarize, timed
+
+SCHEMA = 'bench_search'
+
+WORDS = ['Мстители', 'Танос', 'Ваканда', 'Асгард', 'камни', 'бесконечности', 'мультивселенная',
+         'костюм', 'щит', 'молот', 'премьера', 'трейлер', 'съёмки', 'режиссёр', 'финал']
+
+ILIKE_QUERY = """
+    SELECT * FROM (
+        SELECT 'news' AS kind, id, title FROM news
+        WHERE is_premium = FALSE AND (title ILIKE %(pattern)s OR content ILIKE %(pattern)s)
+        UNION ALL
+        SELECT 'movie', id, title FROM movies WHERE title ILIKE %(pattern)s OR description ILIKE %(pattern)s
+        UNION ALL
+        SELECT 'character', id, name FROM characters WHERE name ILIKE %(pattern)s OR real_name ILIKE %(pattern)s
+    ) hits
+    LIMIT 21
+"""
+
+
+def seed(dsn: str, rows: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('news', 'movies', 'characters'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    words = "ARRAY[" + ', '.join(f"'{word}'" for word in WORDS) + "]"
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.news (title, content, category, source, published_at)
+        SELECT 'Новость ' || ({words})[1 + g % {len(WORDS)}] || ' #' || g,
+               repeat(({words})[1 + (g * 7) % {len(WORDS)}] || ' и другие подробности о вселенной Marvel. ', 15),
+               'Новости', 'bench', NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %s) g
+    """, (rows,))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.movies (title, description, content_type)
+        SELECT 'Фильм ' || ({words})[1 + g % {len(WORDS)}] || ' ' || g,
+               'Описание: ' || ({words})[1 + (g * 3) % {len(WORDS)}], 'movie'
+        FROM generate_series(1, %s) g
+    """, (max(rows // 100, 10),))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.characters (name, real_name)
+        SELECT 'Герой ' || ({words})[1 + g % {len(WORDS)}] || ' ' || g, 'Имя ' || g
+        FROM generate_series(1, %s) g
+    """, (max(rows // 100, 10),))
+    for table in ('news', 'movies', 'characters'):
+        cur.execute(f"ANALYZE {SCHEMA}.{table}")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('-n', '--iterations', type=int, default=30)
+    parser.add_argument('--term', default='Ваканда')
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    seed(dsn, args.rows)
+    os.environ['DATABASE_URL'] = dsn
+    index = load_handler('search')
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    def ilike():
+        cur.execute(ILIKE_QUERY, {'pattern': f'%{args.term}%'})
+        cur.fetchall()
+
+    results = {'rows': args.rows, 'term': args.term}
+    results['ilike_scan'] = summarize(timed(ilike, args.iterations))
+    search_event = make_event('GET', f'/?q={args.term}')
+    results['fts_ranked_with_snippets'] = summarize(timed(lambda: index.handler(search_event, None), args.iterations))
+    prefix = args.term[:4]
+    suggest_event = make_event('GET', f'/?q={prefix}&mode=suggest')
+    results['fts_prefix_suggest'] = summarize(timed(lambda: index.handler(suggest_event, None), args.iterations))
+
+    cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Пиковая память при выдаче больших лент: fetchall + список словарей против потоковой выдачи.
+
+Для каждого размера в схеме bench_stream генерируются новости, затем каждый
+режим запускается в отдельном процессе: пик RSS (ru_maxrss) учитывает и память
+libpq, в которую клиентский курсор получает весь результат, и её не видит tracemalloc.
+    legacy  — load_feed с fetchall на все строки и json_response, как раньше
+    stream  — ?export=true: серверный курсор, fetchmany и кодирование по элементу
+Суффикс -gzip добавляет Accept-Encoding: gzip.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_streaming.py --sizes 100000,1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url
+
+SCHEMA = 'bench_stream'
+MODES = ('legacy', 'legacy-gzip', 'stream', 'stream-gzip')
+
+
+def seed(dsn: str, rows: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"CREATE TABLE {SCHEMA}.news (LIKE public.news INCLUDING ALL)")
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.news (title, content, category, credibility_rating, credibility_status,
+                                   source, is_premium, published_at)
+        SELECT 'Новость #' || g, repeat('Текст новости о вселенной Marvel. ', 10),
+               'Новости', 1 + g % 5, 'official', 'bench', FALSE, NOW() - (g || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    """, (rows,))
+    cur.execute(f"ANALYZE {SCHEMA}.news")
+    conn.commit()
+    conn.close()
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, rows: int) -> None:
+    """Один режим в чистом процессе; печатает JSON с приростом пика RSS"""
+    index = load_handler('news')
+    headers = {'Accept-Encoding': 'gzip'} if mode.endswith('-gzip') else {}
+    event = make_event('GET', '/?export=true', headers)
+    conn = index.get_read_connection()
+    index.release_connection(conn)
+    baseline = peak_rss_mb()
+
+    started = time.perf_counter()
+    if mode.startswith('legacy'):
+        conn = index.get_read_connection()
+        cur = conn.cursor()
+        try:
+            payload = index.load_feed(cur, False, None, list(index.NEWS_FIELDS), rows, None)
+        finally:
+            cur.close()
+            index.release_connection(conn)
+        response = index.json_response(200, payload, event)
+        del payload
+    else:
+        response = index.handler(event, None)
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'mode': mode,
+        'rows': rows,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'body_mb': round(len(response['body']) / 1024 / 1024, 2),
+        'peak_rss_growth_mb': round(peak_rss_mb() - baseline, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    if args.child:
+        child(args.child, args.rows)
+        return
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        seed(dsn, size)
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, '--rows', str(size)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Параллельные покупки подписки: дубликаты по Idempotency-Key не создают лишних строк.
+
+В схеме bench_subscription создаётся пользователь, затем одновременно
+отправляются --duplicates запросов с одним ключом и --distinct запросов
+с разными ключами. Проверяется, что дубликаты записали ровно одну подписку и
+вернули один и тот же id, а разные ключи продлили Premium на сумму периодов.
+Повтор первого ключа после них должен вернуть текущий premium_until.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_subscription_idempotency.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import timezone
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, make_event, require_database_url, summarize
+
+SCHEMA = 'bench_subscription'
+USER_ID = 1
+
+
+def seed(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('users', 'subscriptions'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    cur.execute(
+        "INSERT INTO users (id, username, email, password_hash) VALUES (%s, 'buyer', 'buyer@example.com', 'x')",
+        (USER_ID,)
+    )
+    conn.commit()
+    conn.close()
+
+
+def fire(handler, token: str, keys: list) -> list:
+    """Вызывает POST параллельно, по одному потоку на ключ; возвращает (статус, тело, повтор, мс)"""
+    def one(key):
+        started = time.perf_counter()
+        response = handler(make_event('POST', '/', {'X-User-Token': token, 'Idempotency-Key': key}), None)
+        elapsed = (time.perf_counter() - started) * 1000
+        return (response['statusCode'], json.loads(response['body']),
+                response['headers'].get('Idempotent-Replayed'), elapsed)
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+        return list(pool.map(one, keys))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duplicates', type=int, default=32)
+    parser.add_argument('--distinct', type=int, default=8)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    seed(dsn)
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('TOKEN_SECRET', 'bench-secret')
+    os.environ['DB_POOL_MAX_SIZE'] = str(max(args.duplicates, args.distinct))
+    index = load_handler('subscription')
+    token = sys.modules['tokens'].issue_token(USER_ID)
+
+    problems = []
+    duplicate_key = str(uuid.uuid4())
+    duplicates = fire(index.handler, token, [duplicate_key] * args.duplicates)
+    ids = {body.get('subscription_id') for status, body, _, _ in duplicates if status == 200}
+    if len(ids) != 1 or any(status != 200 for status, _, _, _ in duplicates):
+        problems.append(f'дубликаты вернули статусы {[d[0] for d in duplicates]} и id {sorted(map(str, ids))}')
+    if sum(replayed == 'false' for _, _, replayed, _ in duplicates) != 1:
+        problems.append('дубликаты должны содержать ровно один не повторённый ответ')
+
+    distinct = fire(index.handler, token, [str(uuid.uuid4()) for _ in range(args.distinct)])
+    # Повтор после других покупок должен отдать текущий срок, а не срок своей подписки
+    _, replay, _, _ = fire(index.handler, token, [duplicate_key])[0]
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM subscriptions WHERE idempotency_key = %s", (duplicate_key,))
+    duplicate_rows = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*), MIN(subscription_start), MAX(subscription_end) FROM subscriptions")
+    total_rows, first_start, last_end = cur.fetchone()
+    cur.execute("SELECT premium_until FROM users WHERE id = %s", (USER_ID,))
+    premium_until = cur.fetchone()[0]
+    cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    period_days = index.SUBSCRIPTION_PERIOD_DAYS * (1 + args.distinct)
+    if duplicate_rows != 1:
+        problems.append(f'по одному ключу записано {duplicate_rows} подписок')
+    if total_rows != 1 + args.distinct:
+        problems.append(f'всего подписок {total_rows}, ожидалось {1 + args.distinct}')
+    if premium_until != last_end or round((last_end - first_start).total_seconds() / 86400) != period_days:
+        problems.append(f'premium_until {premium_until} не продлён на {period_days} дней')
+    if replay.get('premium_until') != premium_until.replace(tzinfo=timezone.utc).isoformat():
+        problems.append(f'повтор вернул premium_until {replay.get("premium_until")} вместо текущего {premium_until}')
+
+    print(json.dumps({
+        'duplicates': args.duplicates,
+        'duplicate_latency': summarize([d[3] for d in duplicates]),
+        'distinct': args.distinct,
+        'distinct_latency': summarize([d[3] for d in distinct]),
+        'subscriptions_written': total_rows,
+        'premium_days': round((premium_until - first_start).total_seconds() / 86400, 2),
+        'problems': problems
+    }, indent=2, ensure_ascii=False))
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
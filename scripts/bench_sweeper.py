@@ -0,0 +1,84 @@
+"""Пакетное снятие истёкшего Premium: пропускная способность и отсутствие ожиданий на блокировках.
+
+В схеме bench_sweeper создаются пользователи (часть с истёкшим Premium) и их
+подписки. Пока идёт прогон, отдельное соединение держит блокировку части
+истёкших пользователей, имитируя живые запросы: их sweep пропускает, а не ждёт.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_sweeper.py --users 200000 --lapsed 50000
+"""
+import argparse
+import json
+import os
+import sys
+import psycopg2
+import psycopg2.extensions
+from bench_common import load_handler, require_database_url
+
+SCHEMA = 'bench_sweeper'
+
+
+def seed(dsn: str, users: int, lapsed: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('users', 'subscriptions'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    # Первые lapsed пользователей — с истёкшим Premium, каждый десятый из остальных — с действующим
+    cur.execute("""
+        INSERT INTO users (id, username, email, password_hash, is_premium, premium_until)
+        SELECT g, 'user' || g, 'user' || g || '@example.com', 'x',
+               g <= %(lapsed)s OR g %% 10 = 0,
+               CASE WHEN g <= %(lapsed)s THEN NOW() AT TIME ZONE 'UTC' - (g || ' seconds')::interval
+                    WHEN g %% 10 = 0 THEN NOW() AT TIME ZONE 'UTC' + interval '30 days' END
+        FROM generate_series(1, %(users)s) g
+    """, {'users': users, 'lapsed': lapsed})
+    cur.execute("""
+        INSERT INTO subscriptions (user_id, amount, status, payment_method, subscription_end)
+        SELECT id, 299.00, 'active', 'bench', premium_until FROM users WHERE is_premium
+    """)
+    cur.execute("ANALYZE users")
+    cur.execute("ANALYZE subscriptions")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--lapsed', type=int, default=50000)
+    parser.add_argument('--locked', type=int, default=100, help='истёкших пользователей под чужой блокировкой')
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    seed(dsn, args.users, args.lapsed)
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['SWEEP_TIME_BUDGET_SECONDS'] = '600'
+    index = load_handler('sweeper')
+
+    holder = psycopg2.connect(dsn)
+    holder_cur = holder.cursor()
+    holder_cur.execute("SELECT id FROM users WHERE id <= %s FOR UPDATE", (args.locked,))
+
+    results = {'users': args.users, 'lapsed': args.lapsed, 'locked': args.locked}
+    results['sweep'] = index.sweep()
+    holder.rollback()
+    results['sweep_after_locks_released'] = index.sweep()
+    results['sweep_nothing_to_do'] = index.sweep()
+    holder.close()
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users WHERE is_premium AND premium_until < NOW() AT TIME ZONE 'UTC'")
+    results['still_lapsed'] = cur.fetchone()[0]
+    cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    expected = args.lapsed - args.locked
+    if results['sweep']['users_expired'] != expected or results['still_lapsed']:
+        sys.exit(f'ожидалось {expected} пользователей в первом проходе и 0 оставшихся')
+
+
+if __name__ == '__main__':
+    main()
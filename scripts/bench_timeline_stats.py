@@ -0,0 +1,119 @@
+"""Статистика хронологии: агрегаты на лету против материализованных представлений.
+
+Для каждого размера каталога в схеме bench_timeline_stats генерируются фазы,
+фильмы, персонажи и их связи, затем к ней применяется миграция V0011.
+Чтение из представлений должно оставаться почти постоянным по времени, тогда
+как агрегаты на лету растут вместе с каталогом.
+Запуск: DATABASE_URL=postgres://... python scripts/bench_timeline_stats.py --sizes 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import time
+import psycopg2
+import psycopg2.extensions
+from bench_common import ROOT, require_database_url, summarize, timed
+
+SCHEMA = 'bench_timeline_stats'
+PHASES = 6
+CAST_SIZE = 8
+
+MIGRATION = os.path.join(ROOT, 'db_migrations', 'V0011__add_timeline_stats.sql')
+
+LIVE_PHASE_STATS = """
+    SELECT p.id, p.name, COUNT(m.id), COALESCE(SUM(m.box_office), 0),
+           COALESCE(SUM(m.duration_minutes), 0), ROUND(AVG(m.rating), 2)
+    FROM phases p LEFT JOIN movies m ON m.phase_id = p.id
+    GROUP BY p.id, p.name ORDER BY p.id
+"""
+
+LIVE_CO_APPEARANCES = """
+    SELECT b.character_id, COUNT(*) AS shared
+    FROM movie_characters a
+    JOIN movie_characters b ON b.movie_id = a.movie_id AND b.character_id <> a.character_id
+    WHERE a.character_id = %s
+    GROUP BY b.character_id ORDER BY shared DESC LIMIT 50
+"""
+
+VIEW_PHASE_STATS = "SELECT * FROM phase_stats ORDER BY phase_id"
+
+VIEW_CO_APPEARANCES = """
+    SELECT other_character_id, shared_movies FROM character_co_appearances
+    WHERE character_id = %s ORDER BY shared_movies DESC LIMIT 50
+"""
+
+
+def seed(dsn: str, movies: int) -> float:
+    """Заполняет схему и возвращает время refresh_timeline_stats() в миллисекундах"""
+    characters = max(movies // 4, CAST_SIZE * 2)
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in ('phases', 'movies', 'characters', 'movie_characters', 'data_versions'):
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+    cur.execute("INSERT INTO phases (id, name) SELECT g, 'Фаза ' || g FROM generate_series(1, %s) g", (PHASES,))
+    cur.execute("""
+        INSERT INTO movies (id, title, content_type, phase_id, duration_minutes, box_office, rating)
+        SELECT g, 'Фильм ' || g, 'movie', 1 + g %% %s, 90 + g %% 90, 100000000 + g * 1000, 5 + (g %% 50) / 10.0
+        FROM generate_series(1, %s) g
+    """, (PHASES, movies))
+    cur.execute("INSERT INTO characters (id, name) SELECT g, 'Персонаж ' || g FROM generate_series(1, %s) g",
+                (characters,))
+    # У каждого фильма CAST_SIZE персонажей; первые десять — «звёзды», которые есть почти везде
+    cur.execute("""
+        INSERT INTO movie_characters (movie_id, character_id, role)
+        SELECT DISTINCT m, CASE WHEN k < 2 THEN 1 + (m + k) %% 10 ELSE 1 + (m * 7 + k * 13) %% %s END, 'main'
+        FROM generate_series(1, %s) m, generate_series(0, %s) k
+    """, (characters, movies, CAST_SIZE - 1))
+    cur.execute("INSERT INTO data_versions (name) VALUES ('timeline')")
+    with open(MIGRATION, encoding='utf-8') as f:
+        cur.execute(f.read())
+    for table in ('phases', 'movies', 'characters', 'movie_characters'):
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+
+    started = time.perf_counter()
+    cur.execute("SELECT refresh_timeline_stats()")
+    conn.commit()
+    refresh_ms = round((time.perf_counter() - started) * 1000, 3)
+    conn.close()
+    return refresh_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000', help='число фильмов через запятую')
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    dsn = psycopg2.extensions.make_dsn(require_database_url(), options=f'-c search_path={SCHEMA},public')
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        refresh_ms = seed(dsn, size)
+        conn = psycopg2.connect(dsn)
+        cur = conn.cursor()
+
+        def run(query, params=None):
+            return lambda: (cur.execute(query, params), cur.fetchall())
+
+        results.append({
+            'movies': size,
+            'refresh_ms': refresh_ms,
+            'live_phase_stats': summarize(timed(run(LIVE_PHASE_STATS), args.iterations)),
+            'view_phase_stats': summarize(timed(run(VIEW_PHASE_STATS), args.iterations)),
+            'live_co_appearances': summarize(timed(run(LIVE_CO_APPEARANCES, (1,)), args.iterations)),
+            'view_co_appearances': summarize(timed(run(VIEW_CO_APPEARANCES, (1,)), args.iterations))
+        })
+        conn.close()
+
+    conn = psycopg2.connect(dsn)
+    conn.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Пакетная загрузка каталога из CSV или JSONL через COPY.
+
+Каждый файл потоком копируется во временную промежуточную таблицу, затем
+одним оператором на таблицу естественные ключи превращаются в id и строки
+вставляются или обновляются (INSERT ... ON CONFLICT). Неизменившиеся строки
+не переписываются. Естественные ключи:
+    characters        name
+    movies            title; фаза указывается названием (phase)
+    movie_characters  movie (название фильма) + character (имя персонажа)
+    easter_eggs       movie + title; references_movie — название фильма
+    news              external_id
+Формат определяется расширением: .csv с заголовком или .jsonl (объект на строку).
+Строки, ссылающиеся на неизвестный фильм, персонажа или фазу, пропускаются и
+попадают в отчёт как unresolved.
+
+Контрольная сумма полностью загруженного файла сохраняется в bulk_loads,
+поэтому повторный запуск на том же файле его не читает (--force отключает
+проверку). После изменения хронологии обновляется статистика
+(refresh_timeline_stats); заготовки ответов перерисуются первым запросом или
+через scripts/prerender.py, статические шарды — через scripts/export_static.py.
+Запуск: DATABASE_URL=postgres://... python scripts/bulk_load.py --movies movies.csv --movie-characters cast.jsonl
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import psycopg2
+from bench_common import require_database_url
+
+# Порядок загрузки: связи и пасхалки ссылаются на уже загруженные фильмы и персонажей
+ENTITIES = {
+    'characters': [
+        ('name', 'TEXT'), ('real_name', 'TEXT'), ('description', 'TEXT'), ('image_url', 'TEXT'),
+        ('first_appearance', 'TEXT'), ('actor', 'TEXT')
+    ],
+    'movies': [
+        ('title', 'TEXT'), ('description', 'TEXT'), ('release_date', 'DATE'), ('chronological_order', 'INTEGER'),
+        ('phase', 'TEXT'), ('content_type', 'TEXT'), ('image_url', 'TEXT'), ('duration_minutes', 'INTEGER'),
+        ('director', 'TEXT'), ('box_office', 'BIGINT'), ('rating', 'NUMERIC'), ('universe', 'TEXT')
+    ],
+    'movie_characters': [
+        ('movie', 'TEXT'), ('character', 'TEXT'), ('role', 'TEXT')
+    ],
+    'easter_eggs': [
+        ('movie', 'TEXT'), ('title', 'TEXT'), ('description', 'TEXT'), ('timestamp_minutes', 'INTEGER'),
+        ('references_movie', 'TEXT')
+    ],
+    'news': [
+        ('external_id', 'TEXT'), ('title', 'TEXT'), ('content', 'TEXT'), ('category', 'TEXT'), ('image_url', 'TEXT'),
+        ('credibility_rating', 'INTEGER'), ('credibility_status', 'TEXT'), ('source', 'TEXT'),
+        ('is_premium', 'BOOLEAN'), ('published_at', 'TIMESTAMP')
+    ]
+}
+TIMELINE_ENTITIES = ('characters', 'movies', 'movie_characters', 'easter_eggs')
+
+# Каждый запрос: resolved — последняя строка файла на каждый ключ с найденными id,
+# upserted — вставка или обновление только отличающихся строк.
+# Результат: (строк в файле, уникальных ключей, неразрешённых, вставлено, обновлено)
+UPSERT_QUERIES = {
+    'characters': """
+        WITH resolved AS (
+            SELECT DISTINCT ON (name) *, FALSE AS unresolved
+            FROM stage_characters WHERE name IS NOT NULL
+            ORDER BY name, seq DESC
+        ), upserted AS (
+            INSERT INTO characters (name, real_name, description, image_url, first_appearance, actor)
+            SELECT name, real_name, description, image_url, first_appearance, actor FROM resolved
+            ON CONFLICT (name) DO UPDATE SET
+                real_name = EXCLUDED.real_name, description = EXCLUDED.description, image_url = EXCLUDED.image_url,
+                first_appearance = EXCLUDED.first_appearance, actor = EXCLUDED.actor
+            WHERE (characters.real_name, characters.description, characters.image_url,
+                   characters.first_appearance, characters.actor)
+                IS DISTINCT FROM (EXCLUDED.real_name, EXCLUDED.description, EXCLUDED.image_url,
+                                  EXCLUDED.first_appearance, EXCLUDED.actor)
+            RETURNING xmax = 0 AS inserted
+        )
+    """,
+    'movies': """
+        WITH resolved AS (
+            SELECT DISTINCT ON (s.title) s.*, p.id AS phase_id, s.phase IS NOT NULL AND p.id IS NULL AS unresolved
+            FROM stage_movies s
+            LEFT JOIN phases p ON p.name = s.phase
+            WHERE s.title IS NOT NULL
+            ORDER BY s.title, s.seq DESC
+        ), upserted AS (
+            INSERT INTO movies (title, description, release_date, chronological_order, phase_id, content_type,
+                                image_url, duration_minutes, director, box_office, rating, universe)
+            SELECT title, description, release_date, chronological_order, phase_id, content_type,
+                   image_url, duration_minutes, director, box_office, rating, COALESCE(universe, 'MCU')
+            FROM resolved WHERE NOT unresolved
+            ON CONFLICT (title) DO UPDATE SET
+                description = EXCLUDED.description, release_date = EXCLUDED.release_date,
+                chronological_order = EXCLUDED.chronological_order, phase_id = EXCLUDED.phase_id,
+                content_type = EXCLUDED.content_type, image_url = EXCLUDED.image_url,
+                duration_minutes = EXCLUDED.duration_minutes, director = EXCLUDED.director,
+                box_office = EXCLUDED.box_office, rating = EXCLUDED.rating, universe = EXCLUDED.universe
+            WHERE (movies.description, movies.release_date, movies.chronological_order, movies.phase_id,
+                   movies.content_type, movies.image_url, movies.duration_minutes, movies.director,
+                   movies.box_office, movies.rating, movies.universe)
+                IS DISTINCT FROM (EXCLUDED.description, EXCLUDED.release_date, EXCLUDED.chronological_order,
+                                  EXCLUDED.phase_id, EXCLUDED.content_type, EXCLUDED.image_url,
+                                  EXCLUDED.duration_minutes, EXCLUDED.director, EXCLUDED.box_office,
+                                  EXCLUDED.rating, EXCLUDED.universe)
+            RETURNING xmax = 0 AS inserted
+        )
+    """,
+    'movie_characters': """
+        WITH resolved AS (
+            SELECT DISTINCT ON (s.movie, s."character") s.role, m.id AS movie_id, c.id AS character_id,
+                   m.id IS NULL OR c.id IS NULL AS unresolved
+            FROM stage_movie_characters s
+            LEFT JOIN movies m ON m.title = s.movie
+            LEFT JOIN characters c ON c.name = s."character"
+            WHERE s.movie IS NOT NULL AND s."character" IS NOT NULL
+            ORDER BY s.movie, s."character", s.seq DESC
+        ), upserted AS (
+            INSERT INTO movie_characters (movie_id, character_id, role)
+            SELECT movie_id, character_id, role FROM resolved WHERE NOT unresolved
+            ON CONFLICT (movie_id, character_id) DO UPDATE SET role = EXCLUDED.role
+            WHERE movie_characters.role IS DISTINCT FROM EXCLUDED.role
+            RETURNING xmax = 0 AS inserted
+        )
+    """,
+    'easter_eggs': """
+        WITH resolved AS (
+            SELECT DISTINCT ON (s.movie, s.title) s.title, s.description, s.timestamp_minutes,
+                   m.id AS movie_id, r.id AS references_movie_id,
+                   m.id IS NULL OR (s.references_movie IS NOT NULL AND r.id IS NULL) AS unresolved
+            FROM stage_easter_eggs s
+            LEFT JOIN movies m ON m.title = s.movie
+            LEFT JOIN movies r ON r.title = s.references_movie
+            WHERE s.movie IS NOT NULL AND s.title IS NOT NULL
+            ORDER BY s.movie, s.title, s.seq DESC
+        ), upserted AS (
+            INSERT INTO easter_eggs (movie_id, title, description, timestamp_minutes, references_movie_id)
+            SELECT movie_id, title, description, timestamp_minutes, references_movie_id FROM resolved WHERE NOT unresolved
+            ON CONFLICT (movie_id, title) DO UPDATE SET
+                description = EXCLUDED.description, timestamp_minutes = EXCLUDED.timestamp_minutes,
+                references_movie_id = EXCLUDED.references_movie_id
+            WHERE (easter_eggs.description, easter_eggs.timestamp_minutes, easter_eggs.references_movie_id)
+                IS DISTINCT FROM (EXCLUDED.description, EXCLUDED.timestamp_minutes, EXCLUDED.references_movie_id)
+            RETURNING xmax = 0 AS inserted
+        )
+    """,
+    # Как в V0005: без явного статуса он выводится из рейтинга. Без даты публикации у уже
+    # загруженной новости остаётся прежняя дата. Счётчик просмотров не трогается
+    'news': """
+        WITH resolved AS (
+            SELECT DISTINCT ON (s.external_id) s.*, COALESCE(s.published_at, n.published_at, NOW()) AS published,
+                   FALSE AS unresolved
+            FROM stage_news s
+            LEFT JOIN news n ON n.external_id = s.external_id
+            WHERE s.external_id IS NOT NULL
+            ORDER BY s.external_id, s.seq DESC
+        ), upserted AS (
+            INSERT INTO news (external_id, title, content, category, image_url, credibility_rating,
+                              credibility_status, source, is_premium, published_at)
+            SELECT external_id, title, content, category, image_url, credibility_rating,
+                   COALESCE(credibility_status, CASE
+                       WHEN credibility_rating >= 5 THEN 'official'
+                       WHEN credibility_rating >= 3 THEN 'confirmed_rumor'
+                       ELSE 'unverified_rumor'
+                   END),
+                   source, COALESCE(is_premium, FALSE), published
+            FROM resolved
+            ON CONFLICT (external_id) DO UPDATE SET
+                title = EXCLUDED.title, content = EXCLUDED.content, category = EXCLUDED.category,
+                image_url = EXCLUDED.image_url, credibility_rating = EXCLUDED.credibility_rating,
+                credibility_status = EXCLUDED.credibility_status, source = EXCLUDED.source,
+                is_premium = EXCLUDED.is_premium, published_at = EXCLUDED.published_at
+            WHERE (news.title, news.content, news.category, news.image_url, news.credibility_rating,
+                   news.credibility_status, news.source, news.is_premium, news.published_at)
+                IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.content, EXCLUDED.category, EXCLUDED.image_url,
+                                  EXCLUDED.credibility_rating, EXCLUDED.credibility_status, EXCLUDED.source,
+                                  EXCLUDED.is_premium, EXCLUDED.published_at)
+            RETURNING xmax = 0 AS inserted
+        )
+    """
+}
+UPSERT_RESULT = """
+    SELECT (SELECT count(*) FROM stage_{entity}),
+           (SELECT count(*) FROM resolved),
+           (SELECT count(*) FROM resolved WHERE unresolved),
+           count(*) FILTER (WHERE inserted),
+           count(*) FILTER (WHERE NOT inserted)
+    FROM upserted
+"""
+
+# Строки JSONL копируются как есть: разделитель и кавычка — символы, которых нет в JSON
+JSONL_COPY = "COPY stage_raw (line) FROM STDIN WITH (FORMAT csv, DELIMITER E'\\x01', QUOTE E'\\x02')"
+CHUNK_BYTES = 1024 * 1024
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def csv_columns(path: str, entity: str) -> list:
+    """Колонки из заголовка CSV; неизвестные колонки — ошибка, а не молча пропущенные данные"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        header = [name.strip() for name in next(csv.reader(f), [])]
+    known = {name for name, _ in ENTITIES[entity]}
+    unknown = [name for name in header if name not in known]
+    if unknown:
+        sys.exit(f'{path}: неизвестные колонки {", ".join(unknown)}; допустимы {", ".join(sorted(known))}')
+    return header
+
+
+def create_stage(cur, entity: str) -> None:
+    columns = ', '.join(f'"{name}" {sql_type}' for name, sql_type in ENTITIES[entity])
+    cur.execute(f"CREATE TEMP TABLE stage_{entity} (seq BIGSERIAL, {columns}) ON COMMIT DROP")
+
+
+def copy_file(cur, entity: str, path: str) -> None:
+    """Потоком копирует файл в stage_<entity>; seq сохраняет порядок строк файла"""
+    create_stage(cur, entity)
+    if path.endswith('.jsonl'):
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS stage_raw (seq BIGSERIAL, line TEXT) ON COMMIT DROP")
+        cur.execute("TRUNCATE stage_raw")
+        with open(path, 'rb') as f:
+            cur.copy_expert(JSONL_COPY, f, CHUNK_BYTES)
+        names = ', '.join(f'"{name}"' for name, _ in ENTITIES[entity])
+        cur.execute(f"""
+            INSERT INTO stage_{entity} ({names})
+            SELECT {', '.join(f'r."{name}"' for name, _ in ENTITIES[entity])}
+            FROM stage_raw, jsonb_populate_record(NULL::stage_{entity}, stage_raw.line::jsonb) r
+            WHERE btrim(stage_raw.line) <> ''
+            ORDER BY stage_raw.seq
+        """)
+    else:
+        names = ', '.join(f'"{name}"' for name in csv_columns(path, entity))
+        with open(path, 'rb') as f:
+            cur.copy_expert(f"COPY stage_{entity} ({names}) FROM STDIN WITH (FORMAT csv, HEADER true)", f, CHUNK_BYTES)
+    cur.execute(f"ANALYZE stage_{entity}")
+
+
+def load(conn, sources: dict, force: bool) -> list:
+    """Загружает файлы в одной транзакции; возвращает отчёт по каждому виду данных"""
+    cur = conn.cursor()
+    report = []
+    for entity in ENTITIES:
+        path = sources.get(entity)
+        if not path:
+            continue
+        started = time.perf_counter()
+        checksum = file_checksum(path)
+        cur.execute("SELECT checksum FROM bulk_loads WHERE entity = %s", (entity,))
+        row = cur.fetchone()
+        if not force and row is not None and row[0] == checksum:
+            report.append({'entity': entity, 'file': path, 'skipped': 'unchanged'})
+            continue
+
+        copy_file(cur, entity, path)
+        copied = time.perf_counter()
+        cur.execute(UPSERT_QUERIES[entity] + UPSERT_RESULT.format(entity=entity))
+        staged, rows, unresolved, inserted, updated = cur.fetchone()
+        elapsed = time.perf_counter() - started
+        # Файл с неразрешёнными ссылками не запоминается: следующий запуск попробует их снова
+        if unresolved == 0:
+            cur.execute("""
+                INSERT INTO bulk_loads (entity, checksum, row_count) VALUES (%s, %s, %s)
+                ON CONFLICT (entity) DO UPDATE SET
+                    checksum = EXCLUDED.checksum, row_count = EXCLUDED.row_count, loaded_at = NOW()
+            """, (entity, checksum, rows))
+        report.append({
+            'entity': entity,
+            'file': path,
+            'staged': staged,
+            'rows': rows,
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': rows - unresolved - inserted - updated,
+            'unresolved': unresolved,
+            'copy_ms': round((copied - started) * 1000, 1),
+            'upsert_ms': round((elapsed - (copied - started)) * 1000, 1),
+            'rows_per_second': round(staged / elapsed) if elapsed > 0 else None
+        })
+    cur.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    for entity in ENTITIES:
+        parser.add_argument('--' + entity.replace('_', '-'), dest=entity, help=f'CSV или JSONL для {entity}')
+    parser.add_argument('--force', action='store_true', help='загружать даже файлы, которые уже загружались')
+    args = parser.parse_args()
+
+    sources = {entity: getattr(args, entity) for entity in ENTITIES if getattr(args, entity)}
+    if not sources:
+        parser.error('укажите хотя бы один файл')
+    for path in sources.values():
+        if not os.path.isfile(path):
+            sys.exit(f'Файл не найден: {path}')
+
+    conn = psycopg2.connect(require_database_url())
+    try:
+        started = time.perf_counter()
+        report = load(conn, sources, args.force)
+        conn.commit()
+        changed = {item['entity'] for item in report if item.get('inserted') or item.get('updated')}
+        if changed & set(TIMELINE_ENTITIES):
+            with conn.cursor() as cur:
+                cur.execute("SELECT refresh_timeline_stats()")
+            conn.commit()
+        total_rows = sum(item.get('staged', 0) for item in report)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    print(json.dumps({
+        'entities': report,
+        'rows': total_rows,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'rows_per_second': round(total_rows / elapsed) if elapsed > 0 else None,
+        'timeline_stats_refreshed': bool(changed & set(TIMELINE_ENTITIES))
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
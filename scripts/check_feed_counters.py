@@ -0,0 +1,95 @@
+"""Проверка счётчиков новостей при ленте по умолчанию из заготовки rendered_responses.
+
+Лента рендерится запросом GET /, затем её первой новости через функцию comments
+добавляется комментарий, а через news — просмотр со сбросом счётчика.
+Запрос счётчиков ?fields=id,views_count,comments_count, который фронтенд делает
+после загрузки ленты, должен вернуть значения из базы, а версия ленты в
+data_versions — не измениться, чтобы заготовка не перерисовывалась от
+счётчиков. Пользователь и комментарий после проверки удаляются.
+Нужна база с применёнными db_migrations и хотя бы одной публичной новостью.
+Запуск: DATABASE_URL=postgres://... python scripts/check_feed_counters.py
+"""
+import json
+import os
+import sys
+import psycopg2
+from bench_common import load_handler, make_event, require_database_url
+from loadtest import decode_body
+
+USER_EMAIL = 'feed-counters-check@example.com'
+
+
+COUNTERS_PATH = '/?fields=id,views_count,comments_count'
+
+
+def feed_item(news, path: str, news_id=None) -> dict:
+    """Новость из первой страницы ленты: заданная или первая"""
+    payload = decode_body(news(make_event('GET', path), None))
+    items = payload['news']
+    if news_id is None:
+        return items[0]
+    return next(item for item in items if item['id'] == news_id)
+
+
+def news_version(cur) -> int:
+    cur.execute("SELECT version FROM data_versions WHERE name = 'news'")
+    return cur.fetchone()[0]
+
+
+def main():
+    dsn = require_database_url()
+    os.environ.setdefault('TOKEN_SECRET', 'check-secret')
+    batch = load_handler('batch')
+    news = batch.load_function('news')
+    comments = batch.load_function('comments')
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("DELETE FROM users WHERE email = %s", (USER_EMAIL,))
+    cur.execute(
+        "INSERT INTO users (username, email, password_hash) VALUES ('feed-check', %s, 'x') RETURNING id",
+        (USER_EMAIL,)
+    )
+    user_id = cur.fetchone()[0]
+    token = sys.modules['tokens'].issue_token(user_id)
+
+    try:
+        before = feed_item(news, '/')
+        version = news_version(cur)
+        response = comments(make_event('POST', '/', {'X-User-Token': token},
+                                       {'news_id': before['id'], 'content': 'Проверка счётчика'}), None)
+        if response['statusCode'] != 201:
+            sys.exit(f'comments вернул {response["statusCode"]}: {response.get("body")}')
+        news(make_event('POST', '/', body={'news_id': before['id']}), None)
+        sys.modules['views'].view_counter.flush()
+        after = feed_item(news, COUNTERS_PATH, before['id'])
+
+        cur.execute("SELECT COUNT(*) FROM comments WHERE news_id = %s", (before['id'],))
+        comments_actual = cur.fetchone()[0]
+        cur.execute("SELECT views_count FROM news WHERE id = %s", (before['id'],))
+        views_actual = cur.fetchone()[0]
+        version_after = news_version(cur)
+    finally:
+        cur.execute("DELETE FROM comments WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        conn.close()
+
+    result = {
+        'news_id': before['id'],
+        'comments_count': {'before': before['comments_count'], 'after': after['comments_count'],
+                           'actual': comments_actual},
+        'views_count': {'before': before['views_count'], 'after': after['views_count'], 'actual': views_actual},
+        'news_version': {'before': version, 'after': version_after}
+    }
+    problems = [name for name in ('comments_count', 'views_count') if result[name]['after'] != result[name]['actual']]
+    if version_after != version:
+        problems.append('news_version')
+    result['ok'] = not problems
+    print(json.dumps(result, ensure_ascii=False))
+    if problems:
+        sys.exit('Счётчики ленты разошлись с базой: ' + ', '.join(problems))
+
+
+if __name__ == '__main__':
+    main()
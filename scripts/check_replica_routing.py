@@ -0,0 +1,98 @@
+"""Проверка маршрутизации чтения на реплику на двух локальных экземплярах Postgres.
+
+Настоящая репликация не нужна: достаточно двух баз с применёнными db_migrations,
+например двух контейнеров postgres на портах 5432 и 5433. Так как данные в них
+независимы, запись на primary заведомо «не доехала» до реплики — это и
+проверяется для чтения своих записей после подписки.
+Запуск:
+    DATABASE_URL=postgres://localhost:5432/marvel DATABASE_REPLICA_URL=postgres://localhost:5433/marvel \\
+        python scripts/check_replica_routing.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from bench_common import load_handler, require_database_url
+
+IDENTITY_QUERY = "SELECT inet_server_port(), current_database(), pg_postmaster_start_time()"
+USER_EMAIL = 'replica-check@example.com'
+
+
+def identity(conn):
+    with conn.cursor() as cur:
+        cur.execute(IDENTITY_QUERY)
+        return cur.fetchone()
+
+
+def read_target(db, primary_identity) -> str:
+    conn = db.get_read_connection()
+    try:
+        return 'primary' if identity(conn) == primary_identity else 'replica'
+    finally:
+        db.release_connection(conn)
+
+
+def reset(router, **changes) -> None:
+    for name, value in changes.items():
+        setattr(router, name, value)
+    router._checked_at = None
+
+
+def main():
+    primary_dsn = require_database_url()
+    if not os.environ.get('DATABASE_REPLICA_URL'):
+        sys.exit('Укажите DATABASE_REPLICA_URL второго экземпляра Postgres')
+    os.environ.setdefault('TOKEN_SECRET', 'replica-check-secret')
+
+    load_handler('subscription')
+    db = sys.modules['db']
+    entitlements = sys.modules['entitlements'].entitlements
+    router = db.get_replica_router()
+
+    conn = db.get_connection()
+    primary_identity = identity(conn)
+    db.release_connection(conn)
+
+    checks = {}
+    checks['reads_use_replica'] = read_target(db, primary_identity) == 'replica'
+
+    reset(router, max_lag=-1)
+    checks['lagging_replica_falls_back'] = read_target(db, primary_identity) == 'primary'
+    reset(router, max_lag=db.REPLICA_MAX_LAG_SECONDS)
+
+    replica_pool = router.pool
+    router.pool = db.ConnectionPool('postgres://127.0.0.1:1/unreachable', 1, 1, 30)
+    reset(router)
+    checks['unreachable_replica_falls_back'] = read_target(db, primary_identity) == 'primary'
+    router.pool = replica_pool
+    reset(router)
+
+    # Пользователь с подпиской есть только на primary — как будто реплика ещё не догнала запись
+    premium_until = datetime.now(timezone.utc) + timedelta(days=30)
+    writer = psycopg2.connect(primary_dsn)
+    cur = writer.cursor()
+    cur.execute("DELETE FROM users WHERE email = %s", (USER_EMAIL,))
+    cur.execute(
+        "INSERT INTO users (username, email, password_hash, is_premium, premium_until) "
+        "VALUES ('replica-check', %s, 'x', TRUE, %s) RETURNING id",
+        (USER_EMAIL, premium_until.replace(tzinfo=None))
+    )
+    user_id = cur.fetchone()[0]
+    writer.commit()
+    try:
+        checks['replica_lacks_fresh_write'] = entitlements.lookup(user_id) is None
+        entitlements.invalidate(user_id)
+        checks['token_hint_reads_own_write'] = entitlements.lookup(user_id, premium_until.timestamp()) is not None
+    finally:
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        writer.commit()
+        writer.close()
+
+    print(json.dumps({'checks': checks, 'pool': db.pool_stats()}, indent=2, default=str))
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Выгрузка хронологии и ленты новостей в статические JSON-файлы public/data для раздачи через CDN.
+
+Данные строятся теми же функциями, что и ответы timeline и news. Имя каждого
+шарда содержит хеш содержимого, поэтому шарды можно кешировать навсегда, а
+повторная выгрузка пишет только шарды с изменившимся содержимым. Фронтенд
+сначала читает manifest.json (без кеша) и находит в нём имена шардов; если
+манифеста нет, он обращается к функциям как раньше.
+
+Шарды удаляются, только когда они не упомянуты ни в новом, ни в предыдущем
+манифесте: клиент со старым манифестом успеет дочитать свои файлы.
+Запуск: DATABASE_URL=postgres://... python scripts/export_static.py
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+import psycopg2
+from bench_common import ROOT, load_handler, require_database_url
+
+OUTPUT_DIR = os.path.join(ROOT, 'public', 'data')
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+
+
+def collect_documents(cur) -> dict:
+    """Ключ шарда -> данные; ключи вида timeline/catalog, timeline/phase/1, timeline/movie/7, news/feed"""
+    timeline = load_handler('timeline')
+    documents = {}
+    catalog = timeline.load_catalog(cur, None, None)
+    documents['timeline/catalog'] = catalog
+
+    for phase in catalog['phases']:
+        documents[f'timeline/phase/{phase["id"]}'] = {
+            'phase_id': phase['id'],
+            'movies': [movie for movie in catalog['movies'] if movie['phase_id'] == phase['id']]
+        }
+
+    ids = [movie['id'] for movie in catalog['movies']]
+    for movie_id, movie in timeline.load_movie_details(cur, ids).items():
+        documents[f'timeline/movie/{movie_id}'] = {'movie': movie}
+
+    news = load_handler('news')
+    documents['news/feed'] = news.load_feed(cur, False, None, list(news.NEWS_FIELDS), news.DEFAULT_PAGE_SIZE, None)
+    return documents
+
+
+def shard_name(key: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f'{key.replace("/", "-")}.{digest}.json'
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export(documents: dict, output_dir: str) -> dict:
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous = read_manifest(manifest_path)
+
+    files = {}
+    report = {'written': 0, 'unchanged': 0, 'removed': 0}
+    for key in sorted(documents):
+        content = json.dumps(documents[key], ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        name = shard_name(key, content)
+        files[key] = name
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            report['unchanged'] += 1
+            continue
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        report['written'] += 1
+
+    keep = set(files.values()) | set((previous.get('files') or {}).values()) | {MANIFEST_NAME}
+    for name in os.listdir(output_dir):
+        if name.endswith('.json') and name not in keep:
+            os.remove(os.path.join(output_dir, name))
+            report['removed'] += 1
+
+    # Манифест переписывается, только если изменился набор шардов
+    if files != previous.get('files'):
+        manifest = {
+            'version': hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:HASH_LENGTH],
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'files': files
+        }
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+        report['manifest'] = 'updated'
+    else:
+        report['manifest'] = 'unchanged'
+    report['shards'] = len(files)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=OUTPUT_DIR, help='каталог для шардов и манифеста')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(require_database_url())
+    cur = conn.cursor()
+    try:
+        documents = collect_documents(cur)
+    finally:
+        cur.close()
+        conn.close()
+
+    print(json.dumps(export(documents, args.output)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Локальный прогон backend/*/tests.json с нагрузкой и бюджетами латентности.
+
+Обработчики вызываются напрямую как handler(event, context) — задеплоенные
+адреса из func2url.json не нужны. Каждый тест сначала выполняется один раз
+для проверки статуса и формы ответа, затем идемпотентные тесты (GET или с
+"load": true) повторяются с заданной конкурентностью.
+
+Необязательный бюджет теста в tests.json:
+    "budget": {"p50Ms": 20, "p95Ms": 50, "p99Ms": 100, "maxQueries": 2}
+maxQueries — наибольшее число SQL-запросов за один вызов.
+
+Запуск:
+    DATABASE_URL=postgres://localhost/marvel python scripts/loadtest.py --seed
+    python scripts/loadtest.py timeline news -c 16 -n 2000
+"""
+import argparse
+import base64
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import psycopg2.extensions
+from bench_common import BACKEND_DIR, ROOT, load_handler, make_event, require_database_url, summarize
+
+TYPE_NAMES = {
+    'string': str,
+    'number': (int, float),
+    'boolean': bool,
+    'array': list,
+    'object': dict
+}
+
+_query_counter = threading.local()
+
+
+class CountingMixin:
+    def execute(self, query, vars=None):
+        _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+        return super().execute(query, vars)
+
+
+class CountingCursor(CountingMixin, psycopg2.extensions.cursor):
+    pass
+
+
+def install_query_counter() -> None:
+    original_connect = psycopg2.connect
+    if getattr(original_connect, 'counting', False):
+        return
+
+    def connect(*args, **kwargs):
+        # При INSTRUMENTATION=1 пул передаёт свой курсор — подмешиваем к нему подсчёт
+        factory = kwargs.get('cursor_factory')
+        kwargs['cursor_factory'] = type('Counting' + factory.__name__, (CountingMixin, factory), {}) if factory else CountingCursor
+        return original_connect(*args, **kwargs)
+
+    connect.counting = True
+    psycopg2.connect = connect
+
+
+def seed_database(dsn: str) -> None:
+    """Пересоздаёт схему public и применяет db_migrations по порядку версий"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA public CASCADE")
+    cur.execute("CREATE SCHEMA public")
+    migrations = sorted(glob.glob(os.path.join(ROOT, 'db_migrations', 'V*.sql')),
+                        key=lambda path: int(os.path.basename(path)[1:].split('__')[0]))
+    for path in migrations:
+        with open(path, encoding='utf-8') as f:
+            cur.execute(f.read())
+        print(f'applied {os.path.basename(path)}')
+    conn.commit()
+    conn.close()
+
+
+def decode_body(response: dict):
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        raw = base64.b64decode(body)
+        encoding = (response.get('headers') or {}).get('Content-Encoding')
+        if encoding == 'gzip':
+            raw = gzip.decompress(raw)
+        elif encoding == 'br':
+            import brotli
+            raw = brotli.decompress(raw)
+        body = raw.decode('utf-8')
+    return json.loads(body) if body else None
+
+
+def body_mismatches(expected, actual, matcher: str, path: str = '') -> list:
+    if isinstance(expected, str) and expected in TYPE_NAMES:
+        expected_type = TYPE_NAMES[expected]
+        if isinstance(actual, bool) and expected != 'boolean':
+            return [f'{path or "body"}: ожидался {expected}, получено boolean']
+        return [] if isinstance(actual, expected_type) else [f'{path or "body"}: ожидался {expected}, получено {type(actual).__name__}']
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            return [f'{path or "body"}: ожидался объект']
+        problems = []
+        for key, value in expected.items():
+            if key not in actual:
+                problems.append(f'{path}.{key}: отсутствует')
+            else:
+                problems.extend(body_mismatches(value, actual[key], matcher, f'{path}.{key}'))
+        if matcher == 'exact':
+            problems.extend(f'{path}.{key}: лишнее поле' for key in actual if key not in expected)
+        return problems
+    return [] if expected == actual else [f'{path or "body"}: ожидалось {expected!r}, получено {actual!r}']
+
+
+def build_event(test: dict) -> dict:
+    return make_event(test.get('method', 'GET'), test.get('path', '/'), test.get('headers'), test.get('body'))
+
+
+def invoke(handler, test: dict):
+    _query_counter.count = 0
+    started = time.perf_counter()
+    response = handler(build_event(test), None)
+    return response, (time.perf_counter() - started) * 1000, _query_counter.count
+
+
+def check_response(test: dict, response: dict) -> list:
+    problems = []
+    if response['statusCode'] != test.get('expectedStatus', 200):
+        problems.append(f'статус {response["statusCode"]}, ожидался {test.get("expectedStatus", 200)}')
+    if 'expectedBody' in test:
+        problems.extend(body_mismatches(test['expectedBody'], decode_body(response), test.get('bodyMatcher', 'partial')))
+    return problems
+
+
+def run_load(handler, test: dict, concurrency: int, requests: int) -> dict:
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(_):
+        try:
+            response, latency, count = invoke(handler, test)
+            status_ok = response['statusCode'] == test.get('expectedStatus', 200)
+        except Exception as exc:
+            with lock:
+                errors.append(repr(exc))
+            return
+        with lock:
+            latencies.append(latency)
+            queries.append(count)
+            if not status_ok:
+                errors.append(f'статус {response["statusCode"]}')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies)
+    stats['throughput_rps'] = round(len(latencies) / elapsed, 1) if elapsed else 0.0
+    stats['max_queries'] = max(queries) if queries else 0
+    stats['errors'] = len(errors)
+    if errors:
+        stats['first_error'] = errors[0]
+    return stats
+
+
+def budget_violations(budget: dict, stats: dict) -> list:
+    problems = []
+    for key, stat in (('p50Ms', 'p50_ms'), ('p95Ms', 'p95_ms'), ('p99Ms', 'p99_ms')):
+        if key in budget and stats[stat] > budget[key]:
+            problems.append(f'{stat} {stats[stat]} > {budget[key]}')
+    if 'maxQueries' in budget and stats['max_queries'] > budget['maxQueries']:
+        problems.append(f'запросов за вызов {stats["max_queries"]} > {budget["maxQueries"]}')
+    return problems
+
+
+def run_function(name: str, args) -> bool:
+    tests_path = os.path.join(BACKEND_DIR, name, 'tests.json')
+    if not os.path.exists(tests_path):
+        return True
+    with open(tests_path, encoding='utf-8') as f:
+        tests = json.load(f).get('tests', [])
+
+    index = load_handler(name)
+    passed = True
+    for test in tests:
+        response, latency, count = invoke(index.handler, test)
+        problems = check_response(test, response)
+        stats = {'latency_ms': round(latency, 3), 'queries': count}
+
+        wants_load = test.get('load', test.get('method', 'GET') == 'GET')
+        if wants_load and args.requests > 0 and not problems:
+            stats = run_load(index.handler, test, args.concurrency, args.requests)
+            if stats['errors']:
+                problems.append(f'ошибок под нагрузкой: {stats["errors"]} ({stats.get("first_error")})')
+        elif 'budget' in test and 'maxQueries' in test['budget'] and count > test['budget']['maxQueries']:
+            problems.append(f'запросов за вызов {count} > {test["budget"]["maxQueries"]}')
+
+        if wants_load and 'budget' in test and 'p50_ms' in stats:
+            problems.extend(budget_violations(test['budget'], stats))
+
+        passed = passed and not problems
+        print(json.dumps({
+            'function': name,
+            'test': test.get('name'),
+            'ok': not problems,
+            'problems': problems,
+            'stats': stats
+        }, ensure_ascii=False))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('functions', nargs='*', help='имена каталогов backend/; по умолчанию все')
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-n', '--requests', type=int, default=500, help='вызовов на тест; 0 — только проверка')
+    parser.add_argument('--seed', action='store_true', help='пересоздать схему и применить db_migrations')
+    args = parser.parse_args()
+
+    dsn = require_database_url()
+    os.environ.setdefault('TOKEN_SECRET', 'loadtest-secret')
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    if args.seed:
+        seed_database(dsn)
+    install_query_counter()
+
+    functions = args.functions or sorted(
+        name for name in os.listdir(BACKEND_DIR) if os.path.exists(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+    results = [run_function(name, args) for name in functions]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
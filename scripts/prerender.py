@@ -0,0 +1,28 @@
+"""Обновляет устаревшие заготовки в rendered_responses после миграций или загрузки данных.
+
+Заготовки рендерятся и лениво — первым запросом после изменения данных, — но
+прогон после загрузки избавляет этот запрос от лишней работы. Актуальные
+заготовки не перерисовываются.
+Запуск: DATABASE_URL=postgres://... python scripts/prerender.py
+"""
+import json
+import time
+from bench_common import load_handler, require_database_url
+
+FUNCTIONS = ('timeline', 'news', 'secrets')
+
+
+def main():
+    require_database_url()
+    for name in FUNCTIONS:
+        started = time.perf_counter()
+        endpoints = load_handler(name).prerender()
+        print(json.dumps({
+            'function': name,
+            'endpoints': endpoints,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""Обновляет материализованные представления статистики хронологии.
+
+Запускается после применения db_migrations и после загрузки данных в movies,
+phases или movie_characters. Чтение во время обновления не блокируется.
+Запуск: DATABASE_URL=postgres://... python scripts/refresh_timeline_stats.py
+"""
+import json
+import time
+import psycopg2
+from bench_common import require_database_url
+
+
+def refresh(dsn: str) -> float:
+    conn = psycopg2.connect(dsn)
+    try:
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("SELECT refresh_timeline_stats()")
+        conn.commit()
+        return time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def main():
+    elapsed = refresh(require_database_url())
+    print(json.dumps({'refreshed': ['phase_stats', 'character_co_appearances'], 'elapsed_ms': round(elapsed * 1000, 3)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ interface News {
   source: string;
   is_premium: boolean;
   views_count: number;
+  comments_count: number;
   published_at: string;
 }
 
@@ -118,9 +119,15 @@ const NewsSection = ({ news, loading }: NewsSectionProps) => {
               <CardContent>
                 <div className="flex items-center justify-between text-xs text-muted-foreground">
                   <span>{item.source}</span>
-                  <div className="flex items-center gap-1">
-                    <Icon name="Eye" size={12} />
-                    {item.views_count}
+                  <div className="flex items-center gap-3">
+                    <div className="flex items-center gap-1">
+                      <Icon name="MessageCircle" size={12} />
+                      {item.comments_count}
+                    </div>
+                    <div className="flex items-center gap-1">
+                      <Icon name="Eye" size={12} />
+                      {item.views_count}
+                    </div>
                   </div>
                 </div>
               </CardContent>
@@ -6,7 +6,7 @@ import Icon from '@/components/ui/icon';
 interface SecretMaterial {
   id: number;
   title: string;
-  content: string;
+  content?: string;
   material_type: string;
   image_url: string;
 }
@@ -15,9 +15,10 @@ interface SecretMaterialsSectionProps {
   secretMaterials: SecretMaterial[];
   isPremium: boolean;
   onSubscribeClick: () => void;
+  onOpenMaterial: (materialId: number) => void;
 }
 
-const SecretMaterialsSection = ({ secretMaterials, isPremium, onSubscribeClick }: SecretMaterialsSectionProps) => {
+const SecretMaterialsSection = ({ secretMaterials, isPremium, onSubscribeClick, onOpenMaterial }: SecretMaterialsSectionProps) => {
   if (isPremium && secretMaterials.length > 0) {
     return (
       <section className="animate-fade-in">
@@ -57,13 +58,19 @@ const SecretMaterialsSection = ({ secretMaterials, isPremium, onSubscribeClick }
                   <CardTitle className="text-lg group-hover:text-accent transition-colors">
                     {material.title}
                   </CardTitle>
-                  <CardDescription className="line-clamp-3">
-                    {material.content}
-                  </CardDescription>
+                  {material.content && (
+                    <CardDescription>
+                      {material.content}
+                    </CardDescription>
+                  )}
                 </CardHeader>
                 
                 <CardContent>
-                  <Button variant="outline" className="w-full border-accent text-accent hover:bg-accent/10">
+                  <Button
+                    variant="outline"
+                    className="w-full border-accent text-accent hover:bg-accent/10"
+                    onClick={() => onOpenMaterial(material.id)}
+                  >
                     <Icon name="Download" size={16} className="mr-2" />
                     Открыть
                   </Button>
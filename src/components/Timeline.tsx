@@ -4,6 +4,7 @@ import { Badge } from '@/components/ui/badge';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
+import { fetchStatic } from '@/lib/staticData';
 
 interface Movie {
   id: number;
@@ -62,6 +63,7 @@ const Timeline = ({ apiUrl }: TimelineProps) => {
   const [selectedPhase, setSelectedPhase] = useState<number | null>(null);
   const [selectedCharacter, setSelectedCharacter] = useState<number | null>(null);
   const [showMovieDialog, setShowMovieDialog] = useState(false);
+  const [movieDetails, setMovieDetails] = useState<Record<number, Movie>>({});
 
   useEffect(() => {
     loadTimeline();
@@ -70,17 +72,27 @@ const Timeline = ({ apiUrl }: TimelineProps) => {
   const loadTimeline = async () => {
     setLoading(true);
     try {
-      let url = apiUrl;
-      const params = [];
-      if (selectedPhase) params.push(`phase_id=${selectedPhase}`);
-      if (selectedCharacter) params.push(`character_id=${selectedCharacter}`);
-      if (params.length > 0) url += `?${params.join('&')}`;
+      // Без фильтра по персонажу каталог и фазы берутся из статических шардов, функция не вызывается
+      let data = null;
+      if (!selectedCharacter) {
+        data = await fetchStatic<{ movies: Movie[]; phases?: Phase[]; characters?: Character[] }>(
+          selectedPhase ? `timeline/phase/${selectedPhase}` : 'timeline/catalog'
+        );
+      }
+      if (!data) {
+        let url = apiUrl;
+        const params = [];
+        if (selectedPhase) params.push(`phase_id=${selectedPhase}`);
+        if (selectedCharacter) params.push(`character_id=${selectedCharacter}`);
+        if (params.length > 0) url += `?${params.join('&')}`;
 
-      const response = await fetch(url);
-      const data = await response.json();
+        const response = await fetch(url);
+        data = await response.json();
+      }
       setMovies(data.movies || []);
-      setPhases(data.phases || []);
-      setCharacters(data.characters || []);
+      if (data.phases) setPhases(data.phases);
+      if (data.characters) setCharacters(data.characters);
+      if (selectedPhase) prefetchMovieDetails(data.movies || []);
     } catch (error) {
       console.error('Error loading timeline:', error);
     } finally {
@@ -88,10 +100,41 @@ const Timeline = ({ apiUrl }: TimelineProps) => {
     }
   };
 
+  const prefetchMovieDetails = async (phaseMovies: Movie[]) => {
+    const ids = phaseMovies.map((movie) => movie.id).filter((id) => !movieDetails[id]);
+    if (ids.length === 0) return;
+    try {
+      const loaded: Record<number, Movie> = {};
+      const shards = await Promise.all(ids.map((id) => fetchStatic<{ movie: Movie }>(`timeline/movie/${id}`)));
+      shards.forEach((shard) => {
+        if (shard) loaded[shard.movie.id] = shard.movie;
+      });
+      const missing = ids.filter((id) => !loaded[id]);
+      if (missing.length > 0) {
+        const response = await fetch(`${apiUrl}?movie_ids=${missing.join(',')}`);
+        const data = await response.json();
+        (data.movies || []).forEach((movie: Movie) => {
+          loaded[movie.id] = movie;
+        });
+      }
+      setMovieDetails((prev) => ({ ...prev, ...loaded }));
+    } catch (error) {
+      console.error('Error prefetching movie details:', error);
+    }
+  };
+
   const loadMovieDetails = async (movieId: number) => {
+    if (movieDetails[movieId]) {
+      setSelectedMovie(movieDetails[movieId]);
+      setShowMovieDialog(true);
+      return;
+    }
     try {
-      const response = await fetch(`${apiUrl}?movie_id=${movieId}`);
-      const data = await response.json();
+      let data = await fetchStatic<{ movie: Movie }>(`timeline/movie/${movieId}`);
+      if (!data) {
+        const response = await fetch(`${apiUrl}?movie_id=${movieId}`);
+        data = await response.json();
+      }
       setSelectedMovie(data.movie);
       setShowMovieDialog(true);
     } catch (error) {
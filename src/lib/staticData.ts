@@ -0,0 +1,30 @@
+// Статические шарды из public/data (scripts/export_static.py). Если манифеста или шарда нет,
+// возвращается null и вызывающий код обращается к функции напрямую.
+
+interface StaticManifest {
+  version: string;
+  files: Record<string, string>;
+}
+
+let manifestPromise: Promise<StaticManifest | null> | null = null;
+
+const loadManifest = () => {
+  if (!manifestPromise) {
+    manifestPromise = fetch('/data/manifest.json', { cache: 'no-cache' })
+      .then((response) => (response.ok ? response.json() : null))
+      .catch(() => null);
+  }
+  return manifestPromise;
+};
+
+export const fetchStatic = async <T>(key: string): Promise<T | null> => {
+  const manifest = await loadManifest();
+  const file = manifest?.files[key];
+  if (!file) return null;
+  try {
+    const response = await fetch(`/data/${file}`);
+    return response.ok ? ((await response.json()) as T) : null;
+  } catch {
+    return null;
+  }
+};
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
@@ -8,6 +8,7 @@ import SecretMaterialsSection from '@/components/SecretMaterialsSection';
 import AuthDialogs from '@/components/AuthDialogs';
 import Timeline from '@/components/Timeline';
 import FeaturesSection from '@/components/FeaturesSection';
+import { fetchStatic } from '@/lib/staticData';
 
 interface News {
   id: number;
@@ -20,13 +21,17 @@ interface News {
   source: string;
   is_premium: boolean;
   views_count: number;
+  comments_count: number;
   published_at: string;
 }
 
+// Поля, которые меняются без смены версии ленты и без новой выгрузки шардов
+const COUNTER_FIELDS = 'id,views_count,comments_count';
+
 interface SecretMaterial {
   id: number;
   title: string;
-  content: string;
+  content?: string;
   material_type: string;
   image_url: string;
 }
@@ -47,6 +52,7 @@ const Index = () => {
   const [loading, setLoading] = useState(true);
   const [showAuth, setShowAuth] = useState(false);
   const [showSubscribe, setShowSubscribe] = useState(false);
+  const purchaseKey = useRef<string | null>(null);
 
   useEffect(() => {
     const savedUser = localStorage.getItem('marvel_user');
@@ -64,9 +70,14 @@ const Index = () => {
 
   const loadNews = async () => {
     try {
-      const response = await fetch('https://functions.poehali.dev/89ae2e41-3684-4389-9d75-0cf7debf5c64');
-      const data = await response.json();
+      let data = await fetchStatic<{ news: News[] }>('news/feed');
+      if (!data) {
+        const response = await fetch('https://functions.poehali.dev/89ae2e41-3684-4389-9d75-0cf7debf5c64');
+        data = await response.json();
+      }
       setNews(data.news || []);
+      // И шард, и заготовка ленты несут счётчики на момент рендера; текущие — отдельным лёгким запросом
+      refreshCounters(data.news || []);
     } catch (error) {
       console.error('Error loading news:', error);
     } finally {
@@ -74,13 +85,27 @@ const Index = () => {
     }
   };
 
+  const refreshCounters = async (items: News[]) => {
+    try {
+      const response = await fetch(
+        `https://functions.poehali.dev/89ae2e41-3684-4389-9d75-0cf7debf5c64?fields=${COUNTER_FIELDS}&limit=${items.length || 20}`
+      );
+      if (!response.ok) return;
+      const data: { news: Pick<News, 'id' | 'views_count' | 'comments_count'>[] } = await response.json();
+      const live = new Map(data.news.map((item) => [item.id, item]));
+      setNews((current) => current.map((item) => ({ ...item, ...live.get(item.id) })));
+    } catch (error) {
+      console.error('Error refreshing news counters:', error);
+    }
+  };
+
   const loadSecretMaterials = async () => {
     if (!user) return;
     
     try {
       const response = await fetch('https://functions.poehali.dev/a5b6aeea-275e-4e3d-a3b9-89cd6129e01a', {
         headers: {
-          'X-User-Id': user.user_id.toString()
+          'X-User-Token': user.token
         }
       });
       const data = await response.json();
@@ -92,6 +117,26 @@ const Index = () => {
     }
   };
 
+  const loadSecretMaterialContent = async (materialId: number) => {
+    if (!user) return;
+
+    try {
+      const response = await fetch(`https://functions.poehali.dev/a5b6aeea-275e-4e3d-a3b9-89cd6129e01a?id=${materialId}`, {
+        headers: {
+          'X-User-Token': user.token
+        }
+      });
+      const data = await response.json();
+      if (response.ok) {
+        setSecretMaterials((prev) => prev.map((material) =>
+          material.id === materialId ? { ...material, content: data.material.content } : material
+        ));
+      }
+    } catch (error) {
+      console.error('Error loading secret material:', error);
+    }
+  };
+
   const handleAuth = async (authForm: { username: string; email: string; password: string }, isLogin: boolean) => {
     const action = isLogin ? 'login' : 'register';
     
@@ -149,17 +194,26 @@ const Index = () => {
       return;
     }
 
+    // Повторная отправка той же покупки (двойной клик, сбой сети) идёт с тем же ключом и не создаёт новую подписку
+    if (!purchaseKey.current) {
+      purchaseKey.current = crypto.randomUUID();
+    }
+
     try {
       const response = await fetch('https://functions.poehali.dev/5773e493-d239-4243-a2cc-b8b412b7364b', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ user_id: user.user_id })
+        headers: {
+          'Content-Type': 'application/json',
+          'X-User-Token': user.token,
+          'Idempotency-Key': purchaseKey.current
+        }
       });
 
       const data = await response.json();
 
       if (response.ok && data.success) {
-        const updatedUser = { ...user, is_premium: true, premium_until: data.premium_until };
+        purchaseKey.current = null;
+        const updatedUser = { ...user, is_premium: true, premium_until: data.premium_until, token: data.token };
         setUser(updatedUser);
         localStorage.setItem('marvel_user', JSON.stringify(updatedUser));
         setShowSubscribe(false);
@@ -167,7 +221,6 @@ const Index = () => {
           title: 'Подписка оформлена! 🎉',
           description: 'Теперь у вас есть доступ к эксклюзивным материалам!'
         });
-        loadSecretMaterials();
       } else {
         toast({
           title: 'Ошибка',
@@ -185,6 +238,13 @@ const Index = () => {
   };
 
   const handleLogout = () => {
+    if (user) {
+      fetch('https://functions.poehali.dev/88d11271-0c7b-45c0-b66f-d81ed770974b', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-User-Token': user.token },
+        body: JSON.stringify({ action: 'logout' })
+      }).catch((error) => console.error('Error revoking session:', error));
+    }
     setUser(null);
     localStorage.removeItem('marvel_user');
     setSecretMaterials([]);
@@ -239,6 +299,7 @@ const Index = () => {
           secretMaterials={secretMaterials}
           isPremium={user?.is_premium || false}
           onSubscribeClick={() => setShowSubscribe(true)}
+          onOpenMaterial={loadSecretMaterialContent}
         />
       </main>
 